@@ -1,7 +1,11 @@
-import multiprocessing
+import assets
 import pygame
-from time import strftime
-from betterplaysound import playsound
+import clock
+import metrics
+from clock import strftime
+from Button import Button
+from draw_list import DrawList
+from event_bus import ALARM_ENDED, ALARM_FIRED, ALARM_SNOOZED, MINUTE_STARTED, publish
 
 
 class AlarmClockTablet:
@@ -13,6 +17,7 @@ class AlarmClockTablet:
         MID_PIP_COLOUR (tuple): The color used for the middle part of the clock frame.
         DARK_PIP_COLOUR (tuple): The color used for the darker part of the clock frame.
         screen (pygame.Surface): The screen surface where elements are drawn.
+        draw (DrawList): Per-frame draw list the tab queues its drawing on.
         clock_font (pygame.font.Font): Font used for displaying the time.
         bottom_bar_font (pygame.font.Font): Font used for displaying the date and other info.
         alarm_font (pygame.font.Font): Font used for the alarm notification and settings.
@@ -25,26 +30,41 @@ class AlarmClockTablet:
         alarm_triggered_flag (bool): Flag indicating if the alarm has been triggered.
         snooze_check (bool): Flag indicating if snooze is active.
         stop_alarm_sound (bool): Flag for stopping the alarm sound.
-        music (multiprocessing.Process): Process for playing the alarm sound.
+        audio (AudioBus): Audio bus the alarm sound is played on, None for a silent clock.
+        current_options_index (int): Index of the highlighted option (blank, hour dial, minute dial, set alarm).
+        dial_h_button (Button): Retained button showing the hour dial.
+        dial_m_button (Button): Retained button showing the minute dial.
+        alarm_button (Button): Retained button that sets the alarm.
+        bus (EventBus): Event bus the alarm is checked from on every MINUTE_STARTED, None to check it by hand.
     """
 
+    OPTIONS = ["Blank", "HOUR DIAL", "MINUTE DIAL", "SET ALARM"]
+    BRIGHT_PIP_COLOUR = (0, 250, 0)
     PIP_COLOUR = (5, 250, 5)
     MID_PIP_COLOUR = (1, 150, 9)
     DARK_PIP_COLOUR = (1, 50, 9)
 
-    def __init__(self, screen):
+    ALARM_SOUND = "media/Alarm Sound.mp3"
+    FRAME = [(3, 40, 2, 8), (3, 40, 203, 2), (205, 20, 2, 22), (205, 20, 5, 2),
+             (295, 20, 2, 22), (290, 20, 5, 2), (295, 40, 180, 2), (475, 40, 2, 8)]
+
+    def __init__(self, screen, audio=None, draw=None, bus=None):
         """
         Initialize the ClockTab with a screen surface and default settings for the clock and alarm.
 
         Args:
             screen (pygame.Surface): The surface on which to draw the clock and other UI elements.
+            audio (AudioBus): Audio bus to ring the alarm on; without one the alarm is silent.
+            draw (DrawList): Shared draw list, flushed by its owner; a private one is made if None.
+            bus (EventBus): Checks the alarm when a minute starts; without one check_alarm is called by the owner.
         """
         self.screen = screen
-        self.clock_font = pygame.font.Font("media/monofonto rg.otf", 140)
-        self.bottom_bar_font = pygame.font.Font("media/monofonto rg.otf", 25)
-        self.alarm_font = pygame.font.Font("media/monofonto rg.otf", 20)
-        self.dial_font = pygame.font.Font("media/monofonto rg.otf", 40)
-        self.tab_font = pygame.font.Font("media/monofonto rg.otf", 30)
+        self.draw = draw if draw is not None else DrawList(screen)
+        self.clock_font = assets.font(140)
+        self.bottom_bar_font = assets.font(25)
+        self.alarm_font = assets.font(20)
+        self.dial_font = assets.font(40)
+        self.tab_font = assets.font(30)
 
         self.increment_h = 0
         self.increment_m = 0
@@ -56,56 +76,66 @@ class AlarmClockTablet:
         self.snooze_check = False
         self.stop_alarm_sound = False
 
-        self.music = multiprocessing.Process(target=playsound, args=("media/Alarm Sound.mp3",), daemon=True)
+        self.audio = audio
+        if self.audio is not None:
+            self.audio.load("alarm", self.ALARM_SOUND)
+
+        self.current_options_index = 0
+
+        # Background Images for dial and alarm Buttons, loaded once
+        dial_img = assets.scaled("media/black_background.png", (50, 35))
+        alarm_img = assets.scaled("media/black_background.png", (100, 20))
+
+        self.dial_h_button = Button(image=dial_img, pos=(195, 215), text_input="{:02d}".format(self.increment_h),
+                                    font=self.dial_font, base_color=self.MID_PIP_COLOUR,
+                                    hovering_color=self.PIP_COLOUR)
+        self.dial_m_button = Button(image=dial_img, pos=(275, 215), text_input="{:02d}".format(self.increment_m),
+                                    font=self.dial_font, base_color=self.MID_PIP_COLOUR,
+                                    hovering_color=self.PIP_COLOUR)
+        self.alarm_button = Button(image=alarm_img, pos=(235, 242), text_input="Set Alarm",
+                                   font=self.alarm_font, base_color=self.MID_PIP_COLOUR,
+                                   hovering_color=self.PIP_COLOUR)
+        self.buttons = [self.dial_h_button, self.dial_m_button, self.alarm_button]
+
+        self.bus = bus
+        if self.bus is not None:
+            self.bus.subscribe(MINUTE_STARTED, self.on_minute_started)
 
     def draw_clock_frame(self):
         """
         Draw the decorative frame around the clock for the tabs.
         """
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 2, 8))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 203, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(205, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(205, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(295, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(290, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(295, 40, 180, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(475, 40, 2, 8))
+        self.draw.chrome("clock", self.MID_PIP_COLOUR, self.FRAME)
 
     def draw_clock(self):
         """
-        Render and return the clock text surface.
+        Queue the clock text.
         """
         current_time = strftime('%H:%M')
-        clock_surface = self.clock_font.render(current_time, True, self.PIP_COLOUR, None)
-        return clock_surface
+        self.draw.text(self.clock_font, current_time, self.PIP_COLOUR, (58, 50))
 
     def draw_date(self):
         """
-        Render and return the date surface.
+        Queue the date in the bottom bracket.
         """
         date_string = strftime("%m.%d.%Y")
-        date_surface = self.bottom_bar_font.render(date_string, True, self.PIP_COLOUR, None)
-        return date_surface
+        self.draw.text(self.bottom_bar_font, date_string, self.PIP_COLOUR, (5, 282))
 
     def draw_alarm_button(self):
         """
-        Render and return the alarm button surface.
+        Queue the alarm button text.
         """
-        alarm_surface = self.alarm_font.render("Set Alarm", True, self.PIP_COLOUR, None)
-        return alarm_surface
+        self.draw.text(self.alarm_font, "Set Alarm", self.PIP_COLOUR, (190, 230))
 
-    def draw_dial(self, increment):
+    def draw_dial(self, increment, pos):
         """
-        Render and return the alarm dial surface.
+        Queue the alarm dial text.
 
         Args:
             increment (int): The current value of the dial (hour or minute).
+            pos (tuple): Top-left position of the dial.
         """
-        if increment > 9:
-            dial_surface = self.dial_font.render(str(increment), True, self.PIP_COLOUR, None)
-        else:
-            dial_surface = self.dial_font.render("{:02d}".format(increment), True, self.PIP_COLOUR, None)
-        return dial_surface
+        self.draw.text(self.dial_font, "{:02d}".format(increment), self.PIP_COLOUR, pos)
 
     def increment_dial_h(self):
         """
@@ -117,6 +147,7 @@ class AlarmClockTablet:
             self.increment_h = 0
         else:
             self.increment_h += 1
+        self.dial_h_button.set_text("{:02d}".format(self.increment_h))
 
     def increment_dial_m(self):
         """
@@ -128,6 +159,39 @@ class AlarmClockTablet:
             self.increment_m = 0
         else:
             self.increment_m += 1
+        self.dial_m_button.set_text("{:02d}".format(self.increment_m))
+
+    def update_button_highlight(self):
+        """Brightens the button matching the highlighted option and dims the others."""
+        for option, button in enumerate(self.buttons, start=1):
+            button.set_base_color(self.BRIGHT_PIP_COLOUR
+                                  if self.current_options_index == option else self.MID_PIP_COLOUR)
+
+    def handle_click(self):
+        """
+        Activates the highlighted option.
+
+        Returns:
+            str: "date" once the alarm has been set, so the app jumps back to the date tab.
+        """
+        if self.current_options_index == 1:
+            self.increment_dial_h()
+        elif self.current_options_index == 2:
+            self.increment_dial_m()
+        elif self.current_options_index == 3:
+            self.set_alarm()
+            return "date"
+        return None
+
+    def handle_scroll(self, direction):
+        """
+        Moves the highlight between the dials and the set alarm button.
+
+        Args:
+            direction (int): Positive for up, negative for down.
+        """
+        self.current_options_index = (self.current_options_index - direction) % len(self.OPTIONS)
+        self.update_button_highlight()
 
     def view_alarm(self):
         """
@@ -136,10 +200,7 @@ class AlarmClockTablet:
         This method renders an image representing the alarm when it is set.
         """
         if self.alarm_time != "":
-            imp = pygame.image.load("media/VaultBoyApproved.png").convert_alpha()
-            imp = pygame.transform.scale(imp, (60, 60))
-            imp = pygame.transform.flip(imp, True, False)
-            self.screen.blit(imp, (410, 250))
+            self.draw.image("media/VaultBoyApproved.png", (60, 60), (410, 250), flip=True)
 
     def set_alarm(self):
         """
@@ -153,35 +214,50 @@ class AlarmClockTablet:
         self.alarm_triggered_flag = False
         self.snooze_check = False
         self.alarm_time = "{:02d}".format(self.increment_h) + ":" + "{:02d}".format(self.increment_m)
+        self.check_alarm()  # An alarm set for the current minute rings straight away
+
+    def on_minute_started(self, event):
+        """Checks the alarm at the start of every minute."""
+        self.check_alarm()
 
     def check_alarm(self):
         """
         Check if the current time matches the set alarm and play a sound.
 
-        If the time matches the alarm, it triggers the alarm sound.
+        If the time matches the alarm, it triggers the alarm sound and publishes
+        ALARM_FIRED; once its minute has passed without a snooze, the sound stops and ALARM_ENDED is published.
+        Nothing rings before an alarm was set.
         """
+        if self.snooze_check or not self.alarm_time:
+            return
         current_hour = int(strftime("%H"))
         current_minute = int(strftime("%M"))
 
-        if not self.snooze_check:
-            if self.alarm_h == current_hour and self.alarm_m == current_minute:
-                if not self.alarm_triggered_flag:
-                    self.alarm_triggered_flag = True
-                    self.music = multiprocessing.Process(
-                        target=playsound, args=("media/Alarm Sound.mp3",), daemon=True)
-                    self.music.start()
-            else:
-                self.alarm_triggered_flag = False
+        if self.alarm_h == current_hour and self.alarm_m == current_minute:
+            if not self.alarm_triggered_flag:
+                self.alarm_triggered_flag = True
+                # The alarm is due at the start of its minute
+                metrics.ALARM_LATENCY_SECONDS.observe(clock.time() % 60)
+                if self.audio is not None:
+                    self.audio.play_alarm("alarm")
+                publish(ALARM_FIRED, alarm_time=self.alarm_time)
+        elif self.alarm_triggered_flag:
+            self.alarm_triggered_flag = False
+            if self.audio is not None:
+                self.audio.stop_alarm()  # the sound loops until it is stopped
+            publish(ALARM_ENDED, alarm_time=self.alarm_time)
 
     def snooze(self):
         """
         Snooze the alarm for a period.
 
-        Stops the alarm sound and sets the snooze check to true.
+        Stops the alarm sound, sets the snooze check to true and publishes ALARM_SNOOZED.
         """
         self.snooze_check = True
         self.alarm_triggered_flag = False
-        self.music.kill()
+        if self.audio is not None:
+            self.audio.stop_alarm()
+        publish(ALARM_SNOOZED, alarm_time=self.alarm_time)
 
     def alarm_notification(self):
         """
@@ -191,20 +267,16 @@ class AlarmClockTablet:
         """
         if self.alarm_triggered_flag:
             # Builds Box
-            self.screen.fill(self.DARK_PIP_COLOUR, (145, 90, 180, 100))
-            self.screen.fill(self.PIP_COLOUR, (145, 90, 180, 2))
-            self.screen.fill(self.PIP_COLOUR, (145, 190, 180, 2))
-            self.screen.fill(self.PIP_COLOUR, (145, 90, 2, 100))
-            self.screen.fill(self.PIP_COLOUR, (325, 90, 2, 100))
+            self.draw.rect(self.DARK_PIP_COLOUR, (145, 90, 180, 100))
+            self.draw.chrome("alarm notification", self.PIP_COLOUR,
+                             [(145, 90, 180, 2), (145, 190, 180, 2), (145, 90, 2, 100), (325, 90, 2, 100)])
 
             # Builds Snooze Message
-            snooze = self.alarm_font.render("WAKE UP TIME!!!", True, self.PIP_COLOUR, None)
-            self.screen.blit(snooze, (165, 115))
+            self.draw.text(self.alarm_font, "WAKE UP TIME!!!", self.PIP_COLOUR, (165, 115))
 
             # Builds Ok Button
-            ok = self.alarm_font.render("OK", True, self.DARK_PIP_COLOUR, None)
-            self.screen.fill(self.PIP_COLOUR, (216, 150, 40, 30))
-            self.screen.blit(ok, (225, 152))
+            self.draw.rect(self.PIP_COLOUR, (216, 150, 40, 30))
+            self.draw.text(self.alarm_font, "OK", self.DARK_PIP_COLOUR, (225, 152))
 
     def total_sleep(self):
         """
@@ -232,38 +304,39 @@ class AlarmClockTablet:
         """
         # Builds Clock Frame
         self.draw_clock_frame()
-        self.screen.fill((0, 0, 0), (58, 50, 250, 200))  # Black area for clock
+        self.draw.rect((0, 0, 0), (58, 50, 250, 200))  # Black area for clock
 
         # Builds Clock and Dials for Alarm Setting
-        self.screen.blit(self.draw_clock(), (58, 50))
-        self.screen.blit(self.draw_dial(self.increment_h), (175, 190))
-        self.screen.blit(self.draw_dial(self.increment_m), (255, 190))
-        dial_separation = self.dial_font.render(":", True, self.PIP_COLOUR, None)
-        self.screen.blit(dial_separation, (225, 190))
+        self.draw_clock()
+        self.draw_dial(self.increment_h, (175, 190))
+        self.draw_dial(self.increment_m, (255, 190))
+        self.draw.text(self.dial_font, ":", self.PIP_COLOUR, (225, 190))
 
         # Builds set alarm button
-        self.screen.blit(self.draw_alarm_button(), (190, 230))
+        self.draw_alarm_button()
+
+        self.draw.text(self.tab_font, "ALARM", self.PIP_COLOUR, (212, 40))
+        self.draw.text(self.tab_font, "DATE", self.MID_PIP_COLOUR, (140, 40))
 
-        alarm_tab = self.tab_font.render("ALARM", True, self.PIP_COLOUR, None)
-        self.screen.blit(alarm_tab, (212, 40))
-        date_tab = self.tab_font.render("DATE", True, self.MID_PIP_COLOUR, None)
-        self.screen.blit(date_tab, (140, 40))
+        # Dial and alarm Buttons are kept between frames and only re-render on change
+        cursor_pos = pygame.mouse.get_pos()
+        for button in self.buttons:
+            button.change_color(cursor_pos)
+            button.update(self.draw)
 
     def build_bottom_bracket(self):
         """ Builds the bottom bracket for the pip-boy with date, hours of sleep and alarm indicator"""
         # Builds Bottom Left Bracket
-        self.screen.fill(self.DARK_PIP_COLOUR, (3, 280, 157, 30))
-        self.screen.blit(self.draw_date(), (5, 282))
-        self.screen.fill(self.DARK_PIP_COLOUR, (163, 280, 130, 30))
+        self.draw.rect(self.DARK_PIP_COLOUR, (3, 280, 157, 30))
+        self.draw_date()
+        self.draw.rect(self.DARK_PIP_COLOUR, (163, 280, 130, 30))
 
         # Builds Bottom Center Bracket
-        hours_sleep = self.bottom_bar_font.render(self.total_sleep(), True, self.PIP_COLOUR, None)
-        self.screen.blit(hours_sleep, (165, 282))
+        self.draw.text(self.bottom_bar_font, self.total_sleep(), self.PIP_COLOUR, (165, 282))
 
         # Builds Bottom Right Bracket
-        self.screen.fill(self.DARK_PIP_COLOUR, (296, 280, 180, 30))
-        alarm = self.bottom_bar_font.render(self.alarm_time, True, self.PIP_COLOUR, None)
-        self.screen.blit(alarm, (300, 282))
+        self.draw.rect(self.DARK_PIP_COLOUR, (296, 280, 180, 30))
+        self.draw.text(self.bottom_bar_font, self.alarm_time, self.PIP_COLOUR, (300, 282))
 
         # Ensures alarm is view no matter what screen
         self.view_alarm()
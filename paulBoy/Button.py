@@ -2,33 +2,62 @@
 # This implementation is based on the work by baraltech.
 # Repository: https://github.com/baraltech/Menu-System-PyGame/tree/main
 
+from Widget import Widget
+
+
+class Button(Widget):
+	"""
+	A retained-mode button made of a background image and centred text.
+
+	The button is created once and kept between frames. Its text surface is only
+	re-rendered when the text, base colour or hover state actually changes.
+	"""
 
-class Button:
 	def __init__(self, image, pos, text_input, font, base_color, hovering_color):
+		super().__init__(pos)
 		self.image = image
 		self.x_pos = pos[0]
 		self.y_pos = pos[1]
 		self.font = font
 		self.base_color, self.hovering_color = base_color, hovering_color
 		self.text_input = text_input
-		self.text = self.font.render(self.text_input, True, self.base_color)
+		self.hovering = False
+		self.text = None
+		self.text_rect = None
+		self.rebuild()
 		if self.image is None:
 			self.image = self.text
 		self.rect = self.image.get_rect(center=(self.x_pos, self.y_pos))
+
+	def rebuild(self):
+		color = self.hovering_color if self.hovering else self.base_color
+		self.text = self.font.render(self.text_input, True, color)
 		self.text_rect = self.text.get_rect(center=(self.x_pos, self.y_pos))
+		self.dirty = False
+
+	def set_text(self, text_input):
+		if text_input != self.text_input:
+			self.text_input = text_input
+			self.dirty = True
+
+	def set_base_color(self, base_color):
+		if base_color != self.base_color:
+			self.base_color = base_color
+			self.dirty = True
 
 	def update(self, screen):
+		self.draw(screen)
+
+	def blit(self, screen):
 		if self.image is not None:
 			screen.blit(self.image, self.rect)
 		screen.blit(self.text, self.text_rect)
 
 	def check_for_input(self, position):
-		if position[0] in range(self.rect.left, self.rect.right) and position[1] in range(self.rect.top, self.rect.bottom):
-			return True
-		return False
+		return self.rect.collidepoint(position)
 
 	def change_color(self, position):
-		if position[0] in range(self.rect.left, self.rect.right) and position[1] in range(self.rect.top, self.rect.bottom):
-			self.text = self.font.render(self.text_input, True, self.hovering_color)
-		else:
-			self.text = self.font.render(self.text_input, True, self.base_color)
+		hovering = self.rect.collidepoint(position)
+		if hovering != self.hovering:
+			self.hovering = hovering
+			self.dirty = True
@@ -1,8 +1,13 @@
-import pygame
+import assets
 import calendar
-from datetime import datetime
+import threading
+from datetime import timedelta
 from AlarmClockTablet import AlarmClockTablet
-from time import strftime
+from Widget import ListView
+from clock import now, strftime
+from draw_list import DrawList
+from event_bus import DAY_ROLLED_OVER
+from ics_calendar import CalendarLoader, EventIndex
 
 
 class CalendarTablet:
@@ -18,6 +23,8 @@ class CalendarTablet:
         RGB color for the dark green color used in the interface.
     screen : pygame.Surface
         The surface where the calendar tab will be rendered.
+    draw : DrawList
+        Per-frame draw list the tab queues its drawing on.
     bottom_bar_font : pygame.font.Font
         Font used for the bottom bar text.
     alarm_font : pygame.font.Font
@@ -29,51 +36,174 @@ class CalendarTablet:
     side_clock_font : pygame.font.Font
         Font used for the main clock display.
     current_date : datetime
-        The current date and time.
+        When the current day started being shown; moved on by DAY_ROLLED_OVER.
     clock_tab : ClockTab
         An instance of the ClockTab class used for drawing and managing clock-related features.
+    selected_date : date
+        The day whose agenda is shown; scrolling moves it.
+    show_agenda : bool
+        Whether the agenda of the selected day replaces the side clock.
+    loader : CalendarLoader
+        Parses the .ics files and builds the event index, on a worker thread.
+    events : EventIndex
+        Occurrences of all events, None until the first load finishes.
+    agenda : ListView
+        The selected day's events.
+    background_refresh : bool
+        Set by the async runtime, which then reloads changed files through refresh().
+    bus : EventBus
+        Event bus that tells the tab when a new day starts, None if the owner never does.
     """
 
     PIP_COLOUR = (5, 250, 5)
     MID_PIP_COLOUR = (1, 150, 9)
     DARK_PIP_COLOUR = (1, 50, 9)
+    refresh_interval = 60  # seconds between checks for changed .ics files under the async runtime
+    FRAME = [(3, 40, 2, 8), (3, 40, 203, 2), (205, 20, 2, 22), (205, 20, 5, 2),
+             (295, 20, 2, 22), (290, 20, 5, 2), (295, 40, 180, 2), (475, 40, 2, 8)]
 
-    def __init__(self, screen):
+    def __init__(self, screen, calendar_folder="media/calendars", draw=None, bus=None):
         self.screen = screen
-        self.bottom_bar_font = pygame.font.Font("media/monofonto rg.otf", 25)
-        self.alarm_font = pygame.font.Font("media/monofonto rg.otf", 20)
-        self.dial_font = pygame.font.Font("media/monofonto rg.otf", 40)
-        self.tab_font = pygame.font.Font("media/monofonto rg.otf", 30)
-        self.side_clock_font = pygame.font.Font("media/monofonto rg.otf", 80)
-        self.current_date = datetime.now()
-        self.clock_tab = AlarmClockTablet(screen)
+        self.draw = draw if draw is not None else DrawList(screen)
+        self.bottom_bar_font = assets.font(25)
+        self.alarm_font = assets.font(20)
+        self.dial_font = assets.font(40)
+        self.tab_font = assets.font(30)
+        self.side_clock_font = assets.font(80)
+        self.current_date = now()
+        self.clock_tab = AlarmClockTablet(screen, draw=self.draw)
+
+        self.selected_date = self.current_date.date()
+        self.show_agenda = False
+        self.background_refresh = False
+        self.loader = CalendarLoader(calendar_folder)
+        self.events = None
+        # (index, {(year, month): days}) swapped as one, so a reload never mixes two indexes
+        self.month_cache = (None, {})
+        self.agenda = ListView(self.alarm_font, (15, 80), 225, 6, 25,
+                               self.PIP_COLOUR, self.PIP_COLOUR, self.DARK_PIP_COLOUR)
+        self.agenda_key = None
+        self.bus = bus
+        if self.bus is not None:
+            self.bus.subscribe(DAY_ROLLED_OVER, self.on_day_rolled_over)
+        # Large calendars take a while to parse, so the tab is drawn without them until they are ready
+        threading.Thread(target=self.load_events, name="calendar-load", daemon=True).start()
+
+    def on_day_rolled_over(self, event):
+        """Moves the highlight to the new day, and the selection too unless an agenda is open."""
+        self.current_date = now()
+        if not self.show_agenda:
+            self.selected_date = self.current_date.date()
+
+    def load_events(self):
+        """Loads the .ics files (blocking) and shows the result; a failed load shows no events instead of LOADING..."""
+        try:
+            index = self.loader.load()
+        except Exception as error:
+            print(f"calendar: loading failed ({type(error).__name__}: {error})")
+            index = EventIndex([])
+        self.set_events(index)
+
+    def set_events(self, index):
+        """
+        Switches to a newly built event index.
+
+        Args:
+            index (EventIndex): The index returned by the loader; ignored if it is the current one.
+        """
+        if index is not self.events:
+            self.month_cache = (index, {})
+            self.events = index
+
+    async def refresh(self, run_blocking):
+        """
+        Async refresh hook: reloads changed .ics files in the executor.
+
+        Args:
+            run_blocking: Coroutine function that runs a blocking call in the runtime's executor.
+        """
+        self.set_events(await run_blocking(self.loader.load))
+
+    def event_days(self, year, month):
+        """Returns the days of a month that have events, cached per index."""
+        index, cache = self.month_cache
+        if index is None:
+            return set()
+        if (year, month) not in cache:
+            cache[(year, month)] = index.days_with_events(year, month)
+        return cache[(year, month)]
+
+    def update_agenda(self):
+        """Fills the agenda list with the selected day's events when the day or the index changed."""
+        index = self.month_cache[0]
+        key = (index, self.selected_date)
+        if key == self.agenda_key:
+            return
+        self.agenda_key = key
+        rows = []
+        for start, end, summary, all_day in (index.on_day(self.selected_date) if index is not None else []):
+            label = "ALL DAY" if all_day or start.date() < self.selected_date else start.strftime("%H:%M")
+            rows.append((summary if len(summary) <= 12 else summary[:11] + "…", label))
+        self.agenda.set_rows(rows)
+
+    def handle_click(self):
+        """Shows or hides the selected day's agenda; hiding it returns the selection to today."""
+        self.show_agenda = not self.show_agenda
+        if not self.show_agenda:
+            self.selected_date = now().date()
+
+    def handle_scroll(self, direction):
+        """
+        Moves the selected day.
+
+        Args:
+            direction (int): Positive for the previous day, negative for the next one.
+        """
+        self.selected_date -= timedelta(days=direction)
+
+    def draw_agenda(self):
+        """Draws the selected day's date and events where the side clock normally is."""
+        header = self.selected_date.strftime("%a %d %b %Y").upper()
+        self.draw.text(self.alarm_font, header, self.PIP_COLOUR, (15, 50))
+        self.update_agenda()
+        if self.agenda.rows:
+            self.agenda.draw(self.draw)
+        else:
+            message = "LOADING..." if self.events is None else "NO EVENTS"
+            self.draw.text(self.alarm_font, message, self.MID_PIP_COLOUR, (15, 80))
 
     def draw_calendar(self):
         """
-        Render the calendar for the current month, highlighting the current day.
+        Render the calendar for the selected month, highlighting the current day.
 
-        The calendar displays the current month's days in a grid, with the current day highlighted in red.
+        The calendar displays the month's days in a grid, with the current day highlighted in red,
+        the selected day on a dark box and days that have events underlined.
         """
-        # Get current month and year
-        year = int(strftime("%Y"))
-        month = int(strftime("%m"))
-        day = int(strftime("%d"))
+        # Get selected month and year
+        year = self.selected_date.year
+        month = self.selected_date.month
+        today = self.current_date
+        day = today.day if (year, month) == (today.year, today.month) else 0
+        event_days = self.event_days(year, month)
 
         # Get month calendar as a matrix
         month_calendar = calendar.monthcalendar(year, month)
 
         # Render month name and year
         header = f"{calendar.month_name[month]} {year}"
-        header_surface = self.alarm_font.render(header, True, self.PIP_COLOUR, None)
-        self.screen.blit(header_surface, (280, 80))
+        self.draw.text(self.alarm_font, header, self.PIP_COLOUR, (280, 80))
 
         # Render the calendar grid
         for row, week in enumerate(month_calendar):
             for col, date in enumerate(week):
                 if date != 0:
+                    x, y = 260 + col * 30, 100 + row * 25
+                    if date == self.selected_date.day:
+                        self.draw.rect(self.DARK_PIP_COLOUR, (x - 3, y + 1, 28, 24))
                     color = self.PIP_COLOUR if date != day else (255, 0, 0)  # Highlight today in red
-                    date_surface = self.alarm_font.render(str(date), True, color, None)
-                    self.screen.blit(date_surface, (260 + col * 30, 100 + row * 25))
+                    self.draw.text(self.alarm_font, str(date), color, (x, y))
+                    if date in event_days:
+                        self.draw.rect(self.MID_PIP_COLOUR, (x, y + 22, 20, 2))
 
     def draw_calendar_frame(self):
         """
@@ -81,14 +211,7 @@ class CalendarTablet:
 
         This method creates a visual border around the Calendar display area.
         """
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 2, 8))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 203, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(205, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(205, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(295, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(290, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(295, 40, 180, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(475, 40, 2, 8))
+        self.draw.chrome("calendar", self.MID_PIP_COLOUR, self.FRAME)
 
     def render(self):
         """
@@ -101,15 +224,15 @@ class CalendarTablet:
 
         # Builds Calendar and Side-Clock
         self.draw_calendar()
-        current_time = strftime('%H:%M')
-        clock_surface = self.side_clock_font.render(current_time, True, self.PIP_COLOUR, None)
-        self.screen.blit(clock_surface, (20, 120))
+        if self.show_agenda:
+            self.draw_agenda()
+        else:
+            current_time = strftime('%H:%M')
+            self.draw.text(self.side_clock_font, current_time, self.PIP_COLOUR, (20, 120))
 
         # Top Sub-Bar Tabs
-        alarm_tab = self.tab_font.render("ALARM", True, self.MID_PIP_COLOUR, None)
-        self.screen.blit(alarm_tab, (300, 40))
-        date_tab = self.tab_font.render("DATE", True, self.PIP_COLOUR, None)
-        self.screen.blit(date_tab, (215, 40))
+        self.draw.text(self.tab_font, "ALARM", self.MID_PIP_COLOUR, (300, 40))
+        self.draw.text(self.tab_font, "DATE", self.PIP_COLOUR, (215, 40))
 
         # Builds Bottom Bracket
         self.clock_tab.build_bottom_bracket()
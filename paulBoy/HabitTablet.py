@@ -1,8 +1,11 @@
-from time import strftime
+from clock import strftime
 import calendar
-import pygame
+import assets
 import json
 import os
+import threading
+from draw_list import DrawList
+from event_bus import DAY_ROLLED_OVER
 
 
 class HabitTablet:
@@ -15,26 +18,40 @@ class HabitTablet:
             MID_PIP_COLOUR (tuple): Medium-intensity color for UI elements.
             DARK_PIP_COLOUR (tuple): Darker color for UI elements.
             screen (pygame.Surface): The Pygame screen object.
+            draw (DrawList): Per-frame draw list the tab queues its drawing on.
             font (pygame.Font): Font used for rendering habit-related text.
             tab_font (pygame.Font): Font used for rendering tab labels.
             current_index (int): The currently selected habit index.
             current_day (int): The current day being tracked.
             habits (dict): Dictionary tracking different habit categories and their completion status.
+            background_refresh (bool): Set by the async runtime; saves then happen in its executor.
+            unsaved (bool): Progress changed since it was last written, or its last write failed.
+            write_lock (threading.RLock): Held while progress is written, so writes never overlap.
+            bus (EventBus): Event bus that tells the tablet when a new day starts, None if the owner never does.
         """
 
     SAVE_FILE = "habit_data.json"
     PIP_COLOUR = (5, 250, 5)
     MID_PIP_COLOUR = (1, 150, 9)
     DARK_PIP_COLOUR = (1, 50, 9)
+    refresh_interval = 5  # seconds between background saves under the async runtime
+    FRAME = [(3, 40, 2, 8), (3, 40, 78, 2), (170, 40, 305, 2), (80, 20, 2, 22), (80, 20, 5, 2),
+             (170, 20, 2, 22), (167, 20, 5, 2), (170, 40, 45, 2), (475, 40, 2, 8)]
+    BUTTON_FRAME = [(0, 130, 2, 62), (60, 130, 2, 62), (0, 130, 60, 2), (0, 190, 60, 2),
+                    (0, 210, 60, 2), (0, 210, 2, 22), (60, 210, 2, 22), (0, 230, 60, 2)]
 
-    def __init__(self, screen):
+    def __init__(self, screen, draw=None, bus=None):
         """Initializes the HabitTablet with the given screen and default habit data."""
         self.screen = screen
-        self.font = pygame.font.Font("media/monofonto rg.otf", 20)
+        self.draw = draw if draw is not None else DrawList(screen)
+        self.font = assets.font(20)
         self.current_index = 0
-        self.tab_font = pygame.font.Font("media/monofonto rg.otf", 30)
+        self.tab_font = assets.font(30)
 
         self.current_day = 0
+        self.background_refresh = False
+        self.unsaved = False
+        self.write_lock = threading.RLock()
 
         # Habit tracking
         self.habits = {
@@ -47,17 +64,13 @@ class HabitTablet:
 
         self.load_progress()  # Load existing data at startup
 
+        self.bus = bus
+        if self.bus is not None:
+            self.bus.subscribe(DAY_ROLLED_OVER, self.on_day_rolled_over)
+
     def draw_habit_frame(self):
         """Draws the decorative frame around the habit tracker."""
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 2, 8))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 78, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(170, 40, 305, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(80, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(80, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(170, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(167, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(170, 40, 45, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(475, 40, 2, 8))
+        self.draw.chrome("habit", self.MID_PIP_COLOUR, self.FRAME)
 
     def draw_habit_image(self, emblem, x):
         """
@@ -67,10 +80,7 @@ class HabitTablet:
             emblem: string representing image location
             x (int): x location of image
         """
-        img = pygame.image.load(emblem)
-        img = pygame.transform.scale(img, (60, 60))
-        img = pygame.transform.flip(img, True, False)
-        self.screen.blit(img, (x, 70))
+        self.draw.image(emblem, (60, 60), (x, 70), flip=True)
 
     def draw_habit_buttons(self):
         """Draws the buttons associated with each habit category."""
@@ -97,27 +107,61 @@ class HabitTablet:
         Args:
             x (int): position of the habit button
         """
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x, 130, 2, 62))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x + 60, 130, 2, 62))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x, 130, 60, 2))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x, 190, 60, 2))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x,210, 60, 2))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x, 210, 2, 22))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x + 60, 210, 2, 22))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x, 230, 60, 2))
+        self.draw.chrome(("habit button", x), self.PIP_COLOUR,
+                         [(x + dx, y, width, height) for dx, y, width, height in self.BUTTON_FRAME])
 
     def draw_selection_frame(self):
         """Draws a selection frame around the currently selected habit."""
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(80 * self.current_index + 50, 130, 60, 60))
+        self.draw.rect(self.PIP_COLOUR, (80 * self.current_index + 50, 130, 60, 60))
 
-    def save_progress(self):
-        """Saves habit progress to a JSON file."""
-        data = {
+    def progress_data(self):
+        """Returns a snapshot of the habit progress as it is saved."""
+        return {
             "date": strftime("%Y-%m-%d"),
-            "habits": self.habits
+            "habits": {name: dict(habit) for name, habit in self.habits.items()}
         }
-        with open(self.SAVE_FILE, "w") as file:
-            json.dump(data, file, indent=4)
+
+    def write_progress(self, data):
+        """
+        Writes a progress snapshot to the JSON file.
+
+        Runs in the runtime's executor as well as on the main thread, so writes
+        take turns on write_lock. A write that fails marks the progress unsaved
+        again, so the next refresh, or flush, retries it.
+        """
+        with self.write_lock:
+            try:
+                with open(self.SAVE_FILE, "w") as file:
+                    json.dump(data, file, indent=4)
+            except (OSError, TypeError, ValueError):
+                self.unsaved = True
+                raise
+
+    def save_progress(self):
+        """Saves habit progress to a JSON file."""
+        self.unsaved = False
+        self.write_progress(self.progress_data())
+
+    async def refresh(self, run_blocking):
+        """
+        Async refresh hook: writes changed progress without blocking the frame loop.
+
+        Args:
+            run_blocking: Coroutine function that runs a blocking call in the runtime's executor.
+        """
+        if self.unsaved:
+            self.unsaved = False  # changes made while the snapshot is written set it again
+            await run_blocking(self.write_progress, self.progress_data())
+
+    def flush(self):
+        """
+        Writes any progress that has not been saved yet, called before the app exits.
+
+        Waits for a write still running in the executor first, so the final save is always the last one.
+        """
+        with self.write_lock:
+            if self.unsaved:
+                self.save_progress()
 
     def load_progress(self):
         """Loads habit progress from a JSON file."""
@@ -131,6 +175,14 @@ class HabitTablet:
                     self.reset_daily_checks()
                     self.save_progress()  # Re-save progress for today
 
+    def on_day_rolled_over(self, event):
+        """Unchecks every habit at midnight, so each can be checked off again for the new day."""
+        self.reset_daily_checks()
+        if self.background_refresh:
+            self.unsaved = True  # Written by the next refresh
+        else:
+            self.save_progress()
+
     def reset_daily_checks(self):
         """Resets daily checks while keeping the counts."""
         for habit in self.habits.values():
@@ -147,8 +199,7 @@ class HabitTablet:
         year, month = int(strftime("%Y")), int(strftime("%m"))
         days_in_month = calendar.monthrange(year, month)[1]
         progress_text = f"{self.habits[count]['count']}/{days_in_month}"  # Keep fraction format
-        ttl_count = self.font.render(progress_text, True, self.PIP_COLOUR)
-        self.screen.blit(ttl_count, (x, 208))
+        self.draw.text(self.font, progress_text, self.PIP_COLOUR, (x, 208))
 
     def increment_btn(self):
         """Increments the habit count for the selected habit if it hasn't been checked today."""
@@ -158,23 +209,38 @@ class HabitTablet:
         if not self.habits[selected_habit]["daily_check"]:
             self.habits[selected_habit]["count"] += 1
             self.habits[selected_habit]["daily_check"] = True
-            self.save_progress()  # Save progress after increment
+            if self.background_refresh:
+                self.unsaved = True  # Written by the next refresh
+            else:
+                self.save_progress()  # Save progress after increment
+
+    def handle_click(self):
+        """Checks off the highlighted habit when the select button is clicked."""
+        self.increment_btn()
+
+    def handle_scroll(self, direction):
+        """
+        Moves the highlight between habits.
+
+        Args:
+            direction (int): Positive for up, negative for down.
+        """
+        if direction > 0 and self.current_index > 0:
+            self.current_index -= 1
+        elif direction < 0 and self.current_index < 4:
+            self.current_index += 1
 
     def render(self):
         """Renders the habit tracker UI."""
-        self.screen.fill((0, 0, 0), (0, 50, 480, 200))  # Black background
+        self.draw.rect((0, 0, 0), (0, 50, 480, 200))  # Black background
         self.draw_habit_frame()
         self.draw_selection_frame()
         self.draw_habit_buttons()
 
-        habit_tab = self.tab_font.render("HABIT", True, self.PIP_COLOUR, None)
-        self.screen.blit(habit_tab, (215, 40))
-        youtube_tab = self.tab_font.render("YOUTUBE", True, self.MID_PIP_COLOUR, None)
-        self.screen.blit(youtube_tab, (305, 40))
+        self.draw.text(self.tab_font, "HABIT", self.PIP_COLOUR, (215, 40))
+        self.draw.text(self.tab_font, "YOUTUBE", self.MID_PIP_COLOUR, (305, 40))
 
         habit_names = ["body", "mind", "spiritual", "skill", "social"]
         for i, habit in enumerate(habit_names):
             if self.habits[habit]["daily_check"]:  # Check if habit is completed
-                checkmark = pygame.image.load("media/Checkmark.png")
-                checkmark = pygame.transform.scale(checkmark, (60, 60))
-                self.screen.blit(checkmark, (80 * i + 50, 130))
+                self.draw.image("media/Checkmark.png", (60, 60), (80 * i + 50, 130))
@@ -1,14 +1,21 @@
 import pygame
-from betterplaysound import playsound
-import crt_shader
-from Button import Button
-from AlarmClockTablet import AlarmClockTablet
-from CalendarTablet import CalendarTablet
+import argparse
+import os
+import time
+import assets
+import metrics
+import palette
+import render_quality
+from functools import partial
 from pygame.locals import *
-from HabitTablet import HabitTablet
-from RadioTablet import RadioTablet
-from YoutubeTablet import YoutubeTablet
+from TabRegistry import TabRegistry
+from boot import BootPipeline, LoadingTab
+from event_bus import ALARM_ENDED, ALARM_FIRED, ALARM_SNOOZED, MINUTE_STARTED, ClockEvents, EventBus
+from input_actions import INPUT_ACTION, NEXT_TAB, SCROLL_UP, SCROLL_DOWN, SELECT, InputLatency
+from audio_bus import AudioBus
+from power_save import ACTIVE, DIM, Backlight, IdlePolicy
 from crt_shader import Graphic_engine
+from draw_list import DrawList
 
 class MainApp:
     """
@@ -23,7 +30,10 @@ class MainApp:
         SCREEN_HEIGHT (int): Height of the application window
         SCREEN_SIZE (tuple): Tuple containing screen dimensions
         screen (pygame.Surface): Main drawing surface
-        crt_shader (Graphic_engine): CRT shader effect handler
+        draw (DrawList): Per-frame draw commands of the app and all tabs, drawn onto screen in one batch
+            (or, with the GPU compositor, drawn on the GPU as one instanced batch)
+        compositor (str): "cpu" draws into screen with SDL, "gpu" composites on the GPU
+        crt_shader (Graphic_engine): CRT shader effect handler, or the PresentClient of the present process
         tab_font (pygame.font.Font): Font for tab labels
         dial_font (pygame.font.Font): Font for dial displays
         alarm_font (pygame.font.Font): Font for alarm buttons
@@ -32,37 +42,102 @@ class MainApp:
         MID_PIP_COLOUR (tuple): RGB color for medium-brightness elements
         DARK_PIP_COLOUR (tuple): RGB color for dark elements
         background (pygame.Surface): Background surface
-        alarm_clock_tab (AlarmClockTablet): Alarm clock tab instance
-        calendar_tab (CalendarTablet): Calendar tab instance
-        radio_player_tab (RadioTablet): Radio player tab instance
-        youtube_tablet (YoutubeTablet): YouTube player tab instance
-        habit_tablet (HabitTablet): Habit tracker tab instance
-        current_tab (str): Currently active tab identifier
-        current_options_index (int): Index of currently selected option
+        boot (BootPipeline): Loads assets and builds the tablets on worker threads after the first frame
+        bus (EventBus): Calls the app's and the tablets' handlers for track, alarm, clock and stats events
+        clock_events (ClockEvents): Publishes the start of every minute and day on the bus
+        alarm_ringing (bool): Between ALARM_FIRED and ALARM_SNOOZED or ALARM_ENDED; keeps the display awake
+        alarm_clock_tab (AlarmClockTablet): Alarm clock tab instance, None until the boot pipeline built it
+        calendar_tab (CalendarTablet): Calendar tab instance, None until built
+        radio_player_tab (RadioTablet): Radio player tab instance, None until built
+        youtube_tablet (YoutubeTablet): YouTube player tab instance, None until built
+        habit_tablet (HabitTablet): Habit tracker tab instance, None until built
+        audio (AudioBus): Owner of the mixer with reserved channels for effects, ambient loop and alarm
+        tabs (TabRegistry): Ordered registry of tabs that input is dispatched through; a LoadingTab
+            stands in for every tablet that is not built yet
+        tab_listeners (list): Callables told (name, tablet) whenever the boot pipeline installs a tablet
+        tab_labels (list): Pre-rendered tab labels and their positions
+        evdev_input (EvdevInput): Reader thread for encoder and button devices, if any
+        input_latency (InputLatency): Input-to-frame latency of timestamped input actions
+        idle_policy (IdlePolicy): Dims and blanks the display after a period without input
+        backlight (Backlight): Panel backlight that follows the idle state, if any
+        recorder (InputRecorder): Writes every input event to a recording for later replay, if any
+        frame_delay (int): Milliseconds step() sleeps after every frame, 0 when replaying as fast as possible
+        mirror (MirrorServer): Streams finished frames to remote viewers, if any
+        metrics_server (MetricsServer): Serves the runtime metrics over HTTP, if any
+        frame_rate (FrameRate): Updates the fps metric from the drawn frames
     """
 
-    def __init__(self):
+    FRAME_DELAY = 60
+    # Longest idle wait while an internet radio stream needs its channel fed
+    STREAM_FEED_INTERVAL = 0.5
+    INPUT_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEWHEEL, pygame.KEYDOWN, INPUT_ACTION)
+
+    def __init__(self, indexed=False, theme=palette.DEFAULT_THEME, framebuffer=None, input_devices=None,
+                 idle_policy=None, backlight=None, recorder=None, mirror=None,
+                 quality=render_quality.OFF, gpu_budget=10.0, metrics_server=None, compositor="cpu",
+                 present_process=False):
         """
         Initialize the MainApp class with all necessary components.
 
-        Sets up the pygame environment, display settings, fonts, colors,
-        and initializes all tab components.
+        Sets up the pygame environment, display settings, fonts and colors and draws
+        the first frame. Everything slower, like decoding sounds, scanning the music
+        library and building the tablets, is started on the boot pipeline and
+        installed while the main loop runs; see wait_until_ready.
+
+        Args:
+            indexed (bool): Draw into an 8-bit palette surface that the GPU resolves through a theme palette
+            theme (str): Colour theme used by the indexed mode, one of palette.THEMES
+            framebuffer (str): Framebuffer device or file to write frames to instead of an OpenGL window
+            input_devices (list): evdev devices (rotary encoder, buttons) read on a dedicated thread
+            idle_policy (IdlePolicy): When to dim and blank, defaults to IdlePolicy()
+            backlight (Backlight): Backlight to dim and switch off together with the display
+            recorder (InputRecorder): Records the input events seen by handle_events
+            mirror (MirrorServer): Receives every finished frame for remote viewers
+            quality (str): Post-processing tier of the OpenGL output, one of render_quality.TIERS
+            gpu_budget (float): GPU milliseconds per frame before the quality steps down, 0 never steps down
+            metrics_server (MetricsServer): Started here and stopped on quit; the metrics are kept either way
+            compositor (str): "gpu" draws the tabs on the GPU from glyph and sprite atlases; needs the
+                OpenGL output in RGB mode
+            present_process (bool): Present frames (window, OpenGL and CRT shader, or the framebuffer) from a
+                separate process that reads them from shared memory, so a slow present never delays input
         """
+        if present_process and compositor == "gpu":
+            raise ValueError("the GPU compositor draws with the window's OpenGL context and cannot be used "
+                             "with --present-process")
+        video_driver = os.environ.get("SDL_VIDEODRIVER")
+        if framebuffer is not None or present_process:
+            # No window is needed, but pygame still wants a video driver for its event queue
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
         pygame.init()
-        pygame.mixer.init()  # Initialize the mixer module for sound
+        self.audio = AudioBus()  # Owns the mixer and its reserved channels
 
         self.SCREEN_WIDTH = 480
         self.SCREEN_HEIGHT = 320
         self.SCREEN_SIZE = (480, 320)
-        self.screen = pygame.Surface((480, 320)).convert((255, 65282, 16711681, 0))
+        if indexed:
+            self.screen = pygame.Surface(self.SCREEN_SIZE, 0, 8)
+            self.screen.set_palette(palette.canonical_palette())
+        else:
+            self.screen = pygame.Surface((480, 320)).convert((255, 65282, 16711681, 0))
         pygame.display.set_caption("PAUL-BOY")
-        pygame.display.set_mode(self.SCREEN_SIZE, DOUBLEBUF | OPENGL)
-
-        self.crt_shader = Graphic_engine(self.screen)
-
-        self.tab_font = pygame.font.Font("media/monofonto rg.otf", 30)
-        self.dial_font = pygame.font.Font("media/monofonto rg.otf", 40)
-        self.alarm_font = pygame.font.Font("media/monofonto rg.otf", 20)
+        if framebuffer is not None or present_process:
+            pygame.display.set_mode(self.SCREEN_SIZE)
+        else:
+            pygame.display.set_mode(self.SCREEN_SIZE, DOUBLEBUF | OPENGL)
+
+        if present_process:
+            from present_process import PresentClient
+            self.crt_shader = PresentClient(self.screen, theme=theme, framebuffer=framebuffer, quality=quality,
+                                            gpu_budget=gpu_budget, video_driver=video_driver)
+            self.crt_shader.start()
+        else:
+            self.crt_shader = Graphic_engine(self.screen, theme=theme, framebuffer=framebuffer,
+                                             quality=quality, gpu_budget=gpu_budget)
+        self.present_process = present_process
+
+        self.tab_font = assets.font(30)
+        self.dial_font = assets.font(40)
+        self.alarm_font = assets.font(20)
 
         self.BRIGHT_PIP_COLOUR = (0, 250, 0)
         self.PIP_COLOUR = (5, 250, 5)
@@ -72,21 +147,144 @@ class MainApp:
         self.background = pygame.Surface((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
         self.background.fill((0, 0, 0))
 
-        self.alarm_clock_tab = AlarmClockTablet(self.screen)
-        self.calendar_tab = CalendarTablet(self.screen)
-        self.radio_player_tab = RadioTablet(self.screen)
-        self.youtube_tablet = YoutubeTablet(self.screen)
-        self.habit_tablet = HabitTablet(self.screen)
+        self.compositor = compositor
+        if compositor == "gpu":
+            if self.crt_shader.cpu_only or indexed:
+                raise ValueError("the GPU compositor needs the OpenGL output and cannot be used with "
+                                 "--indexed or --framebuffer")
+            from gpu_compositor import GpuDrawList
+            self.draw = GpuDrawList(self.screen, self.crt_shader.ctx)
+            self.crt_shader.set_source(self.draw.texture)
+        else:
+            self.draw = DrawList(self.screen)
+
+        self.boot = BootPipeline()
+        self.bus = EventBus()
+        self.clock_events = ClockEvents()
+        self.alarm_ringing = False
+        self.bus.subscribe(ALARM_FIRED, self.on_alarm_fired)
+        self.bus.subscribe(ALARM_SNOOZED, self.on_alarm_stopped)
+        self.bus.subscribe(ALARM_ENDED, self.on_alarm_stopped)
+        self.bus.subscribe(MINUTE_STARTED, self.on_minute_started)
+        self.alarm_clock_tab = None
+        self.calendar_tab = None
+        self.radio_player_tab = None
+        self.youtube_tablet = None
+        self.habit_tablet = None
+        self.tab_listeners = []
+
+        self.tabs = TabRegistry()
+        loading = LoadingTab(self.boot, self.tab_font, self.draw)
+        for name in ("date", "alarm", "radio", "habit", "youtube"):
+            self.tabs.register(name, loading)
+        self.add_boot_jobs()
+
+        # Tab labels never change, so they are rendered once
+        self.tab_labels = [
+            (self.tab_font.render("STAT", True, self.PIP_COLOUR, None), (95, 5)),
+            (self.tab_font.render("DATA", True, self.PIP_COLOUR, None), (220, 5)),
+            (self.tab_font.render("RADIO", True, self.PIP_COLOUR, None), (350, 5)),
+        ]
+
+        self.input_latency = InputLatency()
+        self.pending_input = []
+        self.evdev_input = None
+        if input_devices:
+            from evdev_input import EvdevInput
+            self.evdev_input = EvdevInput(input_devices)
+            self.evdev_input.start()
+
+        self.idle_policy = idle_policy if idle_policy is not None else IdlePolicy()
+        self.backlight = backlight
+        self.last_idle_minute = None
+        self.recorder = recorder
+        self.frame_delay = self.FRAME_DELAY
+        self.mirror = mirror
+
+        self.frame_rate = metrics.FrameRate()
+        self.tab_render_seconds = {name: metrics.TAB_RENDER_SECONDS.labels(name) for name in self.tabs.order}
+        self.metrics_server = metrics_server
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
+        self.render()  # The first frame, drawn while the boot pipeline is still loading
+
+    def add_boot_jobs(self):
+        """
+        Starts the warm-up on the boot pipeline.
 
-        self.current_tab = "date"
-        self.current_options_index = 0
+        Fonts, images, sounds and the music library load in parallel; each tablet
+        is imported and built as soon as what it needs is loaded, and replaces its
+        LoadingTab when installed.
+        """
+        def alarm():
+            from AlarmClockTablet import AlarmClockTablet
+            return AlarmClockTablet(self.screen, audio=self.audio, draw=self.draw, bus=self.bus)
+
+        def calendar():
+            from CalendarTablet import CalendarTablet
+            return CalendarTablet(self.screen, draw=self.draw, bus=self.bus)
+
+        def radio():
+            from RadioTablet import RadioTablet
+            return RadioTablet(self.screen, draw=self.draw, audio=self.audio, library=self.boot.result("library"),
+                               bus=self.bus)
+
+        def habit():
+            from HabitTablet import HabitTablet
+            return HabitTablet(self.screen, draw=self.draw, bus=self.bus)
+
+        def youtube():
+            from YoutubeTablet import YoutubeTablet
+            return YoutubeTablet(self.screen, draw=self.draw, bus=self.bus)
+
+        def library():
+            from RadioTablet import load_library
+            return load_library()
+
+        self.boot.add("fonts", assets.load_fonts)
+        self.boot.add("images", assets.load_images)
+        self.boot.add("sounds", self.load_sounds, install=self.start_ambient)
+        self.boot.add("library", library)
+        self.boot.add("alarm", alarm, partial(self.install_tab, "alarm", "alarm_clock_tab"),
+                      after=("fonts", "images"))
+        self.boot.add("date", calendar, partial(self.install_tab, "date", "calendar_tab"),
+                      after=("fonts", "images"))
+        self.boot.add("radio", radio, partial(self.install_tab, "radio", "radio_player_tab"),
+                      after=("fonts", "library"))
+        self.boot.add("habit", habit, partial(self.install_tab, "habit", "habit_tablet"),
+                      after=("fonts", "images"))
+        self.boot.add("youtube", youtube, partial(self.install_tab, "youtube", "youtube_tablet"), after=("fonts",))
+
+    def load_sounds(self):
+        """Decodes the ambient loop and the UI effects; runs on a boot worker."""
+        self.audio.load("intro", "media/intro_sound.wav", volume=0.5)
+        self.audio.load("flip", "media/flip.wav", maxtime=100)
+        self.audio.load("click", "media/btn_prs.wav", maxtime=150)
+
+    def start_ambient(self, _=None):
+        """Starts the ambient loop once it is decoded, paused straight away if the display is already idle."""
+        self.audio.play_ambient("intro")
+        if self.idle_policy.state != ACTIVE:
+            self.audio.pause_ambient()
+
+    def install_tab(self, name, attribute, tablet):
+        """
+        Puts a tablet built by the boot pipeline in place of its LoadingTab.
 
-        self.looping_sound = pygame.mixer.Sound("media/intro_sound.wav")
-        self.looping_sound.set_volume(0.5)
-        self.looping_sound.play(loops=-1)
+        Args:
+            name (str): Identifier of the tab.
+            attribute (str): Attribute of the app that refers to the tablet, e.g. "radio_player_tab".
+            tablet: The built tablet.
+        """
+        setattr(self, attribute, tablet)
+        self.tabs.replace(name, tablet)
+        for listener in self.tab_listeners:
+            listener(name, tablet)
 
-        self.flip_sound = pygame.mixer.Sound("media/flip.wav")
-        self.click_sound = pygame.mixer.Sound("media/btn_prs.wav")
+    def wait_until_ready(self):
+        """Blocks until every tablet is built and installed, for replays and tests that need the whole app."""
+        self.boot.wait()
 
     def draw_tabs(self):
         """
@@ -95,97 +293,203 @@ class MainApp:
         Renders and displays the names of the available tabs (STAT, DATA, RADIO)
         using the configured tab font and colors.
         """
-        clock_tab_name = self.tab_font.render("STAT", True, self.PIP_COLOUR, None)
-        calendar_tab_name = self.tab_font.render("DATA", True, self.PIP_COLOUR, None)
-        music_tab_name = self.tab_font.render("RADIO", True, self.PIP_COLOUR, None)
-        self.screen.blit(clock_tab_name, (95, 5))
-        self.screen.blit(calendar_tab_name, (220, 5))
-        self.screen.blit(music_tab_name, (350, 5))
+        for label, pos in self.tab_labels:
+            self.draw.blit(label, pos)
+
+    def set_theme(self, theme):
+        """
+        Switch the colour theme of the indexed display.
+
+        Args:
+            theme (str): One of the names in palette.THEMES
+        """
+        self.crt_shader.set_theme(theme)
 
     def handle_events(self):
         """
         Handle all pygame events in the main application loop.
 
-        Processes quit events, mouse clicks (for tab switching and controls),
-        and mouse wheel events (for scrolling through options).
+        Mouse input is translated into the same semantic actions that the evdev
+        backend posts: right click switches tabs, left click selects and the
+        wheel scrolls. Key presses go to the active tab, for typing searches.
+        Tablets and sounds that finished warming up are installed first, and
+        bus events go to their subscribers.
         """
+        if not self.boot.done:
+            self.boot.poll()
+        self.clock_events.update()
         for event in pygame.event.get():
+            if self.recorder is not None:
+                self.recorder.record(event)
+            if self.bus.dispatch(event):
+                continue
             if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+                self.quit()
+            if event.type in self.INPUT_EVENTS and self.wake():
+                continue  # The input that wakes the device is not acted on
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 3:  # Right mouse button click switches tabs
-                    self.looping_sound.stop()
-                    self.flip_sound.play(maxtime=100)
-                    pygame.time.wait(120)  # Wait for the click sound to finish
-                    self.looping_sound.play(loops=-1)  # Restart the looping sound
-                    self.switch_tab()
-                self.handle_tab_controls(event)
+                    self.handle_action(NEXT_TAB)
+                elif event.button == 1:
+                    self.handle_action(SELECT)
             elif event.type == pygame.MOUSEWHEEL:
                 self.handle_scroll(event.y)
+            elif event.type == pygame.KEYDOWN:
+                self.tabs.key(event.key, event.unicode)
+            elif event.type == INPUT_ACTION:
+                self.handle_action(event.action)
+                self.pending_input.append(event.timestamp)
+
+    def handle_action(self, action):
+        """
+        Perform a semantic input action.
+
+        Args:
+            action (str): One of NEXT_TAB, SELECT, SCROLL_UP or SCROLL_DOWN
+        """
+        if action == NEXT_TAB:
+            if self.boot.ready("sounds"):
+                self.audio.play_effect("flip")
+            self.switch_tab()
+        elif action == SELECT:
+            self.handle_select()
+        elif action == SCROLL_UP:
+            self.handle_scroll(1)
+        elif action == SCROLL_DOWN:
+            self.handle_scroll(-1)
+
+    def wake(self):
+        """
+        Register input with the idle policy and restore full activity if the device was idle.
+
+        Returns:
+            bool: True if the display was dimmed or blanked.
+        """
+        woke = self.idle_policy.touch()
+        if woke:
+            self.apply_power_state(ACTIVE)
+        return woke
+
+    def update_power_state(self):
+        """Move to the dimmed or blanked state once the idle timeouts have passed."""
+        if not self.idle_policy.enabled:
+            return
+        if self.alarm_ringing:
+            self.idle_policy.touch()  # Stay awake while the alarm rings
+        previous = self.idle_policy.state
+        state = self.idle_policy.update()
+        if state != previous:
+            self.apply_power_state(state)
+
+    def apply_power_state(self, state):
+        """
+        Switch display, shader and audio to match a power state.
+
+        While dimmed or blanked the CRT shader is skipped and the ambient loop is
+        paused; music and alarms keep playing.
+
+        Args:
+            state (str): ACTIVE, DIM or BLANK
+        """
+        if state == ACTIVE:
+            level = 1.0
+            self.crt_shader.set_shader_enabled(True)
+            self.audio.resume_ambient()
+        else:
+            level = self.idle_policy.dim_level if state == DIM else 0.0
+            self.crt_shader.set_shader_enabled(False)
+            self.audio.pause_ambient()
+        self.crt_shader.set_brightness(level)
+        if self.backlight is not None:
+            self.backlight.set_level(level)
+        # Show the new brightness straight away
+        self.render()
+
+    def idle_wait(self):
+        """
+        Sleep while dimmed or blanked until an event arrives or the next minute starts.
+
+        The wait ends on the next minute boundary, where the next pass publishes
+        MINUTE_STARTED (the alarm is checked and the dimmed clock redrawn), or
+        earlier when it is time to blank, or after STREAM_FEED_INTERVAL while an
+        internet radio stream plays, so step() keeps feeding it. An event ends it immediately and is put
+        back so handle_events sees it on the next pass.
+        """
+        timeout = self.idle_policy.seconds_until_wakeup()
+        if self.audio.stream is not None:
+            timeout = min(timeout, self.STREAM_FEED_INTERVAL)  # keep the radio stream playing
+        event = pygame.event.wait(int(timeout * 1000) + 1)
+        if event.type != pygame.NOEVENT:
+            pygame.event.post(event)
+
+    def on_alarm_fired(self, event):
+        """Wakes the display when the alarm rings and keeps it awake until the alarm stops."""
+        self.alarm_ringing = True
+        self.wake()
+
+    def on_alarm_stopped(self, event):
+        """Lets the display dim again once the alarm was snoozed or its minute passed."""
+        self.alarm_ringing = False
+
+    def on_minute_started(self, event):
+        """Redraws the dimmed clock, the only frame drawn while dimmed."""
+        if self.idle_policy.state == DIM:
+            self.render()
+
+    def quit(self):
+        """Save unsaved tab data, stop the input, mirror and present threads, close the recording and exit."""
+        for tablet in self.tabs.tabs.values():
+            flush = getattr(tablet, "flush", None)
+            if flush is not None:
+                flush()
+        if self.evdev_input is not None:
+            self.evdev_input.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.mirror is not None:
+            self.mirror.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.present_process:
+            self.crt_shader.stop()
+            print(self.crt_shader.report())
+        if self.input_latency.count:
+            print(self.input_latency.report())
+        if self.draw.stats.frames:
+            print(self.draw.stats.report())
+        print(self.boot.report())
+        pygame.quit()
+        exit()
+
+    @property
+    def current_tab(self):
+        """Identifier of the currently active tab."""
+        return self.tabs.current
 
     def switch_tab(self):
         """
-        Cycle through the available tabs in a predefined order.
+        Cycle through the registered tabs in registration order.
 
         The tab order is: date -> alarm -> radio -> habit -> youtube -> date...
-        Updates the current_tab attribute to reflect the newly selected tab.
         """
-        tab_order = ["date", "alarm", "radio", "habit", "youtube"]
-        current_index = tab_order.index(self.current_tab)
-        self.current_tab = tab_order[(current_index + 1) % len(tab_order)]
+        self.tabs.next_tab()
 
     def click_sfx(self):
-        """ Click sound for button 1 click """
-        self.looping_sound.stop()
-        self.click_sound.play(maxtime=150)
-        pygame.time.wait(170)  # Wait for the click sound to finish
-        self.looping_sound.play(loops=-1)  # Restart the looping sound
+        """ Click sound for button 1 click, the ambient loop ducks underneath it """
+        if self.boot.ready("sounds"):
+            self.audio.play_effect("click")
 
-    def handle_tab_controls(self, event):
+    def handle_select(self):
         """
-        Handle control events specific to the currently active tab.
+        Handle a select click for the currently active tab.
 
-        Args:
-            event (pygame.Event): The pygame event to handle
-        """
-        if self.current_tab == "alarm":
-            if event.button == 1:
-                self.click_sfx()
-                if self.alarm_clock_tab.alarm_triggered_flag:  # Ensures Alarm is active to avoid error
-                    self.radio_player_tab.pause_music()
-                    self.alarm_clock_tab.snooze()  # Snoozes Alarm
-                if self.current_options_index == 1:
-                    self.alarm_clock_tab.increment_dial_h()
-                elif self.current_options_index == 2:
-                    self.alarm_clock_tab.increment_dial_m()
-                elif self.current_options_index == 3:
-                    self.alarm_clock_tab.set_alarm()
-                    self.current_tab = "date"
-        elif self.current_tab == "date":
-            if event.button == 1:
-                self.click_sfx()
-                if self.alarm_clock_tab.alarm_triggered_flag:  # Ensures Alarm is active to avoid error
-                    self.radio_player_tab.pause_music()
-                    self.alarm_clock_tab.snooze()  # Snoozes Alarm
-        elif self.current_tab == "radio":
-            if event.button == 1:
-                self.click_sfx()
-                if self.alarm_clock_tab.alarm_triggered_flag:  # Ensures Alarm is active to avoid error
-                    self.radio_player_tab.pause_music()
-                    self.alarm_clock_tab.snooze()  # Snoozes Alarm
-                self.radio_player_tab.play_selected_song()
-        elif self.current_tab == "habit":
-            if event.button == 1:
-                self.click_sfx()
-                if self.alarm_clock_tab.alarm_triggered_flag:  # Ensures Alarm is active to avoid error
-                    self.radio_player_tab.pause_music()
-                    self.alarm_clock_tab.snooze()  # Snoozes Alarm
-                self.habit_tablet.increment_btn()
-        elif self.current_tab == "youtube":
-            if self.alarm_clock_tab.alarm_triggered_flag:  # Ensures Alarm is active to avoid error
-                self.radio_player_tab.pause_music()
-                self.alarm_clock_tab.snooze()  # Snoozes Alarm
+        Any click first snoozes a ringing alarm (the radio pauses on ALARM_SNOOZED),
+        then the click is dispatched to the active tab through the tab registry.
+        """
+        self.click_sfx()
+        if self.alarm_clock_tab is not None and self.alarm_clock_tab.alarm_triggered_flag:  # Ensures Alarm is active
+            self.alarm_clock_tab.snooze()  # Snoozes Alarm
+        self.tabs.click()
 
     def handle_scroll(self, direction):
         """
@@ -194,28 +498,7 @@ class MainApp:
         Args:
             direction (int): The direction of scrolling (positive for up, negative for down)
         """
-        if self.current_tab == "alarm":
-            # Define selectable options
-            options = ["Blank", "HOUR DIAL", "MINUTE DIAL", "SET ALARM"]
-            self.current_options_index = (self.current_options_index - direction) % len(options)
-        elif self.current_tab == "radio":
-            if direction > 0:
-                if self.radio_player_tab.current_index > 0:
-                    self.radio_player_tab.current_index = (self.radio_player_tab.current_index - 1)  # scrolls up
-                else:
-                    self.radio_player_tab.resume_music()  # resume music if scroll too high
-                    self.radio_player_tab.current_index = -1
-            elif direction < 0:
-                if self.radio_player_tab.current_index >= 8:
-                    self.radio_player_tab.pause_music()  # pauses music if scrolls too high
-                    self.radio_player_tab.current_index = 9
-                else:
-                    self.radio_player_tab.current_index = (self.radio_player_tab.current_index + 1)  # scrolls down
-        elif self.current_tab == "habit":
-            if direction > 0 and self.habit_tablet.current_index > 0:
-                self.habit_tablet.current_index -= 1
-            elif direction < 0 and self.habit_tablet.current_index < 4:
-                self.habit_tablet.current_index += 1
+        self.tabs.scroll(direction)
 
     def render(self):
         """
@@ -224,71 +507,122 @@ class MainApp:
         This includes the background, tabs, and the content of the currently active tab.
         Also handles the CRT shader effect and manages the display flip.
         """
-        self.screen.blit(self.background, (0, 0))
+        started = time.perf_counter()
+        self.draw.blit(self.background, (0, 0))
         self.draw_tabs()
 
-        if self.current_tab == "date":
-            self.calendar_tab.render()
-        elif self.current_tab == "alarm":
-            self.alarm_clock_tab.render()
-            # Background Image for dial Buttons
-            dial_img = pygame.image.load("media/black_background.png")
-            dial_img = pygame.transform.scale(dial_img, (50, 35))
-
-            # Background Image for alarm Buttons
-            alarm_img = pygame.image.load("media/black_background.png")
-            alarm_img = pygame.transform.scale(alarm_img, (100, 20))
-
-            cursor_pos = pygame.mouse.get_pos()
-            # Hour Dial Button Creation
-            dial_h = Button(image=dial_img, pos=(195, 215),
-                            text_input="{:02d}".format(self.alarm_clock_tab.increment_h), font=self.dial_font,
-                            base_color=self.BRIGHT_PIP_COLOUR
-                            if self.current_options_index == 1 else self.MID_PIP_COLOUR,
-                            hovering_color=self.PIP_COLOUR)
-
-            # Minute Dial Button Creation
-            dial_m = Button(image=dial_img, pos=(275, 215),
-                            text_input="{:02d}".format(self.alarm_clock_tab.increment_m), font=self.dial_font,
-                            base_color=self.BRIGHT_PIP_COLOUR
-                            if self.current_options_index == 2 else self.MID_PIP_COLOUR,
-                            hovering_color=self.PIP_COLOUR)
-
-            # Alarm Button Creation
-            alarm_btn = Button(image=alarm_img, pos=(235, 242),
-                               text_input="Set Alarm", font=self.alarm_font,
-                               base_color=self.BRIGHT_PIP_COLOUR
-                               if self.current_options_index == 3 else self.MID_PIP_COLOUR,
-                               hovering_color=self.PIP_COLOUR)
-
-            # Button initialization
-            for button in [dial_h, dial_m, alarm_btn]:
-                button.change_color(cursor_pos)
-                button.update(self.screen)
-
-        elif self.current_tab == "radio":
-            self.radio_player_tab.render()
-        elif self.current_tab == "habit":
-            self.habit_tablet.render()
-        elif self.current_tab == "youtube":
-            self.youtube_tablet.render()
-
-        self.alarm_clock_tab.check_alarm()
-        self.alarm_clock_tab.build_bottom_bracket()
+        tab = self.tabs.current
+        tab_started = time.perf_counter()
+        self.tabs.render()
+        self.tab_render_seconds[tab].observe(time.perf_counter() - tab_started)
+
+        if self.alarm_clock_tab is not None:
+            self.alarm_clock_tab.build_bottom_bracket()
+        # Everything above was only queued; draw it in one batch
+        self.draw.end_frame()
+        if self.mirror is not None:
+            if self.compositor == "gpu":
+                self.draw.read_into(self.screen)  # the screen surface is not drawn otherwise
+            self.mirror.submit(self.screen)
         pygame.display.flip()
-        crt_shader.Graphic_engine.__call__(self.crt_shader)
-        pygame.time.delay(60)
+        self.crt_shader()
+        finished = time.perf_counter()
+        metrics.FRAME_SECONDS.observe(finished - started)
+        self.frame_rate.tick(finished)
+        self.boot.mark("first_frame")
+
+        # Inputs handled this frame are now visible
+        if self.pending_input:
+            now = time.monotonic()
+            for timestamp in self.pending_input:
+                self.input_latency.record(now - timestamp)
+            self.pending_input.clear()
+
+    def step(self):
+        """
+        Run one pass of the main loop: handle input, update the power state and audio and draw or idle.
+        """
+        self.handle_events()
+        self.update_power_state()
+        self.audio.update()  # on every pass, so fades finish and a radio stream is fed on any tab and while idle
+        if self.idle_policy.state == ACTIVE:
+            self.render()
+            if self.frame_delay:
+                pygame.time.delay(self.frame_delay)
+        else:
+            self.idle_wait()
 
     def run(self):
         """
         Run the main application loop.
 
         Continuously processes events and renders the application until quit.
+        After a period without input the display dims and then blanks, and
+        rendering drops to one update per minute until the next input.
         """
         while True:
-            self.handle_events()
-            self.render()
+            self.step()
+
+def parse_args():
+    """Parse the command line options for starting PAUL-BOY."""
+    parser = argparse.ArgumentParser(description="PAUL-BOY")
+    parser.add_argument("--indexed", action="store_true",
+                        help="render into an 8-bit palette surface resolved on the GPU")
+    parser.add_argument("--theme", choices=sorted(palette.THEMES), default=palette.DEFAULT_THEME,
+                        help="colour theme for the indexed mode")
+    parser.add_argument("--framebuffer", metavar="PATH",
+                        help="write RGB565 frames to a framebuffer device (e.g. /dev/fb1) instead of OpenGL")
+    parser.add_argument("--input", metavar="DEVICE", action="append",
+                        help="evdev device for the rotary encoder or buttons, may be given more than once")
+    parser.add_argument("--dim-after", metavar="SECONDS", type=float, default=60,
+                        help="dim the display after this long without input, 0 disables")
+    parser.add_argument("--blank-after", metavar="SECONDS", type=float, default=300,
+                        help="blank the display after this long without input, 0 disables")
+    parser.add_argument("--backlight", metavar="PATH", nargs="?", const="",
+                        help="also dim the sysfs backlight (defaults to the first one found)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record all input to a file that input_replay.py can replay as a benchmark")
+    parser.add_argument("--mirror", metavar="[HOST:]PORT", nargs="?", const="127.0.0.1:8765",
+                        help="stream the screen to mirror_viewer.py (defaults to 127.0.0.1:8765)")
+    parser.add_argument("--quality", choices=render_quality.TIERS, default=render_quality.OFF,
+                        help="CRT post-processing: low adds phosphor glow and a vignette, high adds bloom")
+    parser.add_argument("--gpu-budget", metavar="MS", type=float, default=10.0,
+                        help="step the quality down when GPU frame time stays above this, 0 disables")
+    parser.add_argument("--compositor", choices=["cpu", "gpu"], default="cpu",
+                        help="gpu draws text, icons and rectangles as one batch of quads on the GPU")
+    parser.add_argument("--present-process", action="store_true",
+                        help="present frames from a separate process so GPU and vsync stalls never delay input")
+    parser.add_argument("--metrics", metavar="ADDRESS", nargs="?", const="127.0.0.1:9100",
+                        help="serve Prometheus metrics on [HOST:]PORT or unix:PATH (defaults to 127.0.0.1:9100)")
+    parser.add_argument("--legacy-loop", action="store_true",
+                        help="run the plain blocking main loop instead of the asyncio runtime")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    app = MainApp()
-    app.run()
\ No newline at end of file
+    args = parse_args()
+    backlight = None
+    if args.backlight is not None:
+        backlight = Backlight(args.backlight or None)
+    recorder = None
+    if args.record:
+        from input_replay import InputRecorder
+        recorder = InputRecorder(args.record)
+    mirror = None
+    if args.mirror:
+        from mirror_server import MirrorServer, parse_address
+        mirror = MirrorServer(*parse_address(args.mirror))
+    metrics_server = None
+    if args.metrics:
+        metrics_server = metrics.MetricsServer(args.metrics)
+    app = MainApp(indexed=args.indexed, theme=args.theme, framebuffer=args.framebuffer,
+                  input_devices=args.input,
+                  idle_policy=IdlePolicy(dim_after=args.dim_after, blank_after=args.blank_after),
+                  backlight=backlight, recorder=recorder, mirror=mirror,
+                  quality=args.quality, gpu_budget=args.gpu_budget, metrics_server=metrics_server,
+                  compositor=args.compositor, present_process=args.present_process)
+    if args.legacy_loop:
+        app.run()
+    else:
+        from async_runtime import AsyncRuntime
+        AsyncRuntime(app).run()
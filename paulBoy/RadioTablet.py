@@ -1,17 +1,70 @@
+import assets
+import clock
 import pygame
-import os
 import math
+from draw_list import DrawList
+from event_bus import ALARM_SNOOZED, TRACK_ENDED
+from icecast_stream import StreamPlayer, is_stream, read_stations
+from music_index import MusicIndex, scan_library, title_key
+from track_analysis import WAVEFORM_WIDTH, TrackAnalyzer, gain_factor
+
+
+def load_library(music_folder="media/music", stations_file="media/stations.m3u"):
+    """
+    Lists the songs below a folder and the stations of an M3U file, sorted by title.
+
+    Args:
+        music_folder (str): The library folder.
+        stations_file (str): M3U file of internet radio stations, may be missing.
+
+    Returns:
+        list: Track objects.
+    """
+    tracks = scan_library(music_folder) + read_stations(stations_file)
+    tracks.sort(key=title_key)
+    return tracks
 
 class RadioTablet:
     """
     A music player tab that allows the user to navigate a playlist, play, pause, stop, and visualize music.
 
+    The playlist is sorted by title and only the rows in view are drawn, so it
+    copes with large libraries. Above Resume sit two more entries: Find opens a
+    dial for spelling a search, whose matches replace the playlist, and Jump
+    opens a dial that moves the highlight to the titles starting with a letter.
+    Searches can be typed on a keyboard too.
+
+    Internet radio stations listed in an M3U file join the playlist and play
+    as streams on the audio bus' stream channel, with the station's now-playing
+    title in the marquee and the stream buffer's fill level shown below the waveform.
+
+    Songs are analysed in the background by a TrackAnalyzer. Once a song's
+    analysis is cached it plays at the reference loudness, and while it plays
+    its waveform thumbnail below the visualizer doubles as a progress bar.
+
     Attributes:
         screen (pygame.Surface): The screen surface where elements are drawn.
+        draw (DrawList): Per-frame draw list the tab queues its drawing on.
         font (pygame.font.Font): Font for displaying text.
-        playlist (list): A list of music file paths.
-        current_index (int): Index of the currently highlighted song.
+        audio (AudioBus): Owner of the stream channel, None to use mixer channel 0.
+        playlist (list): Music file paths and stream URLs, sorted by title.
+        index (MusicIndex): Search index over the titles, artists and albums of the playlist.
+        rows (list): Track ids shown in the list, every track or the matches of the query.
+        query (str): The current search, empty when the whole playlist is shown.
+        mode (str): FIND or JUMP while that dial is open, None otherwise.
+        dial_position (int): Selected character of the open dial.
+        top (int): First row in view.
+        current_index (int): Index of the highlighted row; -1 is Resume, -2 Find, -3 Jump
+            and len(rows) is Pause.
         is_playing (bool): Indicates if a song is currently playing.
+        stream (StreamPlayer): The internet radio stream playing, None when playing a file or nothing.
+        stream_paused (bool): True while a stream is stopped by Pause and can be resumed.
+        analyzer (TrackAnalyzer): Loudness, peak and waveform analysis of the songs.
+        track_elapsed (float): Seconds of the current song played before it was last paused.
+        track_started (float): Clock time the current song was last started or resumed, None while paused.
+        overview (tuple): (path, unplayed, played) waveform thumbnails of the current song.
+        background_refresh (bool): Set by the async runtime; the analysis then also runs while other tabs are shown.
+        bus (EventBus): Event bus that tells the tab when a song ended or the alarm was snoozed, if any.
         wave_phase (float): Controls the oscillation movement for the visualizer.
         wave_amplitude (int): Height of the waveform oscillation.
         wave_frequency (float): Speed of the oscillation effect.
@@ -20,60 +73,143 @@ class RadioTablet:
     MID_PIP_COLOUR = (1, 150, 9)
     DARK_PIP_COLOUR = (1, 50, 9)
     RED = (255, 0, 0)
+    FRAME = [(3, 40, 2, 8), (3, 40, 338, 2), (340, 20, 2, 22), (340, 20, 5, 2),
+             (430, 20, 2, 22), (427, 20, 5, 2), (430, 40, 45, 2), (475, 40, 2, 8)]
+    WAVE_FRAME = [(325, 200, 130, 2), (455, 77, 2, 125)]
+    OVERVIEW = (325, 203, WAVEFORM_WIDTH, 10)
+    refresh_interval = 0.5  # seconds between analysis steps under the async runtime, whichever tab is shown
+    DOT_RADIUS = 2
+    VISIBLE_ROWS = 9
+    RESUME = -1
+    FIND = -2
+    JUMP = -3
+    DELETE = "<"
+    DONE = "OK"
+    LETTERS = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789")
+    FIND_DIAL = LETTERS + [" ", DELETE, DONE]
 
-    def __init__(self, screen, music_folder="media/music"):
+    def __init__(self, screen, music_folder="media/music", draw=None, audio=None, stations_file="media/stations.m3u",
+                 library=None, analyzer=None, bus=None):
         self.screen = screen
-        self.font = pygame.font.Font("media/monofonto rg.otf", 20)
+        self.audio = audio
+        self.draw = draw if draw is not None else DrawList(screen)
+        self.font = assets.font(20)
 
-        # Initialize pygame mixer for music playback
-        pygame.mixer.init()
-        pygame.mixer.set_num_channels(1)
+        # The mixer is owned by the AudioBus; music plays through pygame.mixer.music, streams on its stream channel
 
         self.wave_phase = 0  # Controls the oscillation movement
         self.wave_amplitude = 30  # Height of the wave
         self.wave_frequency = 0.2  # Speed of oscillation
         self.music_folder = music_folder
-        self.playlist = self.create_song_playlist()
-        self.current_index = 0  # Tracks which song is highlighted
+        self.stations_file = stations_file
+        self.index = MusicIndex()
+        self.playlist = self.create_song_playlist(library)
+        self.index.step()  # small libraries are searchable straight away, big ones finish over the next frames
+        self.query = ""
+        self.rows = range(len(self.playlist))
+        self.rows_version = self.index.version
+        self.mode = None
+        self.dial_position = 0
+        self.top = 0
+        self.current_index = 0  # Tracks which row is highlighted
         self.is_playing = False
         self.currently_playing = 0
         self.scroll_offset = 325
+        self.stream = None
+        self.stream_paused = False
+        self.track_elapsed = 0.0
+        self.track_started = None
+        self.overview = None
+        self.background_refresh = False
 
         # Load first song if available
-        if self.playlist:
-            pygame.mixer.music.load(self.playlist[self.current_index])
+        files = [path for path in self.playlist if not is_stream(path)]
+        if files:
+            pygame.mixer.music.load(files[0])
+        self.analyzer = analyzer if analyzer is not None else TrackAnalyzer()
+        self.analyzer.add(files)
+
+        # SDL_mixer posts TRACK_ENDED whenever pygame.mixer.music stops, so nothing polls get_busy() per frame
+        pygame.mixer.music.set_endevent(TRACK_ENDED)
+        self.bus = bus
+        if self.bus is not None:
+            self.bus.subscribe(TRACK_ENDED, self.on_track_ended)
+            self.bus.subscribe(ALARM_SNOOZED, self.on_alarm_snoozed)
+
+    def create_song_playlist(self, library=None):
+        """
+        Loads all MP3 files below the given folder and the stations into a playlist and queues them for indexing.
+
+        Args:
+            library (list): Tracks already listed by load_library, e.g. during boot; scanned here if None.
+        """
+        tracks = library if library is not None else load_library(self.music_folder, self.stations_file)
+        self.index.add(tracks)
+        return [track.path for track in tracks]
+
+    @property
+    def pause_index(self):
+        """Row index of the Pause entry, just past the last row."""
+        return len(self.rows)
 
-    def create_song_playlist(self):
-        """Loads all MP3 files from the given folder into a playlist."""
-        return [os.path.join(self.music_folder, file) for file in os.listdir(self.music_folder) if file.endswith(".mp3")]
+    def refresh_rows(self):
+        """Shows the matches of the query, or the whole playlist, and highlights the first one."""
+        self.rows = self.index.search(self.query) if self.query else range(len(self.playlist))
+        self.rows_version = self.index.version
+        self.top = 0
+        if self.mode is None or self.current_index >= 0:
+            self.current_index = 0 if self.rows else self.FIND
+
+    def update_index(self):
+        """Indexes the next batch of tracks and refreshes a search once more tracks are searchable."""
+        if self.index.step() and self.query and self.rows_version != self.index.version:
+            self.rows = self.index.search(self.query)
+            self.rows_version = self.index.version
+            self.current_index = min(self.current_index, self.pause_index)
 
     def draw_radio_frame(self):
         """Draws the decorative frame around the music player."""
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 2, 8))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 338, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(340, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(340, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(430, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(427, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(430, 40, 45, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(475, 40, 2, 8))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(325, 200, 130, 2))
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(455, 77, 2, 125))
+        self.draw.chrome("radio", self.MID_PIP_COLOUR, self.FRAME)
+        self.draw.chrome("radio wave", self.PIP_COLOUR, self.WAVE_FRAME)
+
+    def scroll_into_view(self):
+        """Moves the visible rows so the highlighted one is among them."""
+        if 0 <= self.current_index < len(self.rows):
+            if self.current_index < self.top:
+                self.top = self.current_index
+            elif self.current_index >= self.top + self.VISIBLE_ROWS:
+                self.top = self.current_index - self.VISIBLE_ROWS + 1
 
     def draw_selection_frame(self):
         """Draws a selection box around the currently highlighted song."""
-        if self.current_index >= 0 and self.current_index <= 8:
-            pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(30, 80 + self.current_index * 20, 250, 18))
-            pygame.draw.rect(self.screen, self.DARK_PIP_COLOUR, pygame.Rect(35, 84 + self.current_index * 20, 10, 10))
+        if 0 <= self.current_index < len(self.rows):
+            row = self.current_index - self.top
+            self.draw.rect(self.PIP_COLOUR, (30, 80 + row * 20, 250, 18))
+            self.draw.rect(self.DARK_PIP_COLOUR, (35, 84 + row * 20, 10, 10))
 
     def draw_playlist(self):
-        """Displays the list of songs with the highlighted selection frame."""
-        for i, song in enumerate(self.playlist):
-            song_name = os.path.basename(song)[:-4]  # Remove ".mp3" extension
-            song_name = self.minimize(song_name)
+        """Displays the rows in view with the highlighted selection frame."""
+        if self.query and not self.rows:
+            self.draw.text(self.font, "No matches", self.MID_PIP_COLOUR, (50, 77))
+        for i in range(self.top, min(self.top + self.VISIBLE_ROWS, len(self.rows))):
+            song_name = self.minimize(self.index.tracks[self.rows[i]].title)
             color = self.DARK_PIP_COLOUR if i == self.current_index else self.PIP_COLOUR
-            song_surface = self.font.render(song_name, True, color, None)
-            self.screen.blit(song_surface, (50, 77 + i * 20))
+            self.draw.text(self.font, song_name, color, (50, 77 + (i - self.top) * 20))
+
+    def dial_characters(self):
+        """The characters of the open dial."""
+        return self.FIND_DIAL if self.mode == self.FIND else self.LETTERS
+
+    def draw_search(self):
+        """Shows the query being spelled, with the dial's character in red, below the waveform."""
+        if self.mode is None and not self.query:
+            return
+        label = "Jump " if self.mode == self.JUMP else "Find " + self.query.upper()[-9:]
+        self.draw.text(self.font, label, self.PIP_COLOUR, (325, 235))
+        if self.mode is not None:
+            character = self.dial_characters()[self.dial_position]
+            self.draw.text(self.font, "_" if character == " " else character, self.RED,
+                           (325 + self.font.size(label)[0], 235))
 
     def minimize(self, songtext):
         """
@@ -86,73 +222,301 @@ class RadioTablet:
 
     def play_selected_song(self):
         """Plays the currently selected song."""
-        if self.playlist:
-            pygame.mixer.music.load(self.playlist[self.current_index])
-            pygame.mixer.music.play()
+        if 0 <= self.current_index < len(self.rows):
+            track_id = self.rows[self.current_index]
+            self.stop_stream()
+            if is_stream(self.playlist[track_id]):
+                pygame.mixer.music.stop()
+                self.start_stream(self.playlist[track_id])
+            else:
+                pygame.mixer.music.load(self.playlist[track_id])
+                self.set_track_gain(self.playlist[track_id])
+                pygame.mixer.music.play()
+                self.track_elapsed = 0.0
+                self.track_started = clock.monotonic()
             self.is_playing = True
-            self.currently_playing = self.current_index
+            self.currently_playing = track_id
+
+    def set_track_gain(self, path):
+        """Turns the music down to the reference loudness for a song, if it is analysed."""
+        gain = gain_factor(self.analyzer.get(path))
+        if self.audio is not None:
+            self.audio.set_track_gain(gain)
+        else:
+            pygame.mixer.music.set_volume(gain)
+
+    def track_position(self):
+        """Seconds of the current song played so far, following the app clock so replays draw the same frames."""
+        if self.track_started is None:
+            return self.track_elapsed
+        return self.track_elapsed + clock.monotonic() - self.track_started
+
+    def start_stream(self, url):
+        """Connects to a stream; it starts playing once its prebuffer is full."""
+        channel = self.audio.stream_channel if self.audio is not None else pygame.mixer.Channel(0)
+        self.stream = StreamPlayer(url, channel)
+        self.stream_paused = False
+        if self.audio is not None:
+            self.audio.stream = self.stream  # fed on every pass of the main loop, not only while this tab renders
+
+    def stop_stream(self):
+        """Disconnects from the stream, if one is playing."""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+            if self.audio is not None:
+                self.audio.stream = None
+        self.stream_paused = False
 
     def pause_music(self):
-        """Pauses the currently playing song."""
-        if pygame.mixer.music.get_busy():
+        """Pauses the currently playing song; a stream is disconnected, as live radio cannot be held."""
+        if self.stream is not None:
+            self.stop_stream()
+            self.stream_paused = True
+            self.is_playing = False
+        elif pygame.mixer.music.get_busy():
             pygame.mixer.music.pause()
             self.is_playing = False
+            self.track_elapsed = self.track_position()
+            self.track_started = None
 
     def resume_music(self):
-        """Resumes the paused song."""
-        pygame.mixer.music.unpause()
+        """Resumes the paused song, or reconnects to the paused stream."""
+        if self.stream_paused:
+            self.start_stream(self.playlist[self.currently_playing])
+        else:
+            pygame.mixer.music.unpause()
+            if self.track_started is None and self.track_elapsed:
+                self.track_started = clock.monotonic()
         self.is_playing = True
 
     def stop_music(self):
         """Stops the currently playing song."""
         pygame.mixer.music.stop()
+        self.stop_stream()
         self.is_playing = False
+        self.track_elapsed = 0.0
+        self.track_started = None
+
+    def on_track_ended(self, event):
+        """Shows a song that played to its end as stopped; a stop, or a song already playing again, is ignored."""
+        if self.is_playing and self.stream is None and not pygame.mixer.music.get_busy():
+            self.is_playing = False
+            self.track_elapsed = 0.0
+            self.track_started = None
+
+    def on_alarm_snoozed(self, event):
+        """Pauses the music when the alarm is snoozed."""
+        self.pause_music()
+
+    async def refresh(self, run_blocking):
+        """
+        Async refresh hook: collects finished analyses and hands out more, which never blocks.
+
+        Args:
+            run_blocking: Coroutine function that runs a blocking call in the runtime's executor; unused.
+        """
+        self.analyzer.step()
+
+    def flush(self):
+        """Stops the analysis and saves what it found, called before the app exits."""
+        self.analyzer.close()
+
+    def handle_click(self):
+        """
+        Plays the highlighted song when the select button is clicked.
+
+        On Find or Jump the click opens that dial; while a dial is open it picks the dial's character.
+        """
+        if self.mode == self.FIND:
+            self.pick_character(self.FIND_DIAL[self.dial_position])
+        elif self.mode == self.JUMP:
+            self.mode = None
+        elif self.current_index in (self.FIND, self.JUMP):
+            self.mode = self.current_index
+            self.dial_position = 0
+            if self.mode == self.JUMP:
+                self.jump()
+        elif self.current_index == self.RESUME:
+            self.resume_music()
+        elif self.current_index == self.pause_index:
+            self.pause_music()
+        else:
+            self.play_selected_song()
+
+    def pick_character(self, character):
+        """
+        Applies a character picked on the Find dial.
+
+        Args:
+            character (str): A letter, digit or space to add, DELETE or DONE.
+        """
+        if character == self.DONE:
+            self.mode = None
+            self.current_index = 0 if self.rows else self.FIND
+            return
+        self.query = self.query[:-1] if character == self.DELETE else self.query + character.lower()
+        self.refresh_rows()
+
+    def jump(self):
+        """Highlights the first title starting with the Jump dial's letter."""
+        if self.rows:
+            self.current_index = self.index.jump(self.LETTERS[self.dial_position], self.rows)
+
+    def handle_key(self, key, text):
+        """
+        Types a search: characters filter the list, backspace deletes, escape clears it.
+
+        Args:
+            key (int): pygame key code.
+            text (str): The character the key typed.
+        """
+        if key == pygame.K_ESCAPE:
+            self.mode = None
+            self.query = ""
+        elif key == pygame.K_BACKSPACE:
+            self.query = self.query[:-1]
+        elif key == pygame.K_RETURN:
+            if self.mode is None:
+                self.play_selected_song()
+            self.mode = None
+            return
+        elif text and text.isprintable():
+            self.mode = None
+            self.query += text
+        else:
+            return
+        self.refresh_rows()
+
+    def handle_scroll(self, direction):
+        """
+        Moves the highlight through the playlist, or turns the open dial.
+
+        Scrolling past the top resumes the music and scrolling past the bottom pauses it.
+        Above Resume are Find and Jump.
+
+        Args:
+            direction (int): Positive for up, negative for down.
+        """
+        if self.mode is not None:
+            step = -1 if direction > 0 else 1
+            self.dial_position = (self.dial_position + step) % len(self.dial_characters())
+            if self.mode == self.JUMP:
+                self.jump()
+        elif direction > 0:
+            if self.current_index > 0:
+                self.current_index = (self.current_index - 1)  # scrolls up
+            elif self.current_index == 0:
+                self.resume_music()  # resume music if scroll too high
+                self.current_index = self.RESUME
+            else:
+                self.current_index = max(self.current_index - 1, self.JUMP)
+        elif direction < 0:
+            if self.current_index >= self.pause_index - 1:
+                self.pause_music()  # pauses music if scrolls too high
+                self.current_index = self.pause_index
+            else:
+                self.current_index = (self.current_index + 1)  # scrolls down
 
     def update_visualizer(self):
         """
         Updates the waveform visualizer by shifting the phase of the oscillating wave.
         """
-        if pygame.mixer.music.get_busy():
+        if self.is_playing and (self.stream is None or self.stream.channel.get_busy()):
             self.wave_phase += self.wave_frequency  # Move the wave over time
 
+    def draw_stream_buffer(self):
+        """Shows how full the stream buffer is as a bar below the waveform."""
+        self.draw.rect(self.DARK_PIP_COLOUR, (325, 204, 130, 4))
+        self.draw.rect(self.PIP_COLOUR, (325, 204, round(130 * self.stream.buffer_fill), 4))
+
+    def build_overview(self, columns, colour):
+        """Draws a waveform thumbnail as one bar per column, rising from the bottom of a colour-keyed surface."""
+        height = self.OVERVIEW[3]
+        surface = self.draw.surface((len(columns), height))
+        surface.fill((0, 0, 0))
+        surface.set_colorkey((0, 0, 0))
+        for x, level in enumerate(columns):
+            bar = max(1, round(level * height / 255))
+            surface.fill(colour, (x, height - bar, 1, bar))
+        return surface
+
+    def draw_track_overview(self):
+        """Shows the playing song's waveform below the visualizer, the part already played in bright green."""
+        if self.stream is not None or (self.track_started is None and not self.track_elapsed):
+            return
+        path = self.playlist[self.currently_playing]
+        analysis = self.analyzer.get(path)
+        if analysis is None:
+            return
+        if self.overview is None or self.overview[0] != path:
+            columns = bytes.fromhex(analysis["waveform"])
+            self.overview = (path, self.build_overview(columns, self.DARK_PIP_COLOUR),
+                             self.build_overview(columns, self.PIP_COLOUR))
+        x, y, width, height = self.OVERVIEW
+        played = round(width * min(1.0, self.track_position() / analysis["duration"])) if analysis["duration"] else 0
+        self.draw.blit(self.overview[1], (x, y))
+        if played:
+            self.draw.blit(self.overview[2], (x, y), (0, 0, played, height))
+
+    def build_dot(self):
+        """Renders one waveform dot, a colour-keyed sprite reused for every point."""
+        size = self.DOT_RADIUS * 2 + 1
+        dot = self.draw.surface((size, size))
+        dot.fill((0, 0, 0))
+        dot.set_colorkey((0, 0, 0))
+        pygame.draw.circle(dot, self.PIP_COLOUR, (self.DOT_RADIUS, self.DOT_RADIUS), self.DOT_RADIUS)
+        return dot
+
     def draw_waveform(self):
         """
         Draws an oscillating waveform across the screen.
         """
 
-        start_x = 325
-        center_y = 150
-        wave_color = self.PIP_COLOUR
+        start_x = 325 - self.DOT_RADIUS
+        center_y = 150 - self.DOT_RADIUS
 
         for x in range(0, 125, 5):  # Draw points from left to right
             y_offset = int(self.wave_amplitude * math.sin((x * 0.05) + self.wave_phase))
-            pygame.draw.circle(self.screen, wave_color, (start_x + x, center_y + y_offset), 2)
+            self.draw.sprite("wave dot", self.build_dot, (start_x + x, center_y + y_offset))
 
     def pause_play_indicator(self):
         """Builds the pause and play button for the radio tab"""
-        pause = self.font.render("Pause", True, self.DARK_PIP_COLOUR, None)
-        if self.current_index == 9:
-            pause = self.font.render("Pause", True, self.RED, None)
-        self.screen.blit(pause, (100, 255))
-        resume = self.font.render("Resume", True, self.DARK_PIP_COLOUR, None)
-        if self.current_index == -1:
-             resume = self.font.render("Resume", True, self.RED, None)
-        self.screen.blit(resume, (100, 55))
+        pause_colour = self.RED if self.current_index == self.pause_index else self.DARK_PIP_COLOUR
+        self.draw.text(self.font, "Pause", pause_colour, (100, 255))
+        resume_colour = self.RED if self.current_index == self.RESUME else self.DARK_PIP_COLOUR
+        self.draw.text(self.font, "Resume", resume_colour, (100, 55))
+        find_colour = self.RED if self.current_index == self.FIND else self.DARK_PIP_COLOUR
+        self.draw.text(self.font, "Find", find_colour, (185, 55))
+        jump_colour = self.RED if self.current_index == self.JUMP else self.DARK_PIP_COLOUR
+        self.draw.text(self.font, "Jump", jump_colour, (240, 55))
 
     def render(self):
         """Renders the music player interface."""
-        self.screen.fill((0, 0, 0), (0, 50, 480, 200))  # Black background
+        self.draw.rect((0, 0, 0), (0, 50, 480, 200))  # Black background
 
+        self.update_index()
+        self.scroll_into_view()
         self.draw_radio_frame()
         self.draw_selection_frame()
         self.draw_playlist()
+        self.draw_search()
+        if self.stream is not None:
+            if self.audio is None:
+                self.stream.update()  # without an AudioBus nothing else feeds the channel
+            self.draw_stream_buffer()
+        if not self.background_refresh:
+            self.analyzer.step()
+        self.draw_track_overview()
         self.update_visualizer()
         self.draw_waveform()
         self.pause_play_indicator()
         # Scrolling effect for the currently playing song (wraps between 380 and 325)
         if self.is_playing and self.playlist:
-            song_name = os.path.basename(self.playlist[self.currently_playing])[:-4]
-            song_surface = self.font.render(song_name, True, self.RED, None)
+            song_name = self.index.tracks[self.currently_playing].title
+            if self.stream is not None:
+                song_name = self.stream.now_playing or song_name  # the station's now-playing title
+            song_surface = self.draw.rendered(self.font, song_name, self.RED)
             text_width = song_surface.get_width()
 
             # Move the text left by 1 pixel per frame
@@ -162,12 +526,11 @@ class RadioTablet:
             if self.scroll_offset < 325:
                 visible_width = text_width - (325 - self.scroll_offset)
                 if visible_width > 0:
-                    cropped_text = song_surface.subsurface(
-                        (text_width - visible_width, 0, visible_width, song_surface.get_height()))
-                    self.screen.blit(cropped_text, (325, 215))
+                    self.draw.blit(song_surface, (325, 215),
+                                   (text_width - visible_width, 0, visible_width, song_surface.get_height()))
 
             else:
-                self.screen.blit(song_surface, (self.scroll_offset, 215))
+                self.draw.blit(song_surface, (self.scroll_offset, 215))
 
             # Reset position when the full text has disappeared
             if self.scroll_offset + text_width <= 325:
@@ -0,0 +1,102 @@
+class TabRegistry:
+    """
+    Keeps the ordered set of tabs and routes input to whichever one is active.
+
+    Any object can be registered as a tab as long as it provides ``render()``.
+    ``handle_click()``, ``handle_scroll(direction)`` and ``handle_key(key, text)``
+    are optional; a tab that wants to jump somewhere after a click returns the
+    name of the target tab from ``handle_click``.
+
+    Attributes:
+        tabs (dict): Mapping of tab name to tablet, in registration order.
+        order (list): Tab names in the order they are cycled through.
+        current (str): Name of the active tab.
+    """
+
+    def __init__(self):
+        self.tabs = {}
+        self.order = []
+        self.current = None
+
+    def register(self, name, tablet):
+        """
+        Adds a tab to the end of the cycle order.
+
+        Args:
+            name (str): Identifier of the tab.
+            tablet: The object that renders the tab and receives its input.
+        """
+        if name in self.tabs:
+            raise ValueError(f"tab '{name}' is already registered")
+        self.tabs[name] = tablet
+        self.order.append(name)
+        if self.current is None:
+            self.current = name
+
+    def replace(self, name, tablet):
+        """
+        Swaps the tablet behind a registered tab, keeping its place in the cycle order.
+
+        Args:
+            name (str): Identifier of a registered tab.
+            tablet: The object that renders the tab from now on.
+        """
+        if name not in self.tabs:
+            raise KeyError(f"unknown tab '{name}'")
+        self.tabs[name] = tablet
+
+    @property
+    def active(self):
+        """The tablet of the currently active tab."""
+        return self.tabs[self.current]
+
+    def switch_to(self, name):
+        """
+        Makes the given tab active.
+
+        Args:
+            name (str): Identifier of a registered tab.
+        """
+        if name not in self.tabs:
+            raise KeyError(f"unknown tab '{name}'")
+        self.current = name
+
+    def next_tab(self):
+        """Advances to the next tab in the cycle order."""
+        current_index = self.order.index(self.current)
+        self.current = self.order[(current_index + 1) % len(self.order)]
+
+    def click(self):
+        """Forwards a select click to the active tab and follows any requested jump."""
+        handler = getattr(self.active, "handle_click", None)
+        if handler is not None:
+            target = handler()
+            if target is not None:
+                self.switch_to(target)
+
+    def scroll(self, direction):
+        """
+        Forwards a scroll step to the active tab.
+
+        Args:
+            direction (int): Positive for up, negative for down.
+        """
+        handler = getattr(self.active, "handle_scroll", None)
+        if handler is not None:
+            handler(direction)
+
+    def key(self, key, text):
+        """
+        Forwards a key press to the active tab.
+
+        Args:
+            key (int): pygame key code.
+            text (str): The character the key typed, empty for keys that type none.
+        """
+        handler = getattr(self.active, "handle_key", None)
+        if handler is not None:
+            handler(key, text)
+
+    def render(self):
+        """Renders the active tab."""
+        self.active.render()
@@ -0,0 +1,146 @@
+import pygame
+
+
+class Widget:
+    """
+    Base class for retained-mode UI elements.
+
+    A widget keeps its rendered surface between frames and only rebuilds it when
+    one of its inputs changes, so drawing an unchanged widget is a single blit.
+
+    Attributes:
+        pos (tuple): Top-left (or anchor) position of the widget on the screen.
+        visible (bool): Whether the widget is drawn.
+        dirty (bool): Set when the cached surface must be rebuilt before the next draw.
+    """
+
+    def __init__(self, pos):
+        self.pos = pos
+        self.visible = True
+        self.dirty = True
+
+    def invalidate(self):
+        """Marks the widget so its surface is rebuilt on the next draw."""
+        self.dirty = True
+
+    def rebuild(self):
+        """Rebuilds the cached surface. Subclasses override this."""
+        self.dirty = False
+
+    def draw(self, screen):
+        """
+        Draws the widget, rebuilding its surface first if its state changed.
+
+        Args:
+            screen (pygame.Surface): The surface to draw onto, or a DrawList to queue the blits on.
+        """
+        if not self.visible:
+            return
+        if self.dirty:
+            self.rebuild()
+        self.blit(screen)
+
+    def blit(self, screen):
+        """Blits the cached surface. Subclasses override this."""
+
+
+class ListView(Widget):
+    """
+    A scrolling list whose rows are rendered once into a cached surface.
+
+    Scrolling and moving the highlight only change which part of the cached
+    surface is blitted; rows are re-rendered only when the list content changes.
+
+    Attributes:
+        font (pygame.font.Font): Font used for the rows.
+        width (int): Width of the list in pixels.
+        visible_rows (int): Number of rows shown at once.
+        row_height (int): Height of one row in pixels.
+        rows (list): Row texts; a (left, right) tuple puts the right part flush right.
+        selected (int): Index of the highlighted row, -1 for none.
+        top (int): Index of the first visible row.
+        surface (pygame.Surface): All rows rendered in the normal colour.
+        highlight (pygame.Surface): The selected row rendered in the highlight colours.
+    """
+
+    def __init__(self, font, pos, width, visible_rows, row_height, color, highlight_color, highlight_text_color):
+        super().__init__(pos)
+        self.font = font
+        self.width = width
+        self.visible_rows = visible_rows
+        self.row_height = row_height
+        self.color = color
+        self.highlight_color = highlight_color
+        self.highlight_text_color = highlight_text_color
+        self.rows = []
+        self.selected = -1
+        self.top = 0
+        self.surface = None
+        self.highlight = None
+        self.highlight_dirty = True
+
+    def set_rows(self, rows):
+        """
+        Replaces the list content.
+
+        Args:
+            rows (list): Row texts or (left, right) tuples; ignored if unchanged.
+        """
+        rows = list(rows)
+        if rows != self.rows:
+            self.rows = rows
+            self.dirty = True
+            self.highlight_dirty = True
+            self.select(min(self.selected, len(rows) - 1))
+
+    def select(self, index):
+        """
+        Highlights a row and scrolls it into view.
+
+        Args:
+            index (int): Row index, -1 for no highlight.
+        """
+        if index != self.selected:
+            self.selected = index
+            self.highlight_dirty = True
+        if index >= 0:
+            if index < self.top:
+                self.top = index
+            elif index >= self.top + self.visible_rows:
+                self.top = index - self.visible_rows + 1
+
+    def scroll(self, direction):
+        """
+        Moves the highlight one row.
+
+        Args:
+            direction (int): Positive for up, negative for down.
+        """
+        if self.rows:
+            self.select(max(0, min(len(self.rows) - 1, self.selected - direction)))
+
+    def render_row(self, surface, row, y, color):
+        """Draws one row onto a surface at the given height."""
+        left, right = row if isinstance(row, tuple) else (row, "")
+        surface.blit(self.font.render(left, True, color), (0, y))
+        if right:
+            right_surface = self.font.render(right, True, color)
+            surface.blit(right_surface, (self.width - right_surface.get_width(), y))
+
+    def rebuild(self):
+        self.surface = pygame.Surface((self.width, max(1, len(self.rows)) * self.row_height), pygame.SRCALPHA)
+        for index, row in enumerate(self.rows):
+            self.render_row(self.surface, row, index * self.row_height, self.color)
+        self.dirty = False
+
+    def blit(self, screen):
+        x, y = self.pos
+        screen.blit(self.surface, self.pos,
+                    (0, self.top * self.row_height, self.width, self.visible_rows * self.row_height))
+        if 0 <= self.selected < len(self.rows):
+            if self.highlight_dirty:
+                self.highlight = pygame.Surface((self.width, self.row_height))
+                self.highlight.fill(self.highlight_color)
+                self.render_row(self.highlight, self.rows[self.selected], 0, self.highlight_text_color)
+                self.highlight_dirty = False
+            screen.blit(self.highlight, (x, y + (self.selected - self.top) * self.row_height))
@@ -1,6 +1,12 @@
+import clock
+import assets
 import pygame
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from Widget import ListView
+from draw_list import DrawList
+from event_bus import STATS_UPDATED, publish
+from youtube_store import YoutubeStore, DAY, HOUR
+from youtube_sync import YoutubeSync, build_client, parse_channel, MAX_IDS_PER_REQUEST
 
 
 class YoutubeTablet:
@@ -13,54 +19,96 @@ class YoutubeTablet:
         DARK_PIP_COLOUR (tuple): RGB color for dark green.
         RED (tuple): RGB color for red.
         screen (pygame.Surface): The Pygame screen surface.
+        draw (DrawList): Per-frame draw list the tab queues its drawing on.
         font (pygame.font.Font): The font used for rendering text.
         SERVICE_ACCOUNT_FILE (str): Path to the service account JSON file.
         SCOPES (list): List of scopes for YouTube API access.
-        credentials (Credentials): Authentication credentials for YouTube API.
+        credentials (Credentials): Service account credentials, None (unsigned requests) with API_ENDPOINT.
         youtube (Resource): YouTube API client instance.
-        CHANNEL_ID (str): The YouTube channel ID to fetch statistics for.
-        subs (int): Number of subscribers.
-        views (int): Number of views.
-        videos (int): Number of videos.
+        CHANNEL_IDS (list): The YouTube channel IDs to fetch statistics for.
+        store (YoutubeStore): Local time-series store of every poll.
+        sync (YoutubeSync): Batched YouTube API client with a conditional, offline-first response cache.
+        selected (int): Index of the channel shown on the tab.
+        last_poll (float): clock.monotonic() of the last poll, None before the first one.
+        sparklines (dict): Cached (subs, views) sparkline surfaces by channel ID.
+        last_video_sync (float): clock.monotonic() of the last video sync, None before the first one.
+        view (str): "stats" for the channel totals, "videos" for the top videos list.
+        video_list (ListView): Scrolling list of the selected channel's most viewed videos.
+        background_refresh (bool): Set by the async runtime, which then polls through refresh().
+        bus (EventBus): Event bus that poll results come back through as STATS_UPDATED, None to apply them in place.
+        subs (str): Number of subscribers, as displayed.
+        views (str): Number of views, as displayed.
+        videos (str): Number of videos, as displayed.
         channel_name (str): The name of the YouTube channel.
     """
 
+    POLL_INTERVAL = 300  # seconds between polls
+    API_ENDPOINT = None  # e.g. "http://127.0.0.1:8001" for youtube_stub.py; requests are then sent unsigned
+    STORE_PATH = "youtube_data.sqlite3"  # poll history and cached API responses
+    OFFLINE = False  # never build the API client and show only what the store holds, e.g. for replays
+    SPARKLINE_WINDOW = 7 * DAY  # history shown in the sparklines
+    SPARKLINE_SIZE = (110, 11)
+    VIDEO_SYNC_INTERVAL = 30 * 60  # seconds between checks for new uploads
+    VIDEO_STATS_INTERVAL = 6 * HOUR  # age after which a video's statistics are fetched again
+    STALE_VIDEOS_PER_SYNC = 4 * MAX_IDS_PER_REQUEST  # statistics refreshed per sync, oldest first
+    TOP_VIDEOS = 25  # videos listed on the tab
+    refresh_interval = 15  # seconds between async refresh calls; poll_due decides what is due
+
     PIP_COLOUR = (5, 250, 5)
     MID_PIP_COLOUR = (1, 150, 9)
     DARK_PIP_COLOUR = (1, 50, 9)
     RED = (255, 0, 0)
+    FRAME = [(3, 40, 2, 8), (3, 40, 78, 2), (170, 40, 305, 2), (80, 20, 2, 22), (80, 20, 5, 2),
+             (170, 20, 2, 22), (167, 20, 5, 2), (170, 40, 45, 2), (475, 40, 2, 8)]
 
-    def __init__(self, screen):
+    def __init__(self, screen, draw=None, bus=None):
         """
         Initializes the YouTubeTablet with a given Pygame screen.
 
         Args:
             screen (pygame.Surface): The Pygame screen where stats will be displayed.
+            draw (DrawList): Shared draw list, flushed by its owner; a private one is made if None.
+            bus (EventBus): Event bus that hands poll results from the worker thread to the main thread.
         """
         self.screen = screen
-        self.font = pygame.font.Font("media/monofonto rg.otf", 30)
+        self.draw = draw if draw is not None else DrawList(screen)
+        self.font = assets.font(30)
         self.SERVICE_ACCOUNT_FILE = 'media/APIUSER.json'
         self.SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
-        self.credentials = service_account.Credentials.from_service_account_file(
-            self.SERVICE_ACCOUNT_FILE, scopes=self.SCOPES)
-        self.youtube = build('youtube', 'v3', credentials=self.credentials)
-        self.CHANNEL_ID = 'PUT CHANNEL ID'
-        self.subs = 0
-        self.views = 0
-        self.videos = 0
+        self.CHANNEL_IDS = ['PUT CHANNEL ID']
+        self.store = YoutubeStore(self.STORE_PATH)
+        self.youtube = None
+        self.sync = YoutubeSync(None, self.store)
+        if not self.OFFLINE:
+            try:
+                # A local endpoint is a stub server: no service account, and no token refresh against Google
+                self.credentials = None if self.API_ENDPOINT else service_account.Credentials.from_service_account_file(
+                    self.SERVICE_ACCOUNT_FILE, scopes=self.SCOPES)
+                self.youtube = build_client(self.credentials, self.API_ENDPOINT)
+                self.sync.youtube = self.youtube
+            except (OSError, ValueError) as error:
+                # Without credentials the tab still shows the last stored numbers
+                self.sync.record_error(f"{type(error).__name__}: {error}", "credentials")
+        self.selected = 0
+        self.last_poll = None
+        self.sparklines = {}
+        self.last_video_sync = None
+        self.background_refresh = False
+        self.view = "stats"
+        self.video_list = ListView(assets.font(20), (45, 124), 400, 5, 25,
+                                   self.PIP_COLOUR, self.PIP_COLOUR, self.DARK_PIP_COLOUR)
+        self.subs = "0 Subs"
+        self.views = "0 Views"
+        self.videos = "0 Videos"
         self.channel_name = "john"
+        self.show_channel()
+        self.bus = bus
+        if self.bus is not None:
+            self.bus.subscribe(STATS_UPDATED, self.on_stats_updated)
 
     def draw_youtube_frame(self):
         """Draws the decorative frame around the YouTube stats section."""
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 2, 8))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(3, 40, 78, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(170, 40, 305, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(80, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(80, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(170, 20, 2, 22))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(167, 20, 5, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(170, 40, 45, 2))
-        pygame.draw.rect(self.screen, self.MID_PIP_COLOUR, pygame.Rect(475, 40, 2, 8))
+        self.draw.chrome("youtube", self.MID_PIP_COLOUR, self.FRAME)
 
     def draw_image(self, emblem, x, y):
         """
@@ -71,25 +119,197 @@ class YoutubeTablet:
             x (int): X-coordinate of the image.
             y (int): Y-coordinate of the image.
         """
-        img = pygame.image.load(emblem)
-        img = pygame.transform.scale(img, (30, 30))
-        img = pygame.transform.flip(img, True, False)
-        self.screen.blit(img, (x, y))
+        self.draw.image(emblem, (30, 30), (x, y), flip=True)
 
     def get_youtube_stats(self):
-        """Fetches YouTube statistics for the specified channel using the YouTube API."""
-        request = self.youtube.channels().list(
-            part="snippet,contentDetails,statistics",
-            id=self.CHANNEL_ID
-        )
-        response = request.execute()
-        channel_info = response['items'][0]
-        stats = channel_info['statistics']
-        snippet = channel_info['snippet']
-        self.channel_name = snippet['title']
-        self.subs = stats['subscriberCount'] + " Subs"
-        self.views = stats['viewCount'] + " Views"
-        self.videos = stats['videoCount'] + " Videos"
+        """
+        Fetches YouTube statistics for every channel in CHANNEL_IDS and stores them.
+
+        All channels are requested together, up to 50 per API call.
+
+        Returns:
+            bool: True if new numbers were stored.
+        """
+        items, fresh = self.sync.fetch_channels(self.CHANNEL_IDS)
+        if not fresh:
+            return False  # offline: keep showing the stored numbers instead of recording stale ones
+        now = clock.time()
+        for channel_id, item in items.items():
+            stats = parse_channel(item)
+            self.store.record(channel_id, stats["title"], stats["subs"], stats["views"], stats["videos"], now)
+            uploads = item.get("contentDetails", {}).get("relatedPlaylists", {}).get("uploads")
+            if uploads and uploads != self.store.uploads_playlist(channel_id):
+                self.store.set_uploads_playlist(channel_id, uploads)
+        self.store.downsample(now)
+        return True
+
+    def sync_videos(self):
+        """
+        Stores new uploads of every channel and refreshes the statistics of the oldest videos.
+
+        Only uploads newer than the newest stored video are looked up, and at most
+        STALE_VIDEOS_PER_SYNC videos whose statistics are older than VIDEO_STATS_INTERVAL
+        are fetched again, so a sync usually costs a handful of API calls. The
+        playlist's first page is only cached once the new uploads are stored, so
+        uploads that could not be fetched are looked for again on the next sync.
+        Stored videos the API no longer returns (deleted or private) are removed.
+        """
+        for channel_id in self.CHANNEL_IDS:
+            playlist_id = self.store.uploads_playlist(channel_id)
+            if playlist_id is None:
+                continue  # known after the channel's first successful poll
+            new_ids, first_page = self.sync.new_upload_ids(playlist_id, self.store.known_video_ids(channel_id))
+            if new_ids:
+                videos, fresh = self.sync.fetch_videos(new_ids)
+                if not fresh:
+                    continue
+                self.store.save_videos(channel_id, videos)
+            if first_page is not None:
+                self.sync.save_uploads_page(playlist_id, first_page)
+
+        stale = self.store.stale_videos(clock.time() - self.VIDEO_STATS_INTERVAL, self.STALE_VIDEOS_PER_SYNC)
+        channels = dict(stale)
+        videos, fresh = self.sync.fetch_videos(list(channels))
+        by_channel = {}
+        for video in videos:
+            by_channel.setdefault(channels[video[0]], []).append(video)
+        for channel_id, channel_videos in by_channel.items():
+            self.store.save_videos(channel_id, channel_videos)
+        if fresh:
+            # Deleted and private videos are left out of the answer; they would stay the oldest forever
+            self.store.delete_videos(set(channels) - {video[0] for video in videos})
+
+    def poll_due(self):
+        """
+        Polls the API once every POLL_INTERVAL seconds and syncs videos every VIDEO_SYNC_INTERVAL.
+
+        Only talks to the API and the store, so it can run on a worker thread. With
+        a bus, anything new is published as STATS_UPDATED and shown once the main
+        loop dispatches it.
+
+        Returns:
+            tuple: (stats_updated, videos_synced), passed on to apply_poll.
+        """
+        now = clock.monotonic()
+        stats_updated = videos_synced = False
+        if self.last_poll is None or now - self.last_poll >= self.POLL_INTERVAL:
+            self.last_poll = now
+            stats_updated = self.get_youtube_stats()
+        if self.last_video_sync is None or now - self.last_video_sync >= self.VIDEO_SYNC_INTERVAL:
+            self.last_video_sync = now
+            self.sync_videos()
+            videos_synced = True
+        if self.bus is not None and (stats_updated or videos_synced):
+            publish(STATS_UPDATED, stats=stats_updated, videos=videos_synced)
+        return stats_updated, videos_synced
+
+    def apply_poll(self, stats_updated, videos_synced):
+        """Shows the results of poll_due; runs where the tab is drawn."""
+        if stats_updated:
+            self.sparklines.clear()  # rebuilt with the new points on the next draw
+            self.show_channel()
+        if videos_synced:
+            self.show_videos()
+
+    def on_stats_updated(self, event):
+        """Shows the results of a poll published on the bus."""
+        self.apply_poll(event.stats, event.videos)
+
+    def refresh_if_due(self):
+        """Runs the due polls in place, used when no async runtime refreshes the tab."""
+        updated = self.poll_due()
+        if self.bus is None:
+            self.apply_poll(*updated)
+
+    async def refresh(self, run_blocking):
+        """
+        Async refresh hook: runs the due polls in the executor; their results come back on the bus.
+
+        Args:
+            run_blocking: Coroutine function that runs a blocking call in the runtime's executor.
+        """
+        updated = await run_blocking(self.poll_due)
+        if self.bus is None:
+            self.apply_poll(*updated)
+
+    def cache_stats(self):
+        """Returns the response cache counters: hits, misses, errors, last_error and age."""
+        return self.sync.cache_stats()
+
+    def show_channel(self):
+        """Loads the latest stored numbers of the selected channel into the displayed stats."""
+        channel_id = self.CHANNEL_IDS[self.selected]
+        latest = self.store.latest(channel_id)
+        if latest is None:
+            return
+        _, subs, views, videos = latest
+        self.channel_name = self.store.title(channel_id)
+        self.subs = str(subs) + " Subs"
+        self.views = str(views) + " Views"
+        self.videos = str(videos) + " Videos"
+
+    def show_videos(self):
+        """Loads the selected channel's most viewed stored videos into the video list."""
+        rows = []
+        for title, views, likes in self.store.top_videos(self.CHANNEL_IDS[self.selected], self.TOP_VIDEOS):
+            rows.append((title if len(title) <= 26 else title[:25] + "…", f"{views:,}  {likes:,}"))
+        self.video_list.set_rows(rows)
+        if rows and self.video_list.selected < 0:
+            self.video_list.select(0)
+
+    def handle_click(self):
+        """Switches between the channel totals and the top videos list."""
+        self.view = "videos" if self.view == "stats" else "stats"
+
+    def handle_scroll(self, direction):
+        """
+        Scrolls the video list, or cycles through the monitored channels on the stats view.
+
+        Args:
+            direction (int): Positive for the previous channel or row, negative for the next one.
+        """
+        if self.view == "videos":
+            self.video_list.scroll(direction)
+            return
+        self.selected = (self.selected - direction) % len(self.CHANNEL_IDS)
+        self.show_channel()
+        self.video_list.select(-1)
+        self.show_videos()
+
+    def build_sparkline(self, values):
+        """
+        Draws a series of values as a small line graph.
+
+        Args:
+            values (list): Values in time order.
+
+        Returns:
+            pygame.Surface: Transparent surface of SPARKLINE_SIZE with the line drawn in DARK_PIP_COLOUR.
+        """
+        width, height = self.SPARKLINE_SIZE
+        surface = pygame.Surface(self.SPARKLINE_SIZE, pygame.SRCALPHA)
+        if len(values) < 2:
+            return surface
+        low, high = min(values), max(values)
+        span = (high - low) or 1
+        points = [(round(index * (width - 1) / (len(values) - 1)),
+                   round((height - 1) - (value - low) * (height - 1) / span))
+                  for index, value in enumerate(values)]
+        pygame.draw.lines(surface, self.DARK_PIP_COLOUR, False, points)
+        return surface
+
+    def get_sparklines(self, channel_id):
+        """
+        Returns the cached (subs, views) sparklines of a channel, building them after each poll.
+
+        Args:
+            channel_id (str): YouTube channel ID.
+        """
+        if channel_id not in self.sparklines:
+            series = self.store.series(channel_id, since=clock.time() - self.SPARKLINE_WINDOW)
+            self.sparklines[channel_id] = (self.build_sparkline([subs for _, subs, _ in series]),
+                                           self.build_sparkline([views for _, _, views in series]))
+        return self.sparklines[channel_id]
 
     def draw_stat(self, stat, x, y):
         """
@@ -100,8 +320,7 @@ class YoutubeTablet:
             x (int): X-coordinate of the text.
             y (int): Y-coordinate of the text.
         """
-        stat_name = self.font.render(stat, True, self.PIP_COLOUR)
-        self.screen.blit(stat_name, (x, y))
+        self.draw.text(self.font, stat, self.PIP_COLOUR, (x, y))
 
     def draw_stat_frame(self, x, y, length, width):
         """
@@ -113,23 +332,26 @@ class YoutubeTablet:
             length (int): Width of the rectangle.
             width (int): Height of the rectangle.
         """
-        pygame.draw.rect(self.screen, self.PIP_COLOUR, pygame.Rect(x, y, length, width))
+        self.draw.rect(self.PIP_COLOUR, (x, y, length, width))
 
     def render(self):
         """Renders the YouTube statistics on the screen."""
-        self.get_youtube_stats()
+        if not self.background_refresh:
+            self.refresh_if_due()
         self.draw_youtube_frame()
-        habit_tab = self.font.render("HABIT", True, self.MID_PIP_COLOUR, None)
-        self.screen.blit(habit_tab, (110, 40))
-        youtube_tab = self.font.render("YOUTUBE", True, self.PIP_COLOUR, None)
-        self.screen.blit(youtube_tab, (200, 40))
-        pygame.draw.rect(self.screen, self.DARK_PIP_COLOUR, pygame.Rect(40, 122, 410, 130))
-        goal = self.font.render("      1,000 Subs", True, self.RED, None)
-        self.screen.blit(goal, (200, 200))
-        self.draw_image("media/TrophyGoal.png", 250, 205)
+        self.draw.text(self.font, "HABIT", self.MID_PIP_COLOUR, (110, 40))
+        self.draw.text(self.font, "YOUTUBE", self.PIP_COLOUR, (200, 40))
+        self.draw.rect(self.DARK_PIP_COLOUR, (40, 122, 410, 130))
         self.draw_stat_frame(40, 82, 410, 30)
-        channel_name = self.font.render(self.channel_name, True, self.DARK_PIP_COLOUR)
-        self.screen.blit(channel_name, (100, 80))
+        self.draw.text(self.font, self.channel_name, self.DARK_PIP_COLOUR, (100, 80))
+        subs_line, views_line = self.get_sparklines(self.CHANNEL_IDS[self.selected])
+        self.draw.blit(subs_line, (330, 85))
+        self.draw.blit(views_line, (330, 98))
+        if self.view == "videos":
+            self.video_list.draw(self.draw)
+            return
+        self.draw.text(self.font, "      1,000 Subs", self.RED, (200, 200))
+        self.draw_image("media/TrophyGoal.png", 250, 205)
         self.draw_stat(self.videos, 300, 140)
         self.draw_image("media/CabinetVideos.png", 265, 145)
         self.draw_stat(self.views, 70, 140)
@@ -0,0 +1,173 @@
+"""
+Fonts and images shared by the app and the tablets, each loaded only once.
+
+The boot pipeline loads these from worker threads while the main thread is
+already drawing. FreeType faces must not be opened from two threads at once,
+so font loads are serialised by a lock; images decode in parallel, and a
+surface handed out here is only ever drawn from the main thread.
+
+Images are drawn far smaller than the PNGs in media/ are. ``python bake_media.py``
+writes every size and flip listed in the bake manifest to media/baked/, and
+``scaled`` loads those small files instead of decoding and scaling the sources;
+a variant whose source changed since it was baked is scaled at runtime again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import pygame
+
+FONT = "media/monofonto rg.otf"
+# Every size the app and the tablets draw text in
+FONT_SIZES = (20, 25, 30, 40, 80, 140)
+# Every image variant the app draws, and where bake_media.py writes them
+MANIFEST = "media/bake_manifest.json"
+BAKED = "media/baked"
+BAKED_INDEX = "index.json"
+
+_font_lock = threading.Lock()
+_fonts = {}
+_images = {}
+_scaled = {}
+_baked = None
+
+
+def font(size, path=FONT):
+    """
+    Returns a font, loading it on first use.
+
+    Args:
+        size (int): Point size.
+        path (str): Font file, the Pip-Boy font by default.
+    """
+    key = (path, size)
+    with _font_lock:
+        if key not in _fonts:
+            _fonts[key] = pygame.font.Font(path, size)
+        return _fonts[key]
+
+
+def image(path):
+    """
+    Returns an image file as a surface, loading it on first use.
+
+    The surface is shared, so callers scale or flip a copy instead of drawing on it.
+
+    Args:
+        path (str): Image file.
+    """
+    surface = _images.get(path)
+    if surface is None:
+        # Two threads may both decode a new image; whichever is stored first is kept
+        surface = _images.setdefault(path, pygame.image.load(path))
+    return surface
+
+
+def transform(surface, size, flip=False):
+    """
+    Returns a surface scaled to a size and, if asked, mirrored horizontally; the way every variant is made.
+
+    Args:
+        surface (pygame.Surface): The full size image.
+        size (tuple): Width and height to scale to.
+        flip (bool): Mirror the image horizontally.
+    """
+    surface = pygame.transform.scale(surface, size)
+    return pygame.transform.flip(surface, True, False) if flip else surface
+
+
+def read_manifest(path=MANIFEST):
+    """
+    Reads the bake manifest.
+
+    Returns:
+        list: (image path, (width, height), flip) of every variant the app draws.
+    """
+    with open(path) as file:
+        entries = json.load(file)["images"]
+    return [(entry["path"], tuple(entry["size"]), bool(entry.get("flip", False))) for entry in entries]
+
+
+def source_hash(path):
+    """Returns the SHA-256 of a file's contents as hex; baked files are named after it."""
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def variant_key(path, size, flip):
+    """Returns the key of a variant in the baked index."""
+    return f"{path}|{size[0]}x{size[1]}|{'flip' if flip else 'plain'}"
+
+
+def read_baked_index(folder=BAKED):
+    """Returns the variants in a baked index by variant_key, empty if nothing was baked."""
+    try:
+        with open(os.path.join(folder, BAKED_INDEX)) as file:
+            return json.load(file)["variants"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def baked_file(path, size, flip=False, folder=BAKED):
+    """
+    Returns the baked file of a variant, or None if there is none or its source changed since.
+
+    An unchanged size and mtime is trusted; otherwise (e.g. after a fresh checkout)
+    the source is hashed, which is still much cheaper than decoding it.
+
+    Args:
+        path (str): Source image.
+        size (tuple): Width and height.
+        flip (bool): Mirrored horizontally.
+        folder (str): Cache folder bake_media.py wrote to.
+    """
+    global _baked
+    if _baked is None:
+        _baked = read_baked_index(folder)
+    entry = _baked.get(variant_key(path, size, flip))
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime) != (entry["source_size"], entry["source_mtime"]) \
+                and source_hash(path) != entry["source_hash"]:
+            return None
+    except OSError:
+        return None
+    baked = os.path.join(folder, entry["file"])
+    return baked if os.path.exists(baked) else None
+
+
+def scaled(path, size, flip=False):
+    """
+    Returns an image at the size it is drawn at, from the baked cache when it is up to date.
+
+    Args:
+        path (str): Source image.
+        size (tuple): Width and height.
+        flip (bool): Mirror the image horizontally.
+    """
+    key = (path, tuple(size), flip)
+    surface = _scaled.get(key)
+    if surface is None:
+        baked = baked_file(path, size, flip)
+        if baked is not None:
+            surface = pygame.image.load(baked)
+        else:
+            surface = transform(image(path), size, flip)
+        surface = _scaled.setdefault(key, surface)
+    return surface
+
+
+def load_fonts(sizes=FONT_SIZES):
+    """Loads the Pip-Boy font in every size the app uses."""
+    for size in sizes:
+        font(size)
+
+
+def load_images(manifest=MANIFEST):
+    """Loads every image variant in the bake manifest; only sources without an up-to-date baked file are decoded."""
+    for path, size, flip in read_manifest(manifest):
+        scaled(path, size, flip)
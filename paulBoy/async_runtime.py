@@ -0,0 +1,159 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from power_save import ACTIVE
+
+
+class AsyncRuntime:
+    """
+    Drives MainApp from an asyncio event loop instead of a blocking while loop.
+
+    Frames are paced against deadlines, so the frame rate stays steady no matter
+    how long a frame took to draw. Network and disk work runs in a small thread
+    pool while the loop keeps drawing. Input is still checked every IDLE_POLL
+    seconds while the display is idle, and with it the app's ClockEvents, so the
+    alarm rings and the dimmed clock is redrawn on the minute through the event
+    bus.
+
+    Tablets opt in to background refreshing by providing a ``refresh_interval``
+    (seconds) and an ``async refresh(run_blocking)`` method; they are then
+    refreshed on their own task and their ``background_refresh`` flag is set so
+    they stop doing the same work while rendering. Any other data source can be
+    added with ``every``.
+
+    Attributes:
+        app (MainApp): The application being driven.
+        frame_interval (float): Seconds between frames while active.
+        idle_poll (float): Seconds between input checks while dimmed or blanked.
+        executor (ThreadPoolExecutor): Runs blocking calls off the event loop.
+        tasks (list): Background tasks started by the runtime.
+        frames (int): Number of frames drawn.
+        late_frames (int): Frames that started more than one interval after their deadline.
+    """
+
+    FRAME_INTERVAL = 1 / 15
+    IDLE_POLL = 0.1
+
+    def __init__(self, app, frame_interval=FRAME_INTERVAL, idle_poll=IDLE_POLL, workers=2):
+        self.app = app
+        self.frame_interval = frame_interval
+        self.idle_poll = idle_poll
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="paulboy-io")
+        self.tasks = []
+        self.frames = 0
+        self.late_frames = 0
+        self.running = False
+        # Frames are paced by the runtime, not by sleeping inside render
+        app.frame_delay = 0
+
+    async def run_blocking(self, function, *args):
+        """
+        Runs a blocking call in the executor and waits for its result without blocking the loop.
+
+        Args:
+            function: The blocking callable.
+            *args: Its arguments.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def every(self, interval, callback, name=None):
+        """
+        Calls a coroutine function repeatedly on its own task.
+
+        A callback that raises is reported and called again at the next interval,
+        so one failing data source never stops the others.
+
+        Args:
+            interval (float): Seconds between the start of two calls.
+            callback: Coroutine function taking no arguments.
+            name (str): Task name used in error reports.
+
+        Returns:
+            asyncio.Task: The started task.
+        """
+        async def repeat():
+            loop = asyncio.get_running_loop()
+            while self.running:
+                started = loop.time()
+                try:
+                    await callback()
+                except Exception as error:
+                    print(f"{name or callback.__name__} failed: {type(error).__name__}: {error}")
+                await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+
+        task = asyncio.get_running_loop().create_task(repeat(), name=name)
+        self.tasks.append(task)
+        return task
+
+    def add_tablet_hooks(self):
+        """
+        Starts a refresh task for every registered tablet that provides an async refresh hook.
+
+        Tablets that the app's boot pipeline installs later get theirs when they are installed.
+        """
+        for name, tablet in self.app.tabs.tabs.items():
+            self.add_tablet_hook(name, tablet)
+        self.app.tab_listeners.append(self.add_tablet_hook)
+
+    def add_tablet_hook(self, name, tablet):
+        """
+        Starts a refresh task for one tablet if it provides an async refresh hook.
+
+        Args:
+            name (str): Identifier of the tab.
+            tablet: The tablet.
+        """
+        refresh = getattr(tablet, "refresh", None)
+        interval = getattr(tablet, "refresh_interval", None)
+        if refresh is None or interval is None:
+            return
+        tablet.background_refresh = True
+
+        async def call():
+            await refresh(self.run_blocking)
+
+        self.every(interval, call, name=f"refresh-{name}")
+
+    async def frame_loop(self):
+        """Handles input and draws frames against a fixed deadline; polls slowly while idle."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while self.running:
+            self.app.handle_events()
+            self.app.update_power_state()
+            self.app.audio.update()
+            if self.app.idle_policy.state != ACTIVE:
+                await asyncio.sleep(self.idle_poll)
+                deadline = loop.time()
+                continue
+            self.app.render()
+            self.frames += 1
+            deadline += self.frame_interval
+            delay = deadline - loop.time()
+            if delay < -self.frame_interval:
+                # Far behind, e.g. after a stall: start pacing again from now instead of catching up
+                self.late_frames += 1
+                deadline = loop.time()
+            await asyncio.sleep(max(0.0, delay))
+
+    async def main(self):
+        """Starts the background tasks and runs the frame loop until the app quits."""
+        self.running = True
+        self.add_tablet_hooks()
+        try:
+            await self.frame_loop()
+        finally:
+            self.running = False
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+
+    def run(self):
+        """Runs the application on a new event loop; returns when it quits."""
+        try:
+            asyncio.run(self.main())
+        finally:
+            pygame.quit()
@@ -0,0 +1,228 @@
+import pygame
+
+import clock
+import metrics
+
+AMBIENT = "ambient"
+MUSIC = "music"
+UI = "ui"
+ALARM = "alarm"
+
+# Higher priority buses duck every bus below them while they are playing
+PRIORITY = {AMBIENT: 1, MUSIC: 1, UI: 2, ALARM: 3}
+
+
+class AudioBus:
+    """
+    Owns the pygame mixer and gives every kind of sound its own reserved channels.
+
+    The alarm, the ambient loop and UI effects each get dedicated channels so they
+    never steal each other's voices, while music keeps using pygame.mixer.music
+    and internet radio plays on a reserved channel of the music bus.
+    Instead of stopping and restarting the ambient loop around every click, lower
+    priority buses are ducked to a lower volume and faded back once the higher
+    priority sound has finished. All sounds are decoded once when loaded.
+
+    Attributes:
+        sounds (dict): Pre-decoded pygame.mixer.Sound objects by name.
+        maxtimes (dict): Optional play length limit in milliseconds by sound name.
+        alarm_channel (pygame.mixer.Channel): Reserved channel for the alarm.
+        ambient_channel (pygame.mixer.Channel): Reserved channel for the ambient loop.
+        stream_channel (pygame.mixer.Channel): Reserved music channel for internet radio streams.
+        stream (StreamPlayer): The stream playing on stream_channel, fed by update(); None if none is.
+        ui_channels (list): Reserved channels for UI effects, used round-robin.
+        volumes (dict): Base volume of each bus before ducking.
+        gains (dict): Current ducking gain of each bus, 0.0 - 1.0.
+        track_gain (float): Loudness correction of the song playing through pygame.mixer.music, 0.0 - 1.0.
+        duck_levels (dict): Gain applied to lower buses while a bus is playing.
+        fade_time (float): Seconds taken to duck or restore a bus.
+    """
+
+    def __init__(self, frequency=44100, buffer=512, ui_channels=2, duck_levels=None, fade_time=0.08):
+        """
+        (Re)initialises the mixer with a small buffer and reserves the channels.
+
+        Args:
+            frequency (int): Output sample rate.
+            buffer (int): Mixer buffer size in samples, smaller means lower latency.
+            ui_channels (int): Number of channels for overlapping UI effects.
+            duck_levels (dict): Gain that each bus applies to lower buses while it plays.
+            fade_time (float): Seconds taken to duck or restore a bus.
+        """
+        if pygame.mixer.get_init():
+            pygame.mixer.quit()
+        pygame.mixer.init(frequency=frequency, buffer=buffer)
+
+        total = 3 + ui_channels
+        pygame.mixer.set_num_channels(total)
+        # Reserving every channel keeps Sound.play() from grabbing one behind the bus' back
+        pygame.mixer.set_reserved(total)
+        self.alarm_channel = pygame.mixer.Channel(0)
+        self.ambient_channel = pygame.mixer.Channel(1)
+        self.stream_channel = pygame.mixer.Channel(2)
+        self.ui_channels = [pygame.mixer.Channel(3 + index) for index in range(ui_channels)]
+        self.next_ui_channel = 0
+        self.stream = None
+
+        self.sounds = {}
+        self.maxtimes = {}
+        self.volumes = {AMBIENT: 1.0, MUSIC: 1.0, UI: 1.0, ALARM: 1.0}
+        self.gains = {AMBIENT: 1.0, MUSIC: 1.0, UI: 1.0, ALARM: 1.0}
+        self.track_gain = 1.0
+        self.duck_levels = duck_levels or {UI: 0.35, ALARM: 0.1}
+        self.fade_time = fade_time
+        self.ambient_paused = False
+        self.last_update = clock.monotonic()
+        self.busy_gauges = {bus: metrics.MIXER_CHANNELS_BUSY.labels(bus) for bus in (ALARM, AMBIENT, UI, MUSIC)}
+
+    def load(self, name, path, volume=1.0, maxtime=None):
+        """
+        Decodes a sound once so it can be played without any file or decode work.
+
+        Args:
+            name (str): Name the sound is played by.
+            path (str): Sound file (wav, ogg or mp3).
+            volume (float): Volume of the sound itself, 0.0 - 1.0.
+            maxtime (int): Stop playing after this many milliseconds, None plays it all.
+        """
+        sound = pygame.mixer.Sound(path)
+        sound.set_volume(volume)
+        self.sounds[name] = sound
+        self.maxtimes[name] = maxtime or 0
+
+    def play_effect(self, name):
+        """
+        Plays a UI effect on the next reserved UI channel, ducking ambient sound and music.
+
+        Args:
+            name (str): Name of a loaded sound.
+        """
+        channel = self.ui_channels[self.next_ui_channel]
+        self.next_ui_channel = (self.next_ui_channel + 1) % len(self.ui_channels)
+        channel.play(self.sounds[name], maxtime=self.maxtimes[name])
+        self.apply_volumes()
+
+    def play_ambient(self, name):
+        """
+        Starts a looping ambient sound.
+
+        Args:
+            name (str): Name of a loaded sound.
+        """
+        self.ambient_channel.play(self.sounds[name], loops=-1)
+        self.ambient_paused = False
+        self.apply_volumes()
+
+    def pause_ambient(self):
+        """Pauses the ambient loop, e.g. while the device is idle."""
+        self.ambient_channel.pause()
+        self.ambient_paused = True
+
+    def resume_ambient(self):
+        """Resumes the ambient loop where it was paused."""
+        self.ambient_channel.unpause()
+        self.ambient_paused = False
+
+    def play_alarm(self, name):
+        """
+        Starts a looping alarm on its reserved channel, ducking everything else.
+
+        Args:
+            name (str): Name of a loaded sound.
+        """
+        self.alarm_channel.play(self.sounds[name], loops=-1)
+        self.apply_volumes()
+
+    def stop_alarm(self, fade_ms=300):
+        """
+        Fades the alarm out.
+
+        Args:
+            fade_ms (int): Length of the fade in milliseconds.
+        """
+        self.alarm_channel.fadeout(fade_ms)
+
+    def alarm_playing(self):
+        """Returns True while the alarm channel is busy."""
+        return self.alarm_channel.get_busy()
+
+    def set_volume(self, bus, volume):
+        """
+        Sets the base volume of a bus.
+
+        Args:
+            bus (str): AMBIENT, MUSIC, UI or ALARM.
+            volume (float): 0.0 - 1.0.
+        """
+        self.volumes[bus] = volume
+        self.apply_volumes()
+
+    def set_track_gain(self, gain):
+        """
+        Sets the loudness correction of the song about to play; streams are not affected.
+
+        Args:
+            gain (float): 0.0 - 1.0, from the song's analysis.
+        """
+        self.track_gain = gain
+        self.apply_volumes()
+
+    def busy_channels(self):
+        """Returns the number of reserved channels currently playing."""
+        channels = [self.alarm_channel, self.ambient_channel, self.stream_channel] + self.ui_channels
+        return sum(channel.get_busy() for channel in channels)
+
+    def target_gains(self):
+        """Works out the ducking gain of every bus from the buses that are playing."""
+        playing = []
+        if self.alarm_channel.get_busy():
+            playing.append(ALARM)
+        if any(channel.get_busy() for channel in self.ui_channels):
+            playing.append(UI)
+
+        targets = {}
+        for bus, priority in PRIORITY.items():
+            gain = 1.0
+            for loud in playing:
+                if PRIORITY[loud] > priority:
+                    gain = min(gain, self.duck_levels[loud])
+            targets[bus] = gain
+        return targets
+
+    def update(self):
+        """
+        Moves every bus gain towards its ducking target and feeds the radio stream its decoded chunks.
+
+        Call on every pass of the main loop, whichever tab is shown and also while
+        idle; the fade speed depends on elapsed time, not frame rate. Also
+        publishes how many channels of each bus are playing.
+        """
+        if self.stream is not None:
+            self.stream.update()
+        self.busy_gauges[ALARM].set(int(self.alarm_channel.get_busy()))
+        self.busy_gauges[AMBIENT].set(int(self.ambient_channel.get_busy()))
+        self.busy_gauges[UI].set(sum(channel.get_busy() for channel in self.ui_channels))
+        self.busy_gauges[MUSIC].set(int(pygame.mixer.music.get_busy()) + int(self.stream_channel.get_busy()))
+
+        now = clock.monotonic()
+        step = (now - self.last_update) / self.fade_time if self.fade_time else 1.0
+        self.last_update = now
+
+        changed = False
+        for bus, target in self.target_gains().items():
+            gain = self.gains[bus]
+            if gain != target:
+                gain = min(target, gain + step) if gain < target else max(target, gain - step)
+                self.gains[bus] = gain
+                changed = True
+        if changed:
+            self.apply_volumes()
+
+    def apply_volumes(self):
+        """Pushes base volume times ducking gain to the channels and the music stream."""
+        self.ambient_channel.set_volume(self.volumes[AMBIENT] * self.gains[AMBIENT])
+        self.alarm_channel.set_volume(self.volumes[ALARM] * self.gains[ALARM])
+        for channel in self.ui_channels:
+            channel.set_volume(self.volumes[UI] * self.gains[UI])
+        pygame.mixer.music.set_volume(self.volumes[MUSIC] * self.gains[MUSIC] * self.track_gain)
+        self.stream_channel.set_volume(self.volumes[MUSIC] * self.gains[MUSIC])
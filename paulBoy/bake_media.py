@@ -0,0 +1,185 @@
+"""
+Bakes the images in media/ into the sizes and orientations they are drawn at.
+
+The source PNGs are up to 1274x1274 pixels but are only ever drawn at 60x60 or
+30x30, so decoding them costs most of the boot's image time and keeps megabytes
+of pixels resident for a few kilobytes of icons. The bake manifest
+(media/bake_manifest.json) lists every variant the app draws: image, size and
+horizontal flip. This tool scales and flips each variant exactly the way
+assets.transform does at runtime and reduces it to at most 256 RGBA colours. It
+then writes it to media/baked/ as an indexed PNG named after the SHA-256 of the
+source's contents and the variant.
+
+media/baked/index.json maps every variant to its file, together with the size,
+mtime and hash of the source it was made from. Unchanged variants are not baked
+again, and files no longer in the index are removed. At runtime
+assets.scaled() loads the baked files and falls back to the sources for
+anything missing or stale.
+
+Run ``python bake_media.py`` from the paulBoy folder after adding or changing images.
+"""
+
+import argparse
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+import pygame
+
+import assets
+
+PALETTE_SIZE = 256
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def surface_rgba(surface):
+    """Returns the pixels of a surface as a (height, width, 4) RGBA array."""
+    width, height = surface.get_size()
+    return np.frombuffer(pygame.image.tobytes(surface, "RGBA"), dtype=np.uint8).reshape(height, width, 4)
+
+
+def reduce_palette(pixels, colours=PALETTE_SIZE):
+    """
+    Reduces an RGBA image to a palette.
+
+    Fully transparent pixels become one entry. The remaining colours are merged
+    by dropping low bits of every channel until at most ``colours`` are left, and
+    each palette entry is the mean of the pixels merged into it, so images that
+    already have few colours are kept exactly.
+
+    Args:
+        pixels (numpy.ndarray): (height, width, 4) RGBA pixels.
+        colours (int): Largest palette size, at most 256.
+
+    Returns:
+        tuple: The (entries, 4) uint8 palette and the (height, width) uint8 indices into it.
+    """
+    height, width, _ = pixels.shape
+    flat = pixels.reshape(-1, 4).astype(np.uint32)
+    flat[flat[:, 3] == 0] = 0
+    for shift in range(8):
+        reduced = flat >> shift
+        keys = (reduced[:, 0] << 24) | (reduced[:, 1] << 16) | (reduced[:, 2] << 8) | reduced[:, 3]
+        unique, indices = np.unique(keys, return_inverse=True)
+        if len(unique) <= colours:
+            break
+    counts = np.bincount(indices, minlength=len(unique))
+    palette = np.stack([np.bincount(indices, flat[:, channel], len(unique)) / counts for channel in range(4)], 1)
+    return np.round(palette).astype(np.uint8), indices.astype(np.uint8).reshape(height, width)
+
+
+def png_chunk(kind, data):
+    """Packs one PNG chunk: length, type, data and CRC."""
+    return struct.pack("!I", len(data)) + kind + data + struct.pack("!I", zlib.crc32(kind + data))
+
+
+def write_indexed_png(path, palette, indices):
+    """
+    Writes an 8-bit indexed PNG with per-entry alpha (a tRNS chunk) where needed.
+
+    Args:
+        path (str): File to write.
+        palette (numpy.ndarray): (entries, 4) RGBA palette.
+        indices (numpy.ndarray): (height, width) palette indices.
+    """
+    height, width = indices.shape
+    # Filter type 0 (none) in front of every row
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), indices], axis=1)
+    chunks = [png_chunk(b"IHDR", struct.pack("!IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+              png_chunk(b"PLTE", palette[:, :3].tobytes())]
+    alpha = palette[:, 3]
+    if (alpha < 255).any():
+        # Entries after the last translucent one are opaque and can be left out
+        chunks.append(png_chunk(b"tRNS", alpha[:np.flatnonzero(alpha < 255)[-1] + 1].tobytes()))
+    chunks.append(png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 9)))
+    chunks.append(png_chunk(b"IEND", b""))
+    with open(path, "wb") as file:
+        file.write(PNG_SIGNATURE + b"".join(chunks))
+
+
+def variant_file(digest, size, flip):
+    """Returns the file name of a baked variant: the source's content hash and the variant."""
+    return f"{digest[:16]}_{size[0]}x{size[1]}{'_flip' if flip else ''}.png"
+
+
+def bake(manifest=assets.MANIFEST, folder=assets.BAKED, prune=True):
+    """
+    Bakes every variant in a manifest that is not baked yet and writes the index.
+
+    Args:
+        manifest (str): Bake manifest.
+        folder (str): Cache folder.
+        prune (bool): Remove baked files that are no longer in the index.
+
+    Returns:
+        list: (path, size, flip, baked file, True if baked now) for every variant.
+    """
+    os.makedirs(folder, exist_ok=True)
+    previous = assets.read_baked_index(folder)
+    known = {}  # source path -> (size, mtime, hash), so a source used twice is hashed once
+    for entry in previous.values():
+        known[entry["source"]] = (entry["source_size"], entry["source_mtime"], entry["source_hash"])
+
+    variants = {}
+    results = []
+    for path, size, flip in assets.read_manifest(manifest):
+        stat = os.stat(path)
+        cached = known.get(path)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime):
+            digest = cached[2]
+        else:
+            digest = assets.source_hash(path)
+            known[path] = (stat.st_size, stat.st_mtime, digest)
+        name = variant_file(digest, size, flip)
+        target = os.path.join(folder, name)
+        baked = not os.path.exists(target)
+        if baked:
+            palette, indices = reduce_palette(surface_rgba(assets.transform(pygame.image.load(path), size, flip)))
+            write_indexed_png(target + ".tmp", palette, indices)
+            os.replace(target + ".tmp", target)
+        variants[assets.variant_key(path, size, flip)] = {
+            "source": path, "source_size": stat.st_size, "source_mtime": stat.st_mtime, "source_hash": digest,
+            "file": name,
+        }
+        results.append((path, size, flip, target, baked))
+
+    index = os.path.join(folder, assets.BAKED_INDEX)
+    with open(index + ".tmp", "w") as file:
+        json.dump({"variants": variants}, file, indent=1, sort_keys=True)
+    os.replace(index + ".tmp", index)
+
+    if prune:
+        keep = {entry["file"] for entry in variants.values()} | {assets.BAKED_INDEX}
+        for name in os.listdir(folder):
+            if name not in keep:
+                os.remove(os.path.join(folder, name))
+    return results
+
+
+def main():
+    """Bakes the manifest and prints each variant with the pixels it saves."""
+    parser = argparse.ArgumentParser(description="Bake the images in media/ into the sizes they are drawn at.")
+    parser.add_argument("--manifest", default=assets.MANIFEST, help="bake manifest")
+    parser.add_argument("--output", default=assets.BAKED, help="cache folder")
+    parser.add_argument("--keep", action="store_true", help="keep baked files that are no longer in the manifest")
+    args = parser.parse_args()
+
+    results = bake(args.manifest, args.output, prune=not args.keep)
+    source_bytes = baked_bytes = source_pixels = baked_pixels = 0
+    for path in {path for path, _, _, _, _ in results}:
+        source_bytes += os.path.getsize(path)
+        width, height = pygame.image.load(path).get_size()
+        source_pixels += width * height
+    for path, size, flip, target, baked in results:
+        baked_bytes += os.path.getsize(target)
+        baked_pixels += size[0] * size[1]
+        print(f"{'baked ' if baked else 'cached'}  {path} {size[0]}x{size[1]}{' flipped' if flip else ''}  "
+              f"-> {os.path.basename(target)} ({os.path.getsize(target)} bytes)")
+    print(f"{len(results)} variants: {source_bytes / 1024:.0f} KB of sources -> {baked_bytes / 1024:.0f} KB baked, "
+          f"{source_pixels * 4 / 2 ** 20:.1f} MB -> {baked_pixels * 4 / 2 ** 20:.2f} MB decoded")
+
+
+if __name__ == "__main__":
+    main()
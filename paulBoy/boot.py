@@ -0,0 +1,239 @@
+"""
+Boot pipeline: warms the app up on a thread pool while frames are already being drawn.
+
+MainApp opens the display, draws the first frame straight away and hands the
+slow parts of starting up (fonts, images, sound decoding, the music scan and
+building every tablet) to a BootPipeline. Until a tab's tablet is ready a
+LoadingTab stands in for it, so each tab becomes usable as soon as its own
+dependencies are, not when the last one is.
+"""
+
+import os
+import time
+from concurrent import futures
+
+import metrics
+
+
+def process_age():
+    """Seconds since the process started, 0.0 where /proc is not available."""
+    try:
+        with open("/proc/self/stat") as stat:
+            # Fields after the command name, which may itself contain spaces; starttime is field 22
+            fields = stat.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as uptime:
+            up = float(uptime.read().split()[0])
+        return max(0.0, up - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+class BootJob:
+    """
+    One warm-up job of the boot pipeline.
+
+    Attributes:
+        name (str): Name of the job, also its milestone once installed.
+        work: Callable run on a worker thread; its return value is the job's result.
+        install: Callable run with the result on the main thread, None if there is nothing to install.
+        after (tuple): Names of the jobs that must be installed before this one starts.
+        future (concurrent.futures.Future): The running work, None until it starts.
+        result: What work returned, once installed.
+        installed (bool): True once the result has been installed.
+        seconds (float): Time the work took on its worker.
+    """
+
+    def __init__(self, name, work, install=None, after=()):
+        self.name = name
+        self.work = work
+        self.install = install
+        self.after = tuple(after)
+        self.future = None
+        self.result = None
+        self.installed = False
+        self.seconds = 0.0
+
+    def run(self):
+        """Runs the work on a worker thread, timing it."""
+        started = time.perf_counter()
+        try:
+            return self.work()
+        finally:
+            self.seconds = time.perf_counter() - started
+
+
+class BootPipeline:
+    """
+    Runs warm-up jobs on a thread pool and installs their results on the main thread.
+
+    A job starts on a worker as soon as the jobs it depends on are installed. Its
+    result is installed from ``poll``, which the main loop calls every pass, so
+    anything the frame loop reads is only swapped in between frames. Milestones
+    are seconds since the process started: "first_frame", the name of every job
+    once it is installed, and "interactive" once every job is.
+
+    Attributes:
+        jobs (dict): BootJob by name, in the order they were added.
+        milestones (dict): Seconds from the process start to each milestone reached.
+        started (float): perf_counter() time the process started.
+    """
+
+    def __init__(self, workers=4, started=None):
+        """
+        Args:
+            workers (int): Threads running jobs at the same time.
+            started (float): perf_counter() time to measure milestones from, defaults to the process start.
+        """
+        self.started = time.perf_counter() - process_age() if started is None else started
+        self.executor = futures.ThreadPoolExecutor(workers, thread_name_prefix="boot")
+        self.jobs = {}
+        self.waiting = []
+        self.milestones = {}
+
+    def add(self, name, work, install=None, after=()):
+        """
+        Adds a job, starting it right away unless it waits for other jobs.
+
+        Args:
+            name (str): Name of the job.
+            work: Callable run on a worker thread.
+            install: Callable run with work's result on the main thread.
+            after (tuple): Names of jobs added earlier that this one needs.
+        """
+        if name in self.jobs:
+            raise ValueError(f"boot job '{name}' is already added")
+        unknown = [dependency for dependency in after if dependency not in self.jobs]
+        if unknown:
+            raise ValueError(f"boot job '{name}' waits for unknown jobs {unknown}")
+        job = BootJob(name, work, install, after)
+        self.jobs[name] = job
+        if self.can_start(job):
+            self.start(job)
+        else:
+            self.waiting.append(job)
+
+    def can_start(self, job):
+        """True if every job that a job depends on is installed."""
+        return all(self.jobs[dependency].installed for dependency in job.after)
+
+    def start(self, job):
+        """Submits a job's work to the thread pool."""
+        job.future = self.executor.submit(job.run)
+
+    def ready(self, name):
+        """True once the named job's result is installed."""
+        return self.jobs[name].installed
+
+    def result(self, name):
+        """
+        Returns what a job's work returned; for jobs that depend on it.
+
+        Args:
+            name (str): Name of an installed job.
+        """
+        job = self.jobs[name]
+        if not job.installed:
+            raise RuntimeError(f"boot job '{name}' is not installed yet")
+        return job.result
+
+    @property
+    def installed(self):
+        """Number of installed jobs."""
+        return sum(job.installed for job in self.jobs.values())
+
+    @property
+    def progress(self):
+        """Share of the jobs that are installed, 0.0 - 1.0."""
+        return self.installed / len(self.jobs) if self.jobs else 1.0
+
+    @property
+    def done(self):
+        """True once every job is installed."""
+        return all(job.installed for job in self.jobs.values())
+
+    def poll(self):
+        """
+        Installs the results of finished jobs and starts the jobs that were waiting for them.
+
+        A job that raised re-raises here, on the main thread.
+
+        Returns:
+            list: Names of the jobs installed by this call.
+        """
+        installed = []
+        for job in self.jobs.values():
+            if job.installed or job.future is None or not job.future.done():
+                continue
+            job.result = job.future.result()
+            if job.install is not None:
+                job.install(job.result)
+            job.installed = True
+            self.mark(job.name)
+            installed.append(job.name)
+        if installed:
+            for job in [job for job in self.waiting if self.can_start(job)]:
+                self.waiting.remove(job)
+                self.start(job)
+            if self.done:
+                self.mark("interactive")
+                self.executor.shutdown(wait=False)
+        return installed
+
+    def wait(self):
+        """Blocks until every job is installed, e.g. for a replay that needs the whole app from its first frame."""
+        while not self.done:
+            running = [job.future for job in self.jobs.values() if job.future is not None and not job.installed]
+            futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            self.poll()
+
+    def mark(self, milestone):
+        """
+        Records the first time a milestone is reached, also as the boot_seconds metric.
+
+        Args:
+            milestone (str): E.g. "first_frame" or the name of a job.
+        """
+        if milestone not in self.milestones:
+            seconds = time.perf_counter() - self.started
+            self.milestones[milestone] = seconds
+            metrics.BOOT_SECONDS.labels(milestone).set(seconds)
+
+    def report(self):
+        """Returns time-to-first-frame, time-to-interactive and when each job was ready and how long it took."""
+        lines = [f"boot: first frame {self.milestones.get('first_frame', 0.0) * 1000:.0f} ms, "
+                 f"interactive {self.milestones.get('interactive', 0.0) * 1000:.0f} ms"]
+        for name in self.jobs:
+            if name in self.milestones:
+                lines.append(f"  {name:<10} ready {self.milestones[name] * 1000:5.0f} ms, "
+                             f"took {self.jobs[name].seconds * 1000:4.0f} ms")
+        return "\n".join(lines)
+
+
+class LoadingTab:
+    """
+    Stands in for a tab whose tablet is still being built, showing the boot progress.
+
+    Attributes:
+        boot (BootPipeline): The pipeline building the tablet.
+        font (pygame.font.Font): Font of the loading text.
+        draw (DrawList): Draw list of the app.
+    """
+
+    PIP_COLOUR = (5, 250, 5)
+    MID_PIP_COLOUR = (1, 150, 9)
+    DARK_PIP_COLOUR = (1, 50, 9)
+    BAR = (90, 170, 300, 10)
+
+    def __init__(self, boot, font, draw):
+        self.boot = boot
+        self.font = font
+        self.draw = draw
+
+    def render(self):
+        """Draws the loading text and a bar filled by the share of installed jobs."""
+        x, y, width, height = self.BAR
+        self.draw.text(self.font, "LOADING", self.PIP_COLOUR, (x, y - 40))
+        self.draw.text(self.font, f"{self.boot.installed}/{len(self.boot.jobs)}", self.MID_PIP_COLOUR,
+                       (x + width - 45, y - 40))
+        self.draw.rect(self.DARK_PIP_COLOUR, self.BAR)
+        self.draw.rect(self.MID_PIP_COLOUR, (x, y, int(width * self.boot.progress), height))
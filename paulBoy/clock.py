@@ -0,0 +1,100 @@
+import time as _time
+from datetime import datetime
+
+
+class SystemClock:
+    """The real wall and monotonic clocks."""
+
+    def time(self):
+        """Returns the wall time as a Unix timestamp."""
+        return _time.time()
+
+    def monotonic(self):
+        """Returns a monotonic time in seconds."""
+        return _time.monotonic()
+
+
+class ManualClock:
+    """
+    A clock that only moves when told to, for deterministic replays and tests.
+
+    Attributes:
+        wall (float): Current wall time as a Unix timestamp.
+        mono (float): Current monotonic time in seconds.
+    """
+
+    def __init__(self, start=0.0, monotonic=0.0):
+        """
+        Args:
+            start (float): Initial wall time as a Unix timestamp.
+            monotonic (float): Initial monotonic time.
+        """
+        self.wall = start
+        self.mono = monotonic
+
+    def time(self):
+        """Returns the wall time as a Unix timestamp."""
+        return self.wall
+
+    def monotonic(self):
+        """Returns the monotonic time in seconds."""
+        return self.mono
+
+    def advance(self, seconds):
+        """
+        Moves both clocks forward.
+
+        Args:
+            seconds (float): How far to move.
+        """
+        self.wall += seconds
+        self.mono += seconds
+
+
+# The clock every tab reads; swapped for a ManualClock when replaying a recording
+_current = SystemClock()
+
+
+def set_clock(clock):
+    """
+    Replaces the clock used by the application.
+
+    Args:
+        clock: A SystemClock, ManualClock or anything with time() and monotonic().
+
+    Returns:
+        The previous clock, so it can be restored.
+    """
+    global _current
+    previous, _current = _current, clock
+    return previous
+
+
+def get_clock():
+    """Returns the clock used by the application."""
+    return _current
+
+
+def time():
+    """Returns the application's wall time as a Unix timestamp."""
+    return _current.time()
+
+
+def monotonic():
+    """Returns the application's monotonic time in seconds."""
+    return _current.monotonic()
+
+
+def strftime(format):
+    """
+    Formats the application's local time, like time.strftime.
+
+    Args:
+        format (str): time.strftime format string.
+    """
+    return _time.strftime(format, _time.localtime(_current.time()))
+
+
+def now():
+    """Returns the application's local time as a datetime, like datetime.now."""
+    return datetime.fromtimestamp(_current.time())
@@ -1,6 +1,8 @@
 import struct
 import pygame, os, sys
 import moderngl
+import palette
+from render_quality import OFF, HIGH, QualityGovernor
 
 
 # Credit:
@@ -15,12 +17,34 @@ def resource_path(relative):
 	return absolute_path
 
 class Graphic_engine:
-    def __init__(self, screen, style = 1, VIRTUAL_RES=(480, 320), cpu_only=False, fullscreen=False):
+    # Post-processing look of the "low" and "high" quality tiers
+    PHOSPHOR_PERSISTENCE = 0.6  # share of the previous frame's glow that survives a frame
+    BLOOM_THRESHOLD = 0.45  # brightness above which pixels glow ("high" only)
+    BLOOM_STRENGTH = 0.8
+    VIGNETTE = 0.6
+
+    def __init__(self, screen, style = 1, VIRTUAL_RES=(480, 320), cpu_only=False, fullscreen=False,
+                 theme=palette.DEFAULT_THEME, framebuffer=None, quality=OFF, gpu_budget=10.0):
         pygame.init()
         self.VIRTUAL_RES = VIRTUAL_RES
-        self.cpu_only = cpu_only
+        # Writing to a framebuffer device bypasses OpenGL and the display entirely
+        self.framebuffer = framebuffer
+        self.cpu_only = cpu_only or framebuffer is not None
         self.screen = screen
         self.fullscreen = fullscreen
+        # An 8-bit screen holds palette indices that are resolved on the GPU
+        self.indexed = screen.get_bitsize() == 8
+        self.theme = theme
+        self.draw_palette = palette.canonical_palette()
+        self.brightness = 1.0
+        self.shader_enabled = True
+        # Picks the post-processing tier and steps it down when the GPU runs over budget
+        self.governor = QualityGovernor(quality, gpu_budget)
+        self.post = None
+        self.frame_index = 0
+        self.gpu_time = None
+        # A texture composited on the GPU that replaces the uploaded screen, see set_source
+        self.source = None
         if not(self.cpu_only):
             self.ctx = moderngl.create_context()
             self.texture_coordinates = [0, 1,  1, 1,
@@ -37,11 +61,23 @@ class Graphic_engine:
                 fragment_shader=open(resource_path('shaders/FRAGMENT_SHADER.glsl')).read(),
             )
             self.prog['mode'] = self.style
+            self.prog['indexed'] = int(self.indexed)
+            self.prog['brightness'] = self.brightness
+
+            if self.indexed:
+                # One byte per pixel, sampled without filtering so indices are never blended
+                self.screen_texture = self.ctx.texture(self.VIRTUAL_RES, 1, screen.get_view('1'))
+                self.screen_texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
 
-            self.screen_texture = self.ctx.texture(
-                self.VIRTUAL_RES, 3,
-                pygame.image.tostring(screen, "RGB", 1)
-                )
+                self.palette_texture = self.ctx.texture((palette.PALETTE_SIZE, 1), 3)
+                self.palette_texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+                self.prog['Palette'] = 1
+                self.set_theme(self.theme)
+            else:
+                self.screen_texture = self.ctx.texture(
+                    self.VIRTUAL_RES, 3,
+                    pygame.image.tostring(screen, "RGB", 1)
+                    )
 
             self.screen_texture.repeat_x = False
             self.screen_texture.repeat_y = False
@@ -56,25 +92,246 @@ class Graphic_engine:
             ]
 
             self.vao = self.ctx.vertex_array(self.prog, self.vao_content, index_buffer=self.ibo)
+
+            try:
+                # Two timer queries, so each frame reads the previous one instead of waiting for the GPU
+                self.timer_queries = [self.ctx.query(time=True) for _ in range(2)]
+            except Exception:
+                self.timer_queries = None  # no timer queries (e.g. some GLES drivers): tiers stay fixed
+        elif self.framebuffer is not None:
+            from framebuffer import FramebufferOutput
+            self.output = FramebufferOutput(self.framebuffer, self.VIRTUAL_RES, theme=self.theme)
         else:
             self.diaplay = pygame.display.get_surface()
+            if self.indexed:
+                self.set_theme(self.theme)
 
     def change_shader(self):
         if not self.cpu_only:
-            self.__init__(self.screen, (self.style + 1) % 3, self.VIRTUAL_RES)
+            self.__init__(self.screen, (self.style + 1) % 3, self.VIRTUAL_RES, theme=self.theme,
+                          quality=self.governor.tier, gpu_budget=self.governor.budget)
+
+    def set_source(self, texture):
+        """
+        Samples a texture that is already on the GPU instead of uploading the screen surface.
+
+        Args:
+            texture (moderngl.Texture): RGB texture of VIRTUAL_RES, top row first like the uploaded screen.
+        """
+        if self.cpu_only or self.indexed:
+            raise ValueError("a GPU source needs the OpenGL output in RGB mode")
+        self.source = texture
+        self.screen_texture = texture
+
+    def set_quality(self, tier):
+        """
+        Selects the post-processing tier.
+
+        Args:
+            tier (str): "off" for the single CRT pass, "low" adds phosphor persistence and a
+                vignette, "high" adds a half resolution bloom.
+        """
+        self.governor.set_tier(tier)
+
+    def build_post(self, size):
+        """
+        Creates the offscreen targets and programs of the post-processing passes.
+
+        Args:
+            size (tuple): Size of the output in pixels.
+        """
+        def target(target_size):
+            texture = self.ctx.texture(target_size, 3)
+            texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+            texture.repeat_x = False
+            texture.repeat_y = False
+            return texture, self.ctx.framebuffer(color_attachments=[texture])
+
+        def program(name):
+            prog = self.ctx.program(
+                vertex_shader=open(resource_path("shaders/VERTEX_SHADER.glsl")).read(),
+                fragment_shader=open(resource_path(f"shaders/{name}.glsl")).read(),
+            )
+            return prog, self.ctx.vertex_array(prog, self.vao_content, index_buffer=self.ibo)
+
+        half = (max(1, size[0] // 2), max(1, size[1] // 2))
+        self.post = {
+            "size": size,
+            "scene": target(size),
+            # Ping-pong pair: each frame blends into one while reading the other
+            "history": [target(size), target(size)],
+            "bloom": [target(half), target(half)],
+            "phosphor": program("PHOSPHOR_SHADER"),
+            "blur": program("BLUR_SHADER"),
+            "composite": program("COMPOSITE_SHADER"),
+        }
+        self.post["phosphor"][0]['Previous'] = 1
+        self.post["phosphor"][0]['persistence'] = self.PHOSPHOR_PERSISTENCE
+        self.post["composite"][0]['Bloom'] = 1
+        self.post["composite"][0]['vignette'] = self.VIGNETTE
+        self.clear_history()
+
+    def clear_history(self):
+        """Forgets the phosphor glow, so an old frame never shows through after a pause."""
+        if self.post is not None:
+            for _, fbo in self.post["history"]:
+                fbo.clear(0.0, 0.0, 0.0)
+
+    def render_post(self, output):
+        """
+        Draws the CRT pass offscreen, then phosphor persistence, bloom and vignette into output.
+
+        Args:
+            output (moderngl.Framebuffer): Where the finished frame goes, normally the window.
+        """
+        size = output.viewport[2:]
+        if self.post is None or self.post["size"] != size:
+            self.build_post(size)
+        post = self.post
+
+        scene_texture, scene_fbo = post["scene"]
+        scene_fbo.use()
+        self.screen_texture.use()
+        if self.indexed:
+            self.palette_texture.use(location=1)
+        self.vao.render()
+
+        (image, image_fbo), (previous, _) = (post["history"][self.frame_index % 2],
+                                            post["history"][(self.frame_index + 1) % 2])
+        image_fbo.use()
+        scene_texture.use(location=0)
+        previous.use(location=1)
+        post["phosphor"][1].render()
+
+        bloom = image
+        strength = 0.0
+        if self.governor.tier == HIGH:
+            blur, blur_vao = post["blur"]
+            (first, first_fbo), (second, second_fbo) = post["bloom"]
+            width, height = first.size
+            first_fbo.use()
+            image.use(location=0)
+            blur['direction'] = (1.0 / width, 0.0)
+            blur['threshold'] = self.BLOOM_THRESHOLD
+            blur_vao.render()
+            second_fbo.use()
+            first.use(location=0)
+            blur['direction'] = (0.0, 1.0 / height)
+            blur['threshold'] = 0.0
+            blur_vao.render()
+            bloom, strength = second, self.BLOOM_STRENGTH
+
+        output.use()
+        image.use(location=0)
+        bloom.use(location=1)
+        post["composite"][0]['bloom_strength'] = strength
+        post["composite"][1].render()
+
+    def measure_gpu_time(self):
+        """
+        Reads the GPU time of the previous frame and lets the governor step the tier down.
+
+        Returns:
+            float: GPU milliseconds of the previous frame, or None if not measured.
+        """
+        query = self.timer_queries[(self.frame_index + 1) % 2]
+        if self.frame_index == 0 or not query.elapsed:
+            return None
+        self.gpu_time = query.elapsed / 1e6
+        if self.governor.record(self.gpu_time):
+            print(f"GPU frame time {self.gpu_time:.1f} ms over budget, quality stepped down to "
+                  f"'{self.governor.tier}'")
+        return self.gpu_time
+
+    def set_brightness(self, level):
+        """
+        Scales the output brightness, used to dim or blank the display when idle.
+
+        Args:
+            level (float): 0.0 (black) to 1.0 (full brightness).
+        """
+        self.brightness = level
+        if self.framebuffer is not None:
+            self.output.set_brightness(level)
+        elif not self.cpu_only:
+            self.prog['brightness'] = level
+
+    def set_shader_enabled(self, enabled):
+        """
+        Turns the CRT effect on or off without losing the selected style.
+
+        Args:
+            enabled (bool): False draws the plain screen texture.
+        """
+        self.shader_enabled = enabled
+        if not self.cpu_only:
+            self.prog['mode'] = self.style if enabled else 0
+            if enabled:
+                self.clear_history()
+
+    def set_theme(self, theme):
+        """
+        Switches the colour theme of an indexed screen.
+
+        Only the 256-entry palette changes, so nothing has to be re-rendered.
+
+        Args:
+            theme (str): One of the names in palette.THEMES.
+        """
+        entries = palette.theme_palette(theme)
+        self.theme = theme
+        if self.framebuffer is not None:
+            self.output.set_theme(theme, self.brightness)
+            return
+        if not self.indexed:
+            return
+        if not self.cpu_only:
+            self.palette_texture.write(palette.palette_bytes(entries))
+        else:
+            self.display_palette = entries
 
     def render(self):
         if not(self.cpu_only):
-            texture_data = self.screen.get_view('1')
-            self.screen_texture.write(texture_data)
-            self.ctx.clear(14/255,40/255,66/255)
-            self.screen_texture.use()
-            self.vao.render()
+            if self.source is None:
+                texture_data = self.screen.get_view('1')
+                self.screen_texture.write(texture_data)
+            if self.shader_enabled and self.governor.tier != OFF:
+                # Only the multi-pass tiers are timed, the single pass is the cheapest there is
+                if self.timer_queries is not None:
+                    with self.timer_queries[self.frame_index % 2]:
+                        self.render_post(self.ctx.screen)
+                    self.measure_gpu_time()
+                else:
+                    self.render_post(self.ctx.screen)
+                self.frame_index += 1
+            else:
+                self.ctx.screen.use()
+                self.ctx.clear(14/255,40/255,66/255)
+                self.screen_texture.use()
+                if self.indexed:
+                    self.palette_texture.use(location=1)
+                self.vao.render()
             pygame.display.flip()
+        elif self.framebuffer is not None:
+            self.output.write(self.screen)
         else:
-            self.diaplay.blit(self.screen, (0, 0))
+            if self.indexed and self.theme != palette.DEFAULT_THEME:
+                # Show the themed colours, then restore the palette tablets draw with
+                self.screen.set_palette(self.display_palette)
+                self.diaplay.blit(self.screen, (0, 0))
+                self.screen.set_palette(self.draw_palette)
+            else:
+                self.diaplay.blit(self.screen, (0, 0))
+            if self.brightness < 1.0:
+                level = round(255 * self.brightness)
+                self.diaplay.fill((level, level, level), special_flags=pygame.BLEND_MULT)
             pygame.display.update()
     
+    def close(self):
+        """Closes the framebuffer output, if frames are written to one."""
+        if self.framebuffer is not None:
+            self.output.close()
+
     def Full_screen(self, REAL_RES):
         if not(self.cpu_only):
             if not(self.fullscreen):
@@ -0,0 +1,240 @@
+from functools import partial
+
+import pygame
+
+import assets
+import metrics
+
+
+class DrawStats:
+    """
+    Counts what the draw list did, per frame and in total.
+
+    Attributes:
+        frames (int): Number of finished frames.
+        commands (int): Draw commands queued in the current frame.
+        batches (int): Surface.blits calls made in the current frame.
+        renders (int): Text and sprite surfaces built in the current frame (cache misses).
+        last (dict): The counts of the previous frame.
+        totals (dict): The counts summed over all frames.
+    """
+
+    FIELDS = ("commands", "batches", "renders")
+
+    def __init__(self):
+        self.frames = 0
+        self.commands = 0
+        self.batches = 0
+        self.renders = 0
+        self.last = dict.fromkeys(self.FIELDS, 0)
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+
+    def end_frame(self):
+        """Closes the current frame's counts and starts the next frame at zero."""
+        self.frames += 1
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            self.last[field] = value
+            self.totals[field] += value
+            setattr(self, field, 0)
+
+    def mean(self, field):
+        """Average of a count per frame."""
+        return self.totals[field] / self.frames if self.frames else 0.0
+
+    def summary(self):
+        """Returns the per-frame averages, rounded for reports."""
+        return {"frames": self.frames, **{field: round(self.mean(field), 2) for field in self.FIELDS}}
+
+    def report(self):
+        """Returns a one-line summary of the per-frame averages."""
+        return (f"draw list: {self.frames} frames, {self.mean('commands'):.1f} commands, "
+                f"{self.mean('batches'):.1f} batches, {self.mean('renders'):.2f} renders per frame")
+
+
+class DrawList:
+    """
+    A per-frame buffer of draw commands that is drawn with a single Surface.blits call.
+
+    Every primitive ends up as a blit: text is rendered once per (font, text, colour)
+    and cached, solid rectangles are cached sprites of their size and colour, and
+    static groups of rectangles such as the tab frames are baked into one
+    colour-keyed sprite. Commands keep their order, so the result is the same as
+    drawing them one by one, but the whole frame costs one call into pygame.
+
+    ``blit`` and ``fill`` take the same arguments as on a Surface, so a DrawList can be
+    passed to widgets that draw onto "a screen". Anything drawn straight onto the
+    target must call ``flush`` first to stay in order.
+
+    Attributes:
+        target (pygame.Surface): The surface the commands are drawn onto.
+        commands (list): Queued (surface, dest) or (surface, dest, area) tuples.
+        cache_size (int): Most cached text and rectangle surfaces kept at once.
+        stats (DrawStats): Per-frame counts.
+    """
+
+    CACHE_SIZE = 256
+    COLORKEY = (0, 0, 0)
+
+    def __init__(self, target, cache_size=CACHE_SIZE):
+        self.target = target
+        self.commands = []
+        self.cache_size = cache_size
+        self.stats = DrawStats()
+        self.text_cache = {}
+        self.rect_cache = {}
+        # Sprites are built from code that never changes, so they are kept for good
+        self.sprites = {}
+        # Metric children are looked up once; the lookups themselves are on the hot path
+        self.lookups = {id(cache): (metrics.DRAW_CACHE_LOOKUPS.labels(name, "hit"),
+                                    metrics.DRAW_CACHE_LOOKUPS.labels(name, "miss"))
+                        for name, cache in (("text", self.text_cache), ("rect", self.rect_cache),
+                                            ("sprite", self.sprites))}
+
+    def surface(self, size):
+        """
+        Creates a surface in the target's pixel format, so blitting it is a plain copy.
+
+        Args:
+            size (tuple): Width and height.
+        """
+        surface = pygame.Surface(size, 0, self.target)
+        if self.target.get_bitsize() == 8:
+            surface.set_palette(self.target.get_palette())
+        return surface
+
+    def cached(self, cache, key, build):
+        """Returns cache[key], building it first; the cache is emptied when it is full."""
+        hits, misses = self.lookups[id(cache)]
+        surface = cache.get(key)
+        if surface is None:
+            if len(cache) >= self.cache_size:
+                cache.clear()
+            surface = cache[key] = build()
+            self.stats.renders += 1
+            misses.inc()
+        else:
+            hits.inc()
+        return surface
+
+    def blit(self, surface, dest, area=None):
+        """
+        Queues a blit.
+
+        Args:
+            surface (pygame.Surface): The source surface.
+            dest (tuple): Position, or a rect whose top-left is used.
+            area (tuple): Part of the source to draw, all of it if None.
+        """
+        self.commands.append((surface, dest) if area is None else (surface, dest, area))
+        self.stats.commands += 1
+
+    def rendered(self, font, text, color):
+        """
+        Returns antialiased text from the cache, rendering it only the first time it is asked for.
+
+        Args:
+            font (pygame.font.Font): Font to render with.
+            text (str): The text.
+            color (tuple): RGB colour.
+        """
+        return self.cached(self.text_cache, (font, text, color), lambda: font.render(text, True, color, None))
+
+    def text(self, font, text, color, dest):
+        """
+        Queues antialiased text, rendering it only the first time it is drawn.
+
+        Args:
+            font (pygame.font.Font): Font to render with.
+            text (str): The text.
+            color (tuple): RGB colour.
+            dest (tuple): Top-left position.
+        """
+        self.blit(self.rendered(font, text, color), dest)
+
+    def rect(self, color, rect):
+        """
+        Queues a filled rectangle.
+
+        Args:
+            color (tuple): RGB colour.
+            rect (tuple): (x, y, width, height) or a pygame.Rect.
+        """
+        x, y, width, height = rect
+        if width <= 0 or height <= 0:
+            return
+
+        def build():
+            solid = self.surface((width, height))
+            solid.fill(color)
+            return solid
+
+        self.blit(self.cached(self.rect_cache, (color, width, height), build), (x, y))
+
+    def fill(self, color, rect=None):
+        """Queues a filled rectangle with Surface.fill arguments; no rect fills the whole target."""
+        self.rect(color, rect if rect is not None else self.target.get_rect())
+
+    def sprite(self, key, build, dest):
+        """
+        Queues a sprite that is built once and then reused, e.g. a scaled icon or a waveform dot.
+
+        Args:
+            key: Hashable name of the sprite.
+            build: Callable returning the sprite's surface, called on first use only.
+            dest (tuple): Top-left position.
+        """
+        hits, misses = self.lookups[id(self.sprites)]
+        surface = self.sprites.get(key)
+        if surface is None:
+            surface = self.sprites[key] = build()
+            self.stats.renders += 1
+            misses.inc()
+        else:
+            hits.inc()
+        self.blit(surface, dest)
+
+    def image(self, path, size, dest, flip=False):
+        """
+        Queues an image file scaled to a size, loaded once; from the baked cache if bake_media.py made it.
+
+        Args:
+            path (str): Image file.
+            size (tuple): Width and height to scale to.
+            dest (tuple): Top-left position.
+            flip (bool): Mirror the image horizontally.
+        """
+        self.sprite(("image", path, size, flip), partial(assets.scaled, path, size, flip), dest)
+
+    def chrome(self, key, color, rects):
+        """
+        Queues a static group of filled rectangles baked into one colour-keyed sprite.
+
+        Args:
+            key: Hashable name of the group, e.g. the tab whose frame it is.
+            color (tuple): RGB colour of all rectangles.
+            rects (list): (x, y, width, height) tuples in screen coordinates.
+        """
+        bounds = pygame.Rect(rects[0]).unionall(rects[1:])
+
+        def build():
+            layer = self.surface(bounds.size)
+            layer.fill(self.COLORKEY)
+            layer.set_colorkey(self.COLORKEY)
+            for x, y, width, height in rects:
+                layer.fill(color, (x - bounds.x, y - bounds.y, width, height))
+            return layer
+
+        self.sprite(("chrome", key), build, bounds.topleft)
+
+    def flush(self):
+        """Draws every queued command onto the target in order and empties the queue."""
+        if self.commands:
+            self.target.blits(self.commands, doreturn=False)
+            self.stats.batches += 1
+            self.commands.clear()
+
+    def end_frame(self):
+        """Draws what is still queued and closes the frame's statistics."""
+        self.flush()
+        self.stats.end_frame()
@@ -0,0 +1,195 @@
+import fcntl
+import os
+import select
+import struct
+import threading
+import time
+
+from input_actions import NEXT_TAB, SCROLL_UP, SCROLL_DOWN, SELECT, post_action
+
+# struct input_event from linux/input.h: timeval, type, code, value
+EVENT_FORMAT = "llHHi"
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+
+EV_KEY = 0x01
+EV_REL = 0x02
+
+REL_X = 0x00
+REL_DIAL = 0x07
+REL_WHEEL = 0x08
+
+KEY_TAB = 15
+KEY_ENTER = 28
+KEY_SPACE = 57
+KEY_UP = 103
+KEY_DOWN = 108
+BTN_LEFT = 0x110
+BTN_RIGHT = 0x111
+
+# Switch the device timestamps to CLOCK_MONOTONIC so they compare with time.monotonic()
+EVIOCSCLOCKID = 0x400445A0
+CLOCK_MONOTONIC = 1
+EVIOCGRAB = 0x40044590
+
+DEFAULT_KEY_MAP = {
+    KEY_ENTER: SELECT,
+    KEY_SPACE: SELECT,
+    BTN_LEFT: SELECT,
+    KEY_TAB: NEXT_TAB,
+    BTN_RIGHT: NEXT_TAB,
+    KEY_UP: SCROLL_UP,
+    KEY_DOWN: SCROLL_DOWN,
+}
+DEFAULT_ENCODER_AXES = (REL_X, REL_DIAL, REL_WHEEL)
+
+
+def pack_event(event_type, code, value, timestamp=None):
+    """
+    Packs one input_event the way the kernel delivers it.
+
+    Useful for feeding a pipe or file to EvdevInput instead of a real device.
+
+    Args:
+        event_type (int): EV_KEY, EV_REL, ...
+        code (int): Key or axis code.
+        value (int): Key state or relative movement.
+        timestamp (float): Seconds on the monotonic clock, defaults to now.
+    """
+    if timestamp is None:
+        timestamp = time.monotonic()
+    seconds = int(timestamp)
+    return struct.pack(EVENT_FORMAT, seconds, int((timestamp - seconds) * 1_000_000), event_type, code, value)
+
+
+class EvdevInput:
+    """
+    Reads Linux evdev devices on a dedicated thread and turns them into semantic actions.
+
+    Rotary encoder movement becomes SCROLL_UP / SCROLL_DOWN once per detent and key
+    presses become SELECT or NEXT_TAB. Each action is posted into the pygame event
+    queue together with the kernel timestamp of the physical input, so the main loop
+    can measure input-to-frame latency.
+
+    Attributes:
+        devices (list): Device paths (/dev/input/eventN) or anything else os.open accepts, such as a FIFO.
+        key_map (dict): Key code to action mapping.
+        encoder_axes (tuple): Relative axes that are treated as the rotary encoder.
+        detent (int): Relative units per encoder detent.
+        invert (bool): Swap the scroll direction of the encoder.
+        grab (bool): Take exclusive access so no mouse emulation layer sees the events.
+        post (callable): Receives (action, timestamp); posts to pygame by default.
+        events_read (int): Number of raw input events read.
+        actions_posted (int): Number of semantic actions posted.
+    """
+
+    def __init__(self, devices, key_map=None, encoder_axes=DEFAULT_ENCODER_AXES, detent=1, invert=False,
+                 grab=False, post=post_action):
+        self.devices = list(devices)
+        self.key_map = dict(DEFAULT_KEY_MAP if key_map is None else key_map)
+        self.encoder_axes = encoder_axes
+        self.detent = detent
+        self.invert = invert
+        self.grab = grab
+        self.post = post
+
+        self.events_read = 0
+        self.actions_posted = 0
+        self.travel = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.fds = []
+
+    def open_devices(self):
+        """Opens every device in non-blocking mode and configures monotonic timestamps where supported."""
+        for path in self.devices:
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                fcntl.ioctl(fd, EVIOCSCLOCKID, struct.pack("i", CLOCK_MONOTONIC))
+                if self.grab:
+                    fcntl.ioctl(fd, EVIOCGRAB, 1)
+            except OSError:
+                pass  # not an evdev node (pipe, file); timestamps are taken as-is
+            self.fds.append(fd)
+
+    def start(self):
+        """Opens the devices and starts the reader thread."""
+        self.open_devices()
+        self.thread = threading.Thread(target=self.read_loop, name="evdev-input", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the reader thread and closes the devices."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = []
+
+    def read_loop(self):
+        """Waits on all devices and handles complete events as they arrive."""
+        pending = {fd: b"" for fd in self.fds}
+        while pending and not self.stop_event.is_set():
+            readable, _, _ = select.select(list(pending), [], [], 0.1)
+            for fd in readable:
+                try:
+                    data = os.read(fd, EVENT_SIZE * 64)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    del pending[fd]  # device unplugged
+                    continue
+                if not data:
+                    del pending[fd]  # end of a pipe or file
+                    continue
+                data = pending[fd] + data
+                usable = len(data) - len(data) % EVENT_SIZE
+                for offset in range(0, usable, EVENT_SIZE):
+                    seconds, micros, event_type, code, value = struct.unpack_from(EVENT_FORMAT, data, offset)
+                    self.handle_event(event_type, code, value, seconds + micros / 1_000_000)
+                pending[fd] = data[usable:]
+
+    def handle_event(self, event_type, code, value, timestamp):
+        """
+        Translates one raw input event and posts the resulting actions.
+
+        Args:
+            event_type (int): EV_KEY, EV_REL, ...
+            code (int): Key or axis code.
+            value (int): Key state (0 up, 1 down, 2 repeat) or relative movement.
+            timestamp (float): Seconds on the monotonic clock.
+        """
+        self.events_read += 1
+        for action in self.translate(event_type, code, value):
+            self.post(action, timestamp)
+            self.actions_posted += 1
+
+    def translate(self, event_type, code, value):
+        """
+        Maps a raw input event to semantic actions.
+
+        Args:
+            event_type (int): EV_KEY, EV_REL, ...
+            code (int): Key or axis code.
+            value (int): Key state or relative movement.
+
+        Returns:
+            list: Zero or more actions.
+        """
+        if event_type == EV_KEY and code in self.key_map:
+            action = self.key_map[code]
+            # Auto-repeat is only useful for scrolling; a held select must not fire repeatedly
+            if value == 1 or (value == 2 and action in (SCROLL_UP, SCROLL_DOWN)):
+                return [action]
+            return []
+        if event_type == EV_REL and code in self.encoder_axes:
+            self.travel += -value if self.invert else value
+            actions = []
+            while self.travel >= self.detent:
+                self.travel -= self.detent
+                actions.append(SCROLL_DOWN)
+            while self.travel <= -self.detent:
+                self.travel += self.detent
+                actions.append(SCROLL_UP)
+            return actions
+        return []
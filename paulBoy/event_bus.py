@@ -0,0 +1,148 @@
+"""
+In-process event bus on top of the pygame event queue.
+
+Things that happen rarely (a song ends, the alarm rings or is snoozed, a new
+minute or day starts, new YouTube numbers arrive) are published as typed pygame
+events instead of being polled for every frame. ``publish`` only posts to the
+pygame queue, so it is safe from any thread. MainApp hands every event it takes
+from the queue to ``EventBus.dispatch``, which calls the subscribed handlers on
+the main thread, between frames. The end of a song comes from SDL_mixer itself
+through ``pygame.mixer.music.set_endevent(TRACK_ENDED)``.
+
+Events and their attributes:
+    TRACK_ENDED: none; pygame.mixer.music stopped, because the song ended or stop() was called.
+    ALARM_FIRED: alarm_time (str, "HH:MM").
+    ALARM_SNOOZED: alarm_time (str).
+    ALARM_ENDED: alarm_time (str); the alarm's minute passed without a snooze.
+    MINUTE_STARTED: minute (str, "HH:MM").
+    DAY_ROLLED_OVER: date and previous (str, "YYYY-MM-DD").
+    STATS_UPDATED: stats (bool, channel numbers changed) and videos (bool, video list synced).
+"""
+
+import threading
+
+import pygame
+
+import clock
+import metrics
+from clock import strftime
+
+TRACK_ENDED = pygame.event.custom_type()
+ALARM_FIRED = pygame.event.custom_type()
+ALARM_SNOOZED = pygame.event.custom_type()
+ALARM_ENDED = pygame.event.custom_type()
+MINUTE_STARTED = pygame.event.custom_type()
+DAY_ROLLED_OVER = pygame.event.custom_type()
+STATS_UPDATED = pygame.event.custom_type()
+
+EVENT_NAMES = {
+    TRACK_ENDED: "track_ended",
+    ALARM_FIRED: "alarm_fired",
+    ALARM_SNOOZED: "alarm_snoozed",
+    ALARM_ENDED: "alarm_ended",
+    MINUTE_STARTED: "minute_started",
+    DAY_ROLLED_OVER: "day_rolled_over",
+    STATS_UPDATED: "stats_updated",
+}
+
+
+def publish(event_type, **attributes):
+    """
+    Posts a bus event into the pygame event queue; pygame.event.post is thread safe.
+
+    Args:
+        event_type (int): One of the event types in EVENT_NAMES.
+        **attributes: The event's attributes.
+    """
+    if event_type not in EVENT_NAMES:
+        raise ValueError(f"unknown bus event {event_type}")
+    pygame.event.post(pygame.event.Event(event_type, attributes))
+
+
+class EventBus:
+    """
+    Calls the handlers subscribed to a bus event when the main loop dispatches it.
+
+    Tablets subscribe from the boot pipeline's worker threads while the main
+    thread dispatches, so subscribing swaps in a new tuple of handlers under a
+    lock and dispatching reads the current one without taking it.
+
+    Attributes:
+        handlers (dict): Tuple of handlers by event type.
+        dispatched (dict): Events dispatched by event type, exported as the events_total metric.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.lock = threading.Lock()
+        self.dispatched = {event_type: metrics.EVENTS.labels(name) for event_type, name in EVENT_NAMES.items()}
+
+    def subscribe(self, event_type, handler):
+        """
+        Calls a handler with every event of a type from now on.
+
+        Args:
+            event_type (int): One of the event types in EVENT_NAMES.
+            handler: Callable taking the pygame event.
+        """
+        if event_type not in EVENT_NAMES:
+            raise ValueError(f"unknown bus event {event_type}")
+        with self.lock:
+            self.handlers[event_type] = self.handlers.get(event_type, ()) + (handler,)
+
+    def unsubscribe(self, event_type, handler):
+        """Stops calling a handler that was subscribed to an event type."""
+        with self.lock:
+            self.handlers[event_type] = tuple(h for h in self.handlers.get(event_type, ()) if h != handler)
+
+    def dispatch(self, event):
+        """
+        Calls the handlers of a bus event.
+
+        Args:
+            event (pygame.event.Event): An event taken from the queue.
+
+        Returns:
+            bool: True if it was a bus event, which needs no further handling.
+        """
+        if event.type not in EVENT_NAMES:
+            return False
+        self.dispatched[event.type].inc()
+        for handler in self.handlers.get(event.type, ()):
+            handler(event)
+        return True
+
+
+class ClockEvents:
+    """
+    Publishes MINUTE_STARTED and DAY_ROLLED_OVER from the app clock.
+
+    ``update`` is called once per pass of the main loop and compares the time
+    with the next minute boundary, so nothing else needs to watch the clock.
+
+    Attributes:
+        next_minute (float): Wall time of the next minute boundary.
+        day (str): The current day, "YYYY-MM-DD".
+    """
+
+    def __init__(self):
+        self.next_minute = (clock.time() // 60 + 1) * 60
+        self.day = strftime("%Y-%m-%d")
+
+    def update(self):
+        """
+        Publishes the events due since the last call; a jump of several minutes publishes one of each.
+
+        Returns:
+            bool: True if a new minute started.
+        """
+        now = clock.time()
+        if now < self.next_minute:
+            return False
+        self.next_minute = (now // 60 + 1) * 60
+        publish(MINUTE_STARTED, minute=strftime("%H:%M"))
+        day = strftime("%Y-%m-%d")
+        if day != self.day:
+            publish(DAY_ROLLED_OVER, date=day, previous=self.day)
+            self.day = day
+        return True
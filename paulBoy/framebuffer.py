@@ -0,0 +1,169 @@
+import mmap
+import os
+import stat
+
+import numpy as np
+import pygame
+
+import palette
+
+
+class FramebufferOutput:
+    """
+    Writes finished frames straight to a Linux framebuffer device as RGB565.
+
+    The target is memory-mapped, so a frame is converted with NumPy and copied
+    into the mapping without any intermediate buffers or system calls. Only the
+    rows that changed since the previous frame are written, which keeps the
+    cost close to zero for the mostly static Pip-Boy screens. Any regular file
+    path works as well, which makes the output testable without hardware.
+
+    Attributes:
+        path (str): Framebuffer device (e.g. /dev/fb1) or file path.
+        width (int): Width of the frames in pixels.
+        height (int): Height of the frames in pixels.
+        stride (int): Length of one row in the target in bytes.
+        lut (numpy.ndarray): RGB565 value for every palette index, used for 8-bit screens.
+        theme (str): Colour theme used to resolve 8-bit screens.
+        brightness (float): Multiplier applied to every frame, 0.0 - 1.0.
+        frames_written (int): Number of frames pushed so far.
+        rows_written (int): Number of rows written to the target for the last frame.
+    """
+
+    def __init__(self, path, resolution=(480, 320), stride=None, theme=palette.DEFAULT_THEME):
+        """
+        Opens and maps the output target.
+
+        Args:
+            path (str): Framebuffer device or file path.
+            resolution (tuple): Size of the frames that will be written.
+            stride (int): Row length of the target in bytes, detected from sysfs for devices.
+            theme (str): Colour theme used to resolve 8-bit screens.
+        """
+        self.path = path
+        self.width, self.height = resolution
+        self.stride = stride or self.detect_stride() or self.width * 2
+        if self.stride < self.width * 2:
+            raise ValueError(f"stride {self.stride} is too small for {self.width} RGB565 pixels")
+
+        size = self.stride * self.height
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if stat.S_ISREG(os.fstat(self.fd).st_mode) and os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.mmap = mmap.mmap(self.fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        rows = np.ndarray((self.height, self.stride // 2), dtype="<u2", buffer=self.mmap)
+        self.frame = rows[:, :self.width]
+        self.previous = None
+        self.lut = None
+        self.brightness = 1.0
+        self.set_theme(theme)
+
+        self.frames_written = 0
+        self.rows_written = 0
+
+    def detect_stride(self):
+        """
+        Reads the row length of a framebuffer device from sysfs.
+
+        Returns:
+            int: The stride in bytes, or None when the path is not a framebuffer device.
+        """
+        name = os.path.basename(self.path)
+        sysfs = os.path.join("/sys/class/graphics", name)
+        if not name.startswith("fb") or not os.path.isdir(sysfs):
+            return None
+        with open(os.path.join(sysfs, "bits_per_pixel")) as file:
+            bits_per_pixel = int(file.read())
+        if bits_per_pixel != 16:
+            raise ValueError(f"{self.path} is {bits_per_pixel} bpp, only RGB565 panels are supported")
+        with open(os.path.join(sysfs, "stride")) as file:
+            return int(file.read())
+
+    def set_theme(self, theme, brightness=None):
+        """
+        Rebuilds the palette lookup table used for 8-bit screens.
+
+        Args:
+            theme (str): One of the names in palette.THEMES.
+            brightness (float): Multiplier applied to the palette, keeps the current level by default.
+        """
+        if brightness is not None:
+            self.brightness = brightness
+        self.theme = theme
+        entries = np.array(palette.theme_palette(theme, self.brightness), dtype=np.uint16)
+        self.lut = self.pack_rgb565(entries[:, 0], entries[:, 1], entries[:, 2])
+        # The next frame has to be written in full with the new colours
+        self.previous = None
+
+    def set_brightness(self, level):
+        """
+        Scales every following frame, used to dim or blank the panel when idle.
+
+        Args:
+            level (float): 0.0 (black) to 1.0 (full brightness).
+        """
+        self.set_theme(self.theme, level)
+
+    @staticmethod
+    def pack_rgb565(red, green, blue):
+        """Packs 8-bit colour channel arrays into RGB565 values."""
+        red, green, blue = (channel.astype(np.uint16) for channel in (red, green, blue))
+        return ((red >> 3) << 11) | ((green >> 2) << 5) | (blue >> 3)
+
+    def to_rgb565(self, surface):
+        """
+        Converts a surface into a (height, width) array of RGB565 values.
+
+        Args:
+            surface (pygame.Surface): The finished frame.
+        """
+        if surface.get_bitsize() == 8:
+            indices = pygame.surfarray.pixels2d(surface)
+            converted = self.lut[indices.T]
+            del indices  # releases the surface lock
+            return converted
+        try:
+            pixels = pygame.surfarray.pixels3d(surface)
+        except ValueError:
+            # Unusual channel layouts cannot be referenced in place
+            pixels = pygame.surfarray.array3d(surface)
+        if self.brightness < 1.0:
+            pixels = (pixels * self.brightness).astype(np.uint8)
+        converted = self.pack_rgb565(pixels[:, :, 0], pixels[:, :, 1], pixels[:, :, 2]).T
+        del pixels
+        return converted
+
+    def write(self, surface):
+        """
+        Pushes a frame, writing only the rows that differ from the previous one.
+
+        Args:
+            surface (pygame.Surface): The finished frame.
+
+        Returns:
+            int: The number of rows written.
+        """
+        converted = self.to_rgb565(surface)
+        if self.previous is None:
+            self.frame[:] = converted
+            self.rows_written = self.height
+        else:
+            changed = np.flatnonzero((converted != self.previous).any(axis=1))
+            if changed.size:
+                self.frame[changed] = converted[changed]
+            self.rows_written = int(changed.size)
+        self.previous = converted
+        self.frames_written += 1
+        return self.rows_written
+
+    def clear(self):
+        """Blanks the output."""
+        self.frame[:] = 0
+        self.previous = None
+
+    def close(self):
+        """Unmaps and closes the output target."""
+        self.frame = None
+        self.mmap.close()
+        os.close(self.fd)
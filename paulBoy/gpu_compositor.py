@@ -0,0 +1,315 @@
+import struct
+
+import moderngl
+import numpy as np
+import pygame
+
+from crt_shader import resource_path
+from draw_list import DrawList
+
+GLYPHS = 0
+SPRITES = 1
+# x, y, width, height, u, v, u width, v height, r, g, b, a, page
+INSTANCE_FLOATS = 13
+WHITE = (1.0, 1.0, 1.0, 1.0)
+
+
+class AtlasFull(Exception):
+    """
+    Raised when an atlas has no room left for a new entry.
+
+    Attributes:
+        atlas (Atlas): The atlas that is full.
+    """
+
+    def __init__(self, atlas, message):
+        super().__init__(message)
+        self.atlas = atlas
+
+
+class Atlas:
+    """
+    A texture that many small images are packed into, row by row.
+
+    Entries are uploaded once, into their own part of the texture, and then
+    referenced by their rect. The shelf packer never frees single entries;
+    ``reset`` empties the whole atlas instead.
+
+    Attributes:
+        texture (moderngl.Texture): The atlas texture, sampled without filtering.
+        size (tuple): Width and height in pixels.
+        components (int): 1 for coverage only (glyphs), 4 for RGBA (sprites).
+        regions (dict): (x, y, width, height) of every entry by key.
+        padding (int): Empty pixels kept around every entry.
+    """
+
+    def __init__(self, ctx, size, components, padding=1):
+        self.texture = ctx.texture(size, components)
+        self.texture.filter = (moderngl.NEAREST, moderngl.NEAREST)
+        self.size = size
+        self.components = components
+        self.padding = padding
+        self.regions = {}
+        self.reset()
+
+    def reset(self):
+        """Forgets every entry; their pixels are overwritten as new entries arrive."""
+        self.regions.clear()
+        self.x = self.y = 0
+        self.shelf_height = 0
+
+    def add(self, key, data, size):
+        """
+        Packs an image into the atlas.
+
+        Args:
+            key: Hashable name of the entry.
+            data (bytes): Pixels, top row first, ``components`` bytes per pixel.
+            size (tuple): Width and height of the image.
+
+        Returns:
+            tuple: The (x, y, width, height) the image was placed at.
+
+        Raises:
+            AtlasFull: If there is no room left.
+        """
+        width, height = size
+        atlas_width, atlas_height = self.size
+        if self.x + width + self.padding > atlas_width:
+            self.x = 0
+            self.y += self.shelf_height
+            self.shelf_height = 0
+        if width + self.padding > atlas_width or self.y + height + self.padding > atlas_height:
+            raise AtlasFull(self, f"no room for a {width}x{height} image in the {atlas_width}x{atlas_height} atlas")
+        region = (self.x, self.y, width, height)
+        if width and height:
+            self.texture.write(data, viewport=region)
+        self.regions[key] = region
+        self.x += width + self.padding
+        self.shelf_height = max(self.shelf_height, height + self.padding)
+        return region
+
+
+def rgba_bytes(surface):
+    """Returns a surface's pixels as RGBA bytes; colour-keyed pixels become transparent."""
+    if surface.get_flags() & pygame.SRCALPHA:
+        return pygame.image.tobytes(surface, "RGBA")
+    converted = pygame.Surface(surface.get_size(), pygame.SRCALPHA, 32)
+    converted.blit(surface, (0, 0))  # an opaque source ends up with alpha 255, its colour key with 0
+    return pygame.image.tobytes(converted, "RGBA")
+
+
+class GpuDrawList(DrawList):
+    """
+    A draw list that draws on the GPU instead of blitting onto the screen surface.
+
+    Text is split into glyphs that are rendered once per font and character into
+    a coverage-only glyph atlas and coloured by the shader. Every other surface
+    (icons, waveform dots, lists, buttons) is packed into an RGBA sprite atlas
+    the first time it is drawn, and rectangles need no texture at all. A frame
+    is then one instanced draw of textured quads into an offscreen target,
+    whose texture the CRT pass samples directly, so the screen surface is
+    neither drawn nor uploaded. Only the small per-instance buffer goes to the
+    GPU every frame.
+
+    Surfaces are recognised by identity, so a surface must not be changed after
+    it has been drawn; the widgets already render a new surface whenever their
+    content changes. When an atlas fills up it is emptied and refilled with
+    whatever the current frame draws; emptying the glyph atlas also drops the
+    cached string layouts, which point into it.
+
+    Attributes:
+        ctx (moderngl.Context): The context shared with the CRT pass.
+        glyphs (Atlas): Coverage of every glyph drawn so far, by (font, character).
+        layouts (dict): Instances of every recently drawn string at the origin, by (font, text, colour).
+        sprites_atlas (Atlas): Every surface drawn recently, by id(surface).
+        texture (moderngl.Texture): The composited frame, the same size as the target surface.
+        instances (numpy.ndarray): Instance data of the last flushed frame.
+    """
+
+    GLYPH_ATLAS_SIZE = (2048, 1024)
+    SPRITE_ATLAS_SIZE = (1024, 1024)
+
+    def __init__(self, target, ctx, cache_size=DrawList.CACHE_SIZE):
+        super().__init__(target, cache_size)
+        self.ctx = ctx
+        self.glyphs = Atlas(ctx, self.GLYPH_ATLAS_SIZE, 1)
+        self.sprites_atlas = Atlas(ctx, self.SPRITE_ATLAS_SIZE, 4)
+        # Surfaces stay referenced while packed, so their ids cannot be reused by new surfaces
+        self.packed = {}
+        self.layouts = {}
+        self.lookups[id(self.layouts)] = self.lookups[id(self.text_cache)]
+        self.white = self.pack_white()
+
+        size = target.get_size()
+        self.texture = ctx.texture(size, 3)
+        self.texture.repeat_x = False
+        self.texture.repeat_y = False
+        self.fbo = ctx.framebuffer(color_attachments=[self.texture])
+
+        self.prog = ctx.program(
+            vertex_shader=open(resource_path("shaders/QUAD_VERTEX_SHADER.glsl")).read(),
+            fragment_shader=open(resource_path("shaders/QUAD_FRAGMENT_SHADER.glsl")).read(),
+        )
+        self.prog['target_size'] = size
+        self.prog['Glyphs'] = 0
+        self.prog['Sprites'] = 1
+        self.corners = ctx.buffer(struct.pack('8f', 0, 0, 1, 0, 0, 1, 1, 1))
+        self.instance_buffer = None
+        self.vao = None
+        self.instances = np.zeros((0, INSTANCE_FLOATS), dtype="f4")
+
+    def pack_white(self):
+        """Packs the white texel that untextured rectangles sample, in the middle of a 3x3 block."""
+        x, y, _, _ = self.sprites_atlas.add("white", b"\xff" * 36, (3, 3))
+        width, height = self.SPRITE_ATLAS_SIZE
+        return ((x + 1.5) / width, (y + 1.5) / height, 0.0, 0.0)
+
+    def ensure_capacity(self, count):
+        """Grows the instance buffer, and rebuilds the vertex array, when a frame needs more room."""
+        size = count * INSTANCE_FLOATS * 4
+        if self.instance_buffer is not None and self.instance_buffer.size >= size:
+            return
+        if self.instance_buffer is not None:
+            self.vao.release()
+            self.instance_buffer.release()
+        self.instance_buffer = self.ctx.buffer(reserve=max(size * 2, 4096), dynamic=True)
+        self.vao = self.ctx.vertex_array(self.prog, [
+            (self.corners, '2f', 'corner'),
+            (self.instance_buffer, '4f 4f 4f 1f/i', 'rect', 'source', 'tint', 'page'),
+        ])
+
+    def blit(self, surface, dest, area=None):
+        self.commands.append(("surface", surface, dest, area))
+        self.stats.commands += 1
+
+    def text(self, font, text, color, dest):
+        self.commands.append(("text", font, text, color, dest))
+        self.stats.commands += 1
+
+    def rect(self, color, rect):
+        x, y, width, height = rect
+        if width > 0 and height > 0:
+            self.commands.append(("rect", color, (x, y, width, height)))
+            self.stats.commands += 1
+
+    def chrome(self, key, color, rects):
+        for rect in rects:
+            self.rect(color, rect)
+
+    def glyph_rows(self, font, text, color):
+        """
+        Builds the instances of a string at the origin, from glyphs in the atlas.
+
+        Glyphs are placed at the width pygame gives the text before them, so the
+        spacing, including kerning, matches a string rendered in one piece.
+        """
+        tint = tuple(channel / 255 for channel in color[:3]) + ((color[3] if len(color) > 3 else 255) / 255,)
+        width, height = self.GLYPH_ATLAS_SIZE
+        rows = []
+        for index, character in enumerate(text):
+            if character.isspace():
+                continue
+            key = (font, character)
+            region = self.glyphs.regions.get(key)
+            if region is None:
+                glyph = font.render(character, True, (255, 255, 255))
+                region = self.glyphs.add(key, rgba_bytes(glyph)[3::4], glyph.get_size())
+                self.stats.renders += 1
+            gx, gy, gw, gh = region
+            rows.append((font.size(text[:index])[0], 0, gw, gh,
+                         gx / width, gy / height, gw / width, gh / height) + tint + (GLYPHS,))
+        return np.array(rows, dtype="f4").reshape(-1, INSTANCE_FLOATS)
+
+    def sprite_region(self, surface):
+        """Returns the atlas rect of a surface, packing it on first use."""
+        region = self.sprites_atlas.regions.get(id(surface))
+        if region is None:
+            region = self.sprites_atlas.add(id(surface), rgba_bytes(surface), surface.get_size())
+            self.packed[id(surface)] = surface
+            self.stats.renders += 1
+        return region
+
+    def build_instances(self):
+        """Turns the queued commands into instance data, packing new glyphs and surfaces as needed."""
+        width, height = self.SPRITE_ATLAS_SIZE
+        parts = []
+        simple = []
+        for command in self.commands:
+            kind = command[0]
+            if kind == "text":
+                _, font, text, color, (x, y) = command
+                rows = self.cached(self.layouts, (font, text, color), lambda: self.glyph_rows(font, text, color))
+                if len(rows):
+                    if simple:
+                        parts.append(np.array(simple, dtype="f4"))
+                        simple = []
+                    placed = rows.copy()
+                    placed[:, 0] += x
+                    placed[:, 1] += y
+                    parts.append(placed)
+            elif kind == "rect":
+                _, color, (x, y, w, h) = command
+                alpha = color[3] if len(color) > 3 else 255
+                simple.append((x, y, w, h) + self.white + (color[0] / 255, color[1] / 255, color[2] / 255,
+                                                          alpha / 255, SPRITES))
+            else:
+                _, surface, dest, area = command
+                sx, sy, sw, sh = self.sprite_region(surface)
+                x, y = dest[0], dest[1]
+                if area is not None:
+                    ax, ay, aw, ah = pygame.Rect(area).clip(surface.get_rect())
+                    sx, sy, sw, sh = sx + ax, sy + ay, aw, ah
+                simple.append((x, y, sw, sh, sx / width, sy / height, sw / width, sh / height) + WHITE + (SPRITES,))
+        if simple:
+            parts.append(np.array(simple, dtype="f4"))
+        return np.concatenate(parts) if parts else np.zeros((0, INSTANCE_FLOATS), dtype="f4")
+
+    def reset_atlas(self, atlas):
+        """Empties the glyph or sprite atlas, together with everything that points into it."""
+        atlas.reset()
+        if atlas is self.glyphs:
+            self.layouts.clear()
+        else:
+            self.packed.clear()
+            self.white = self.pack_white()
+
+    def flush(self):
+        """Draws the queued commands into the offscreen target as one instanced batch."""
+        if not self.commands:
+            return
+        try:
+            emptied = set()
+            while True:
+                try:
+                    instances = self.build_instances()
+                    break
+                except AtlasFull as full:
+                    if full.atlas in emptied:
+                        raise  # this frame alone does not fit
+                    # Start the full atlas over with only what this frame draws
+                    emptied.add(full.atlas)
+                    self.reset_atlas(full.atlas)
+        finally:
+            self.commands.clear()
+        self.instances = instances
+
+        self.ensure_capacity(len(instances))
+        self.instance_buffer.write(instances.tobytes())
+        self.fbo.use()
+        self.ctx.enable(moderngl.BLEND)
+        self.ctx.blend_func = moderngl.SRC_ALPHA, moderngl.ONE_MINUS_SRC_ALPHA
+        self.glyphs.texture.use(location=0)
+        self.sprites_atlas.texture.use(location=1)
+        self.vao.render(moderngl.TRIANGLE_STRIP, vertices=4, instances=len(instances))
+        self.ctx.disable(moderngl.BLEND)
+        self.stats.batches += 1
+
+    def read_into(self, surface):
+        """
+        Copies the composited frame back into a surface, for consumers that need pixels on the CPU.
+
+        Args:
+            surface (pygame.Surface): RGB surface of the target's size, e.g. the screen for the mirror.
+        """
+        surface.blit(pygame.image.frombytes(self.fbo.read(components=3), self.texture.size, "RGB"), (0, 0))
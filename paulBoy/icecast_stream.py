@@ -0,0 +1,582 @@
+"""
+Internet radio: plays HTTP and Icecast MP3 streams through a reserved mixer channel.
+
+A fetch thread reads the stream into a bounded ring buffer, strips the ICY
+now-playing metadata out of it and reconnects with a growing delay whenever
+the connection drops. A decode thread waits until the buffer holds a few
+seconds of audio, then cuts it into chunks on MP3 frame boundaries and decodes
+every chunk into a pygame Sound. Each chunk is decoded together with the last
+frames of the one before it, and their samples are cut off again, so the
+decoder starts warm and chunks join without a gap. The main loop only moves decoded chunks onto
+the channel's queue, through AudioBus.update, which never blocks.
+
+``python icecast_stream.py serve FILE...`` runs a small local server that loops
+MP3 files at their own bit rate with ICY metadata, for trying it out, and
+``python icecast_stream.py listen URL`` plays a stream and prints its state.
+"""
+
+import argparse
+import http.client
+import io
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pygame
+
+import metrics
+from music_index import Track
+
+BUFFER_SIZE = 256 * 1024
+PREBUFFER = 64 * 1024  # about 4 seconds at 128 kbit/s
+CHUNK_SIZE = 32 * 1024  # about 2 seconds at 128 kbit/s, decoded in a few milliseconds
+DECODED_CHUNKS = 2
+# Bytes of audio data a layer III frame may take from the frames before it (the bit reservoir)
+MAX_RESERVOIR = 511
+MAX_RECONNECT_DELAY = 30.0
+STREAM_TITLE = re.compile(rb"StreamTitle='(.*?)';", re.S)
+
+# kbit/s by bit rate index, for MPEG-1 and for MPEG-2/2.5 layer III
+BITRATES = {1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+            2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)}
+# Hz by MPEG version bits and sample rate index
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def is_stream(path):
+    """Returns True for playlist entries that are stream URLs rather than files."""
+    return path.startswith(("http://", "https://"))
+
+
+def read_stations(path):
+    """
+    Reads internet radio stations from an M3U playlist.
+
+    ``#EXTINF:-1,Name`` lines name the URL that follows them; unnamed stations are called by their URL.
+
+    Args:
+        path (str): The playlist file.
+
+    Returns:
+        list: A Track per station, with the URL as path; empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return []
+    stations = []
+    name = None
+    with open(path, encoding="utf-8", errors="replace") as playlist:
+        for line in playlist:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                name = line.partition(",")[2].strip() or None
+            elif line and not line.startswith("#"):
+                if is_stream(line):
+                    stations.append(Track(line, name or line, "Internet radio"))
+                name = None
+    return stations
+
+
+def frame_header(data, offset):
+    """
+    Reads the MPEG audio layer III frame header at an offset.
+
+    Returns:
+        tuple: (frame length in bytes, bit rate in bit/s, samples per channel, sample rate in Hz),
+            or None if there is no valid header.
+    """
+    if offset + 4 > len(data):
+        return None
+    first, second, third = data[offset], data[offset + 1], data[offset + 2]
+    if first != 0xFF or second & 0xE0 != 0xE0:
+        return None
+    version = (second >> 3) & 3
+    layer = (second >> 1) & 3
+    bitrate_index = third >> 4
+    rate_index = (third >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    rate = SAMPLE_RATES[version][rate_index]
+    padding = (third >> 1) & 1
+    if version == 3:
+        return 144 * bitrate // rate + padding, bitrate, 1152, rate
+    return 72 * bitrate // rate + padding, bitrate, 576, rate
+
+
+def find_frame(data, start=0):
+    """
+    Finds the first frame header that is followed by another one, so sync words inside audio data are skipped.
+
+    Returns:
+        int: Offset of the frame, or -1 if none was found.
+    """
+    offset = data.find(b"\xff", start)
+    while offset != -1:
+        header = frame_header(data, offset)
+        if header and frame_header(data, offset + header[0]):
+            return offset
+        offset = data.find(b"\xff", offset + 1)
+    return -1
+
+
+def split_frames(data):
+    """
+    Cuts a run of stream bytes at MP3 frame boundaries.
+
+    Returns:
+        tuple: (whole frames, bytes after them that may be the start of the next frame).
+    """
+    start = find_frame(data)
+    if start == -1:
+        return b"", bytes(data[-4:])
+    end = start
+    while True:
+        header = frame_header(data, end)
+        if header is None or end + header[0] > len(data):
+            break
+        end += header[0]
+    return bytes(data[start:end]), bytes(data[end:])
+
+
+def overlap_frames(frames):
+    """
+    Takes the last frames of a chunk that the decoder needs to decode the next chunk exactly.
+
+    A decoder that starts on a chunk of its own has neither the bit reservoir
+    nor the overlap of the frames before it, so its first ~50 ms come out
+    silent or wrong. Decoding the next chunk behind these frames and cutting
+    their samples off again gives the same audio as one continuous decode.
+
+    Args:
+        frames (bytes): Whole frames, as returned by split_frames.
+
+    Returns:
+        tuple: (the frames, seconds of audio they decode to).
+    """
+    headers = []
+    offset = 0
+    while True:
+        header = frame_header(frames, offset)
+        if header is None or offset + header[0] > len(frames):
+            break
+        headers.append((offset, header))
+        offset += header[0]
+    start = len(frames)
+    seconds = 0.0
+    for count, (offset, header) in enumerate(reversed(headers), 1):
+        start = offset
+        seconds += header[2] / header[3]
+        # The frame after the first one kept must find its whole reservoir in front of it
+        if count >= 2 and len(frames) - offset - header[0] >= MAX_RESERVOIR:
+            break
+    return frames[start:], seconds
+
+
+def decode_frames(frames, skip=0.0):
+    """
+    Decodes whole MP3 frames into a Sound.
+
+    Args:
+        frames (bytes): Whole frames.
+        skip (float): Seconds cut off the start, the length of the overlap frames in front.
+
+    Returns:
+        pygame.mixer.Sound: The decoded audio, at the mixer's format.
+    """
+    sound = pygame.mixer.Sound(file=io.BytesIO(frames))
+    if not skip:
+        return sound
+    frequency, size, channels = pygame.mixer.get_init()
+    skip_bytes = round(skip * frequency) * channels * (abs(size) // 8)
+    return pygame.mixer.Sound(buffer=sound.get_raw()[skip_bytes:])
+
+
+class RingBuffer:
+    """
+    A bounded byte buffer between one writer thread and one reader thread.
+
+    The writer blocks while the buffer is full, which in turn lets TCP slow the
+    server down; the reader never blocks unless it asks to wait.
+
+    Attributes:
+        capacity (int): Most bytes held.
+        size (int): Bytes held now.
+    """
+
+    def __init__(self, capacity=BUFFER_SIZE):
+        self.capacity = capacity
+        self.data = bytearray(capacity)
+        self.start = 0
+        self.size = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    @property
+    def fill(self):
+        """How full the buffer is, 0.0 - 1.0."""
+        return self.size / self.capacity
+
+    def write(self, data):
+        """
+        Appends bytes, waiting for room as needed.
+
+        Returns:
+            bool: False if the buffer was closed before everything was written.
+        """
+        view = memoryview(data)
+        while view:
+            with self.condition:
+                self.condition.wait_for(lambda: self.size < self.capacity or self.closed)
+                if self.closed:
+                    return False
+                end = (self.start + self.size) % self.capacity
+                count = min(len(view), self.capacity - self.size, self.capacity - end)
+                self.data[end:end + count] = view[:count]
+                self.size += count
+                self.condition.notify_all()
+            view = view[count:]
+        return True
+
+    def read(self, count):
+        """Takes up to count bytes without waiting."""
+        with self.condition:
+            count = min(count, self.size)
+            first = min(count, self.capacity - self.start)
+            data = bytes(self.data[self.start:self.start + first]) + bytes(self.data[:count - first])
+            self.start = (self.start + count) % self.capacity
+            self.size -= count
+            self.condition.notify_all()
+            return data
+
+    def wait_for(self, count, timeout):
+        """
+        Waits until at least count bytes are held.
+
+        Returns:
+            bool: True if they are.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.size >= min(count, self.capacity) or self.closed, timeout)
+
+    def close(self):
+        """Wakes and stops both sides."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class StreamPlayer:
+    """
+    Plays one MP3 stream on a mixer channel.
+
+    Attributes:
+        url (str): The stream.
+        channel (pygame.mixer.Channel): Channel the decoded chunks are queued on.
+        buffer (RingBuffer): Stream bytes that are fetched but not yet decoded.
+        sounds (queue.Queue): Decoded chunks waiting for the channel.
+        station (str): The server's icy-name, if it sent one.
+        now_playing (str): The latest ICY StreamTitle, empty until one arrives.
+        connected (bool): True while the fetch thread has an open connection.
+        error (str): Why the last connection ended, empty if none failed.
+        reconnects (int): Connections opened after the first one.
+        underruns (int): Times the channel ran dry while the stream was playing.
+        decode_errors (int): Chunks the decoder could not read.
+    """
+
+    def __init__(self, url, channel, prebuffer=PREBUFFER, buffer_size=BUFFER_SIZE, chunk_size=CHUNK_SIZE,
+                 timeout=10.0):
+        """
+        Starts fetching and decoding straight away; playback starts once the prebuffer is full.
+
+        Args:
+            url (str): HTTP or HTTPS URL of an MP3 stream.
+            channel (pygame.mixer.Channel): A channel nothing else plays on.
+            prebuffer (int): Bytes buffered before playback starts, and again after an underrun.
+            buffer_size (int): Capacity of the ring buffer in bytes.
+            chunk_size (int): Bytes decoded into one Sound.
+            timeout (float): Seconds a connection may stall before it is dropped and reopened.
+        """
+        self.url = url
+        self.channel = channel
+        self.prebuffer = prebuffer
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.buffer = RingBuffer(buffer_size)
+        self.sounds = queue.Queue(DECODED_CHUNKS)
+        self.station = ""
+        self.now_playing = ""
+        self.connected = False
+        self.error = ""
+        self.reconnects = 0
+        self.underruns = 0
+        self.decode_errors = 0
+        self.started = False
+        self.starved = False
+        self.rebuffer = True
+        self.running = True
+        self.stop_event = threading.Event()
+        self.fetch_thread = threading.Thread(target=self.fetch_loop, name="stream-fetch", daemon=True)
+        self.decode_thread = threading.Thread(target=self.decode_loop, name="stream-decode", daemon=True)
+        self.fetch_thread.start()
+        self.decode_thread.start()
+
+    @property
+    def buffer_fill(self):
+        """How full the ring buffer is, 0.0 - 1.0."""
+        return self.buffer.fill
+
+    @property
+    def title(self):
+        """What to show as playing: the ICY title, the station name or the URL."""
+        return self.now_playing or self.station or self.url
+
+    def fetch_loop(self):
+        """Keeps a connection to the stream open, reconnecting with a growing delay, until stopped."""
+        delay = 1.0
+        first = True
+        while self.running:
+            if not first:
+                self.reconnects += 1
+                metrics.STREAM_RECONNECTS.inc()
+            first = False
+            request = urllib.request.Request(self.url, headers={"Icy-MetaData": "1", "User-Agent": "PAUL-BOY"})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    self.connected = True
+                    self.error = ""
+                    self.station = response.headers.get("icy-name", self.station)
+                    metaint = int(response.headers.get("icy-metaint") or 0)
+                    if self.read_stream(response, metaint):
+                        delay = 1.0  # the connection delivered audio; retry quickly
+                    self.error = self.error or "stream ended"
+            except (OSError, http.client.HTTPException, ValueError) as error:
+                self.error = str(error) or type(error).__name__
+            self.connected = False
+            if self.stop_event.wait(delay):
+                return
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def read_stream(self, response, metaint):
+        """
+        Moves audio from an open response into the buffer, taking out the metadata every metaint bytes.
+
+        Returns:
+            bool: True if any audio arrived.
+        """
+        received = False
+        while self.running:
+            audio = response.read(metaint or 8192)
+            if not audio:
+                return received
+            received = True
+            if not self.buffer.write(audio):
+                return received
+            if metaint:
+                if len(audio) < metaint:
+                    return received
+                length = response.read(1)
+                if not length:
+                    return received
+                if length[0]:
+                    self.read_metadata(response.read(length[0] * 16))
+        return received
+
+    def read_metadata(self, block):
+        """Takes the now-playing title out of an ICY metadata block."""
+        match = STREAM_TITLE.search(block)
+        if match:
+            raw = match.group(1)
+            try:
+                self.now_playing = raw.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                self.now_playing = raw.decode("latin-1").strip()
+
+    def decode_loop(self):
+        """Decodes buffered audio into chunks for the channel, prebuffering first and after underruns."""
+        pending = b""
+        overlap, skip = b"", 0.0
+        while self.running:
+            if self.rebuffer:
+                if not self.buffer.wait_for(self.prebuffer, 0.25):
+                    continue
+                self.rebuffer = False
+            if not self.buffer.wait_for(self.chunk_size, 0.25):
+                continue
+            frames, pending = split_frames(pending + self.buffer.read(self.chunk_size))
+            if not frames:
+                continue
+            try:
+                sound = decode_frames(overlap + frames, skip)
+            except pygame.error:
+                self.decode_errors += 1
+                overlap, skip = b"", 0.0
+                continue
+            overlap, skip = overlap_frames(frames)
+            while self.running:
+                try:
+                    self.sounds.put(sound, timeout=0.25)
+                    break
+                except queue.Full:
+                    pass
+
+    def update(self):
+        """
+        Keeps the channel fed; call on every pass of the main loop, whichever tab is shown.
+
+        Only hands over chunks that are already decoded, so it never waits.
+        """
+        if self.channel.get_queue() is None:
+            try:
+                sound = self.sounds.get_nowait()
+            except queue.Empty:
+                sound = None
+            if sound is not None:
+                if self.channel.get_busy():
+                    self.channel.queue(sound)
+                else:
+                    self.channel.play(sound)
+                self.started = True
+                self.starved = False
+            elif self.started and not self.starved and not self.channel.get_busy():
+                # Ran dry: count it once and fill the prebuffer again before carrying on
+                self.underruns += 1
+                metrics.STREAM_UNDERRUNS.inc()
+                self.starved = True
+                self.rebuffer = True
+        metrics.STREAM_BUFFER_FILL.set(round(self.buffer.fill, 3))
+
+    def stop(self):
+        """Stops playback and both threads."""
+        self.running = False
+        self.stop_event.set()
+        self.buffer.close()
+        self.channel.stop()
+        self.decode_thread.join(1.0)
+        metrics.STREAM_BUFFER_FILL.set(0)
+
+
+class LoopingStreamHandler(BaseHTTPRequestHandler):
+    """Sends the server's files one after another, forever, at their own bit rate."""
+
+    def do_GET(self):
+        server = self.server
+        metaint = server.metaint if self.headers.get("Icy-MetaData") == "1" else 0
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("icy-name", server.name)
+        if metaint:
+            self.send_header("icy-metaint", str(metaint))
+        self.end_headers()
+
+        until_metadata = metaint
+        burst = server.burst
+        try:
+            while True:
+                for path, title, data, bitrate in server.tracks:
+                    metadata = server.metadata_block(title)
+                    sent_at = time.monotonic()
+                    sent = 0
+                    for offset in range(0, len(data), 4096):
+                        piece = data[offset:offset + 4096]
+                        while metaint and len(piece) >= until_metadata:
+                            self.wfile.write(piece[:until_metadata] + metadata)
+                            piece = piece[until_metadata:]
+                            until_metadata = metaint
+                        self.wfile.write(piece)
+                        until_metadata -= len(piece)
+                        sent += len(piece)
+                        # Stay in real time, after sending the first seconds as fast as a real server would
+                        ahead = (sent - burst) * 8 / bitrate - (time.monotonic() - sent_at)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                    burst = 0
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        """Listeners coming and going are not logged."""
+
+
+class LoopingStreamServer(ThreadingHTTPServer):
+    """
+    A stand-in for an Icecast server that loops local MP3 files, for testing streaming without the internet.
+
+    Attributes:
+        tracks (list): (path, title, frames, bit rate) of every file.
+        metaint (int): Audio bytes between ICY metadata blocks.
+        name (str): Sent as icy-name.
+        burst (int): Bytes sent ahead of real time when a listener connects.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, paths, address=("127.0.0.1", 8000), metaint=16000, name="PAUL-BOY test stream",
+                 burst=PREBUFFER):
+        super().__init__(address, LoopingStreamHandler)
+        self.metaint = metaint
+        self.name = name
+        self.burst = burst
+        self.tracks = []
+        for path in paths:
+            with open(path, "rb") as file:
+                data = file.read()
+            start = find_frame(data)
+            if start == -1:
+                raise ValueError(f"{path} is not an MP3 file")
+            title = os.path.splitext(os.path.basename(path))[0].strip()
+            self.tracks.append((path, title, data[start:], frame_header(data, start)[1]))
+
+    def metadata_block(self, title):
+        """Builds the ICY metadata block announcing a title."""
+        text = f"StreamTitle='{title}';".encode()
+        blocks = -(-len(text) // 16)
+        return bytes([blocks]) + text.ljust(blocks * 16, b"\0")
+
+    def start(self):
+        """Serves on a background thread."""
+        threading.Thread(target=self.serve_forever, name="stream-server", daemon=True).start()
+
+
+def main():
+    """Serves local files as a looping stream, or plays a stream and prints its state every second."""
+    parser = argparse.ArgumentParser(description="PAUL-BOY internet radio streaming")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="loop MP3 files as an Icecast style stream")
+    serve.add_argument("files", nargs="+", help="MP3 files to play in turn")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    serve.add_argument("--port", type=int, default=8000, help="TCP port")
+    serve.add_argument("--metaint", type=int, default=16000, help="audio bytes between metadata blocks")
+    listen = commands.add_parser("listen", help="play a stream and print buffer fill, underruns and titles")
+    listen.add_argument("url", help="http(s) URL of an MP3 stream")
+    listen.add_argument("--seconds", type=float, default=30, help="how long to play")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = LoopingStreamServer(args.files, (args.host, args.port), args.metaint)
+        print(f"streaming {len(server.tracks)} file(s) on http://{args.host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    pygame.mixer.init(44100)
+    player = StreamPlayer(args.url, pygame.mixer.Channel(0))
+    ends = time.monotonic() + args.seconds
+    last_print = 0
+    while time.monotonic() < ends:
+        player.update()
+        if time.monotonic() - last_print >= 1:
+            last_print = time.monotonic()
+            print(f"buffer {player.buffer_fill:5.1%}  underruns {player.underruns}  reconnects {player.reconnects}"
+                  f"  {'connected' if player.connected else player.error or 'connecting'}  {player.title}")
+        time.sleep(0.02)
+    player.stop()
+
+
+if __name__ == "__main__":
+    main()
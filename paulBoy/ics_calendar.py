@@ -0,0 +1,497 @@
+import calendar
+import glob
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9: TZID times are read as local times
+    ZoneInfo = None
+
+import clock
+
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+# Safety limit for rules whose DTSTART lies far before the expansion window
+MAX_CANDIDATES = 100000
+
+
+class Event:
+    """
+    One VEVENT of an .ics file.
+
+    Attributes:
+        uid (str): Unique ID; instances that were moved share it with their series.
+        summary (str): Title of the event.
+        start (datetime): Start, time zone aware when the file names a zone.
+        end (datetime): End, in the same form as start.
+        all_day (bool): True for date-only events.
+        rrule (dict): Parsed RRULE, None for single events.
+        exdates (set): Excluded start times as naive local times.
+        recurrence_id (datetime): Naive local start of the series instance this event replaces, if any.
+    """
+
+    def __init__(self, uid, summary, start, end, all_day=False, rrule=None, exdates=None, recurrence_id=None):
+        self.uid = uid
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.all_day = all_day
+        self.rrule = rrule
+        self.exdates = exdates or set()
+        self.recurrence_id = recurrence_id
+
+
+def unfold(text):
+    """Joins the folded continuation lines of an .ics file and returns the logical lines."""
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def parse_line(line):
+    """
+    Splits a content line into its name, parameters and value.
+
+    Returns:
+        tuple: (name, params, value); name and parameter names are upper case.
+    """
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+
+def parse_datetime(value, params=None):
+    """
+    Parses a DATE or DATE-TIME value.
+
+    UTC times and times with a known TZID come back time zone aware, so recurring
+    events can be expanded in their own zone; floating times and dates are naive.
+
+    Args:
+        value (str): e.g. "20261019", "20261019T090000" or "20261019T070000Z".
+        params (dict): Line parameters, for VALUE and TZID.
+
+    Returns:
+        tuple: (datetime, all_day).
+    """
+    params = params or {}
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d"), True
+    moment = datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return moment.replace(tzinfo=timezone.utc), False
+    tzid = params.get("TZID")
+    if tzid and ZoneInfo is not None:
+        try:
+            return moment.replace(tzinfo=ZoneInfo(tzid)), False
+        except (KeyError, ValueError):
+            pass  # unknown zone name, e.g. a Windows one: keep the wall time
+    return moment, False
+
+
+def to_local(moment):
+    """Converts a parsed time into a naive local time; naive times are already local."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+def parse_duration(value):
+    """Parses an iCalendar DURATION such as "PT1H30M" or "P2D" into a timedelta."""
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("+-").lstrip("P")
+    amounts = {"W": 0, "D": 0, "H": 0, "M": 0, "S": 0}
+    number = ""
+    for char in value:
+        if char.isdigit():
+            number += char
+        elif char in amounts:
+            amounts[char] = int(number or 0)
+            number = ""
+    return sign * timedelta(weeks=amounts["W"], days=amounts["D"], hours=amounts["H"],
+                            minutes=amounts["M"], seconds=amounts["S"])
+
+
+def parse_until(value):
+    """Parses an RRULE UNTIL into a naive local time, including the whole day when it is a date."""
+    until, all_day = parse_datetime(value)
+    return until + timedelta(days=1, microseconds=-1) if all_day else to_local(until)
+
+
+def parse_rrule(value):
+    """
+    Parses an RRULE value.
+
+    Returns:
+        dict: freq, interval, count, until (datetime), byday ([(ordinal, weekday)]),
+        bymonthday ([int]) and bymonth ([int]).
+    """
+    parts = dict(part.split("=", 1) for part in value.split(";") if "=" in part)
+    rule = {
+        "freq": parts.get("FREQ", "DAILY").upper(),
+        "interval": int(parts.get("INTERVAL", 1)),
+        "count": int(parts["COUNT"]) if "COUNT" in parts else None,
+        "until": parse_until(parts["UNTIL"]) if "UNTIL" in parts else None,
+        "byday": [],
+        "bymonthday": [int(day) for day in parts["BYMONTHDAY"].split(",")] if "BYMONTHDAY" in parts else [],
+        "bymonth": [int(month) for month in parts["BYMONTH"].split(",")] if "BYMONTH" in parts else [],
+    }
+    for day in parts.get("BYDAY", "").split(","):
+        if day:
+            ordinal = day[:-2]
+            rule["byday"].append((int(ordinal) if ordinal not in ("", "+") else None, WEEKDAYS[day[-2:].upper()]))
+    return rule
+
+
+def parse_ics(text):
+    """
+    Parses the VEVENTs of an .ics file.
+
+    Args:
+        text (str): The file content.
+
+    Returns:
+        list: Event objects.
+    """
+    events = []
+    fields = None
+    for line in unfold(text):
+        name, params, value = parse_line(line)
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            fields = {"EXDATE": set()}
+        elif name == "END" and value.upper() == "VEVENT" and fields is not None:
+            if "DTSTART" in fields:
+                events.append(build_event(fields))
+            fields = None
+        elif fields is not None:
+            if name == "EXDATE":
+                for item in value.split(","):
+                    fields["EXDATE"].add(to_local(parse_datetime(item, params)[0]))
+            elif name in ("DTSTART", "DTEND", "RECURRENCE-ID"):
+                fields[name] = parse_datetime(value, params)
+            elif name not in fields:
+                fields[name] = value
+    return events
+
+
+def build_event(fields):
+    """
+    Creates an Event from the collected fields of a VEVENT.
+
+    A floating DTEND of a zoned DTSTART is read as local time in the start's
+    zone, and a zoned DTEND of a floating DTSTART as naive local time, so start
+    and end can always be compared.
+    """
+    start, all_day = fields["DTSTART"]
+    if "DTEND" in fields:
+        end = fields["DTEND"][0]
+        if start.tzinfo is not None and end.tzinfo is None:
+            end = end.astimezone(start.tzinfo)  # naive times are local times
+        elif start.tzinfo is None and end.tzinfo is not None:
+            end = to_local(end)
+    elif "DURATION" in fields:
+        end = start + parse_duration(fields["DURATION"])
+    else:
+        end = start + (timedelta(days=1) if all_day else timedelta())
+    summary = fields.get("SUMMARY", "").replace("\\,", ",").replace("\\;", ";").replace("\\n", " ")
+    return Event(
+        uid=fields.get("UID", ""),
+        summary=summary,
+        start=start,
+        end=max(end, start),
+        all_day=all_day,
+        rrule=parse_rrule(fields["RRULE"]) if "RRULE" in fields else None,
+        exdates=fields["EXDATE"],
+        recurrence_id=to_local(fields["RECURRENCE-ID"][0]) if "RECURRENCE-ID" in fields else None,
+    )
+
+
+def month_days(year, month, rule, start):
+    """Returns the days of a month a MONTHLY or YEARLY rule selects, in order."""
+    last = calendar.monthrange(year, month)[1]
+    days = set()
+    for day in rule["bymonthday"]:
+        day = day if day > 0 else last + 1 + day
+        if 1 <= day <= last:
+            days.add(day)
+    for ordinal, weekday in rule["byday"]:
+        matches = [day for day in range(1, last + 1) if calendar.weekday(year, month, day) == weekday]
+        if ordinal is None:
+            days.update(matches)
+        elif -len(matches) <= ordinal <= len(matches) and ordinal != 0:
+            days.add(matches[ordinal - 1 if ordinal > 0 else ordinal])
+    if not rule["bymonthday"] and not rule["byday"] and start.day <= last:
+        days.add(start.day)
+    return sorted(days)
+
+
+def year_days(year, rule):
+    """
+    Returns the days of a year a YEARLY rule with BYDAY but no BYMONTH selects, in order.
+
+    Ordinals count through the whole year, so "20MO" is the year's 20th Monday.
+    A BYMONTHDAY next to it only keeps the days with those numbers.
+    """
+    first = datetime(year, 1, 1)
+    days = [first + timedelta(days=offset) for offset in range(366 if calendar.isleap(year) else 365)]
+    selected = set()
+    for ordinal, weekday in rule["byday"]:
+        matches = [day for day in days if day.weekday() == weekday]
+        if ordinal is None:
+            selected.update(matches)
+        elif -len(matches) <= ordinal <= len(matches) and ordinal != 0:
+            selected.add(matches[ordinal - 1 if ordinal > 0 else ordinal])
+    if rule["bymonthday"]:
+        selected = {day for day in selected if day.day in rule["bymonthday"]
+                    or day.day - calendar.monthrange(year, day.month)[1] - 1 in rule["bymonthday"]}
+    return sorted(selected)
+
+
+def candidates(start, rule):
+    """Yields the start times a recurrence rule produces, in order, beginning with DTSTART."""
+    interval = rule["interval"]
+    weekdays = sorted(weekday for _, weekday in rule["byday"]) or [start.weekday()]
+    step = 0
+    while step < MAX_CANDIDATES:  # a rule that matches no day at all must still end
+        if rule["freq"] == "DAILY":
+            moment = start + timedelta(days=step * interval)
+            if (not rule["byday"] or moment.weekday() in weekdays) and \
+                    (not rule["bymonth"] or moment.month in rule["bymonth"]):
+                yield moment
+        elif rule["freq"] == "WEEKLY":
+            week = start - timedelta(days=start.weekday()) + timedelta(weeks=step * interval)
+            for weekday in weekdays:
+                moment = week + timedelta(days=weekday)
+                if moment >= start:
+                    yield moment
+        elif rule["freq"] == "MONTHLY":
+            month_index = start.month - 1 + step * interval
+            year, month = start.year + month_index // 12, month_index % 12 + 1
+            if not rule["bymonth"] or month in rule["bymonth"]:
+                for day in month_days(year, month, rule, start):
+                    moment = start.replace(year=year, month=month, day=day)
+                    if moment >= start:
+                        yield moment
+        elif rule["freq"] == "YEARLY" and rule["byday"] and not rule["bymonth"]:
+            for day in year_days(start.year + step * interval, rule):
+                moment = start.replace(year=day.year, month=day.month, day=day.day)
+                if moment >= start:
+                    yield moment
+        elif rule["freq"] == "YEARLY":
+            year = start.year + step * interval
+            for month in rule["bymonth"] or [start.month]:
+                for day in month_days(year, month, rule, start):
+                    moment = start.replace(year=year, month=month, day=day)
+                    if moment >= start:
+                        yield moment
+        else:
+            return  # HOURLY and finer rules are not shown on a day calendar
+        step += 1
+
+
+def expand(event, window_start, window_end):
+    """
+    Returns the (start, end) occurrences of an event that overlap a window.
+
+    Recurrences are stepped in the event's own time zone, so a weekly 09:00
+    meeting stays at 09:00 there across daylight saving changes, and every
+    occurrence is then converted to local time.
+
+    Args:
+        event (Event): A single or recurring event.
+        window_start (datetime): Start of the window, naive local time.
+        window_end (datetime): End of the window, naive local time.
+
+    Returns:
+        list: (start, end) tuples as naive local times.
+    """
+    duration = event.end - event.start
+    if event.rrule is None:
+        start, end = to_local(event.start), to_local(event.end)
+        if start < window_end and end > window_start or window_start <= start < window_end:
+            return [(start, end)]
+        return []
+    rule = event.rrule
+    zone = event.start.tzinfo
+    occurrences = []
+    for generated, moment in enumerate(candidates(event.start.replace(tzinfo=None), rule)):
+        moment = to_local(moment.replace(tzinfo=zone))
+        if generated >= MAX_CANDIDATES or moment >= window_end:
+            break
+        if rule["count"] is not None and generated >= rule["count"]:
+            break
+        if rule["until"] is not None and moment > rule["until"]:
+            break
+        if moment not in event.exdates and moment + duration > window_start:
+            occurrences.append((moment, moment + duration))
+    return occurrences
+
+
+class EventIndex:
+    """
+    Interval index of expanded occurrences for fast day and month lookups.
+
+    Occurrences are sorted by start. An occurrence overlapping [a, b) must start
+    before b and no earlier than a minus the longest duration, so a lookup is two
+    bisections plus the matches, instead of a scan over every occurrence.
+
+    Attributes:
+        occurrences (list): (start, end, summary, all_day) tuples sorted by start.
+        starts (list): The start of every occurrence, for bisection.
+        longest (timedelta): Duration of the longest occurrence.
+    """
+
+    def __init__(self, occurrences):
+        self.occurrences = sorted(occurrences, key=lambda occurrence: (occurrence[0], occurrence[2]))
+        self.starts = [occurrence[0] for occurrence in self.occurrences]
+        self.longest = max((end - start for start, end, _, _ in self.occurrences), default=timedelta())
+
+    def __len__(self):
+        return len(self.occurrences)
+
+    def between(self, start, end):
+        """
+        Returns the occurrences overlapping [start, end), ordered by start.
+
+        Args:
+            start (datetime): Start of the range.
+            end (datetime): End of the range.
+        """
+        first = bisect_left(self.starts, start - self.longest)
+        last = bisect_left(self.starts, end)
+        return [occurrence for occurrence in self.occurrences[first:last]
+                if occurrence[1] > start or occurrence[0] >= start]
+
+    def on_day(self, day):
+        """Returns the occurrences on a date, the agenda of that day."""
+        start = datetime(day.year, day.month, day.day)
+        return self.between(start, start + timedelta(days=1))
+
+    def days_with_events(self, year, month):
+        """Returns the set of day numbers of a month that have at least one occurrence."""
+        first = datetime(year, month, 1)
+        last = first + timedelta(days=calendar.monthrange(year, month)[1])
+        days = set()
+        for start, end, _, _ in self.between(first, last):
+            if start >= first and (end - start).days == 0 and end.day == start.day:
+                days.add(start.day)  # the common case: starts and ends on one day
+                continue
+            day = max(start, first)
+            # An occurrence ending exactly at midnight does not touch the next day
+            stop = min(max(end, start + timedelta(microseconds=1)), last)
+            while day < stop:
+                days.add(day.day)
+                day = datetime(day.year, day.month, day.day) + timedelta(days=1)
+        return days
+
+
+class CalendarLoader:
+    """
+    Loads every .ics file in a folder into an EventIndex.
+
+    Files are parsed once and cached by modification time and size, so reloading
+    an unchanged folder only costs a stat per file. Recurring events are expanded
+    over a window around today, and instances moved with RECURRENCE-ID replace
+    the occurrence of their series.
+
+    Attributes:
+        folder (str): Folder holding the .ics files.
+        days_before (int): Days before today that are expanded.
+        days_after (int): Days after today that are expanded.
+        files (dict): path -> (mtime_ns, size, events) of every parsed file.
+        index (EventIndex): The most recently built index, None before the first load.
+        built_on (date): Day the index was built; the window moves with it.
+        errors (dict): path -> error message of files that could not be read.
+    """
+
+    def __init__(self, folder="media/calendars", days_before=366, days_after=2 * 366):
+        self.folder = folder
+        self.days_before = days_before
+        self.days_after = days_after
+        self.files = {}
+        self.index = None
+        self.built_on = None
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def scan(self):
+        """
+        Re-reads changed files.
+
+        Returns:
+            bool: True if any file was added, changed or removed.
+        """
+        changed = False
+        paths = set(glob.glob(os.path.join(self.folder, "*.ics")))
+        for path in list(self.files):
+            if path not in paths:
+                del self.files[path]
+                changed = True
+        for path in sorted(paths):
+            try:
+                info = os.stat(path)
+                cached = self.files.get(path)
+                if cached is not None and cached[:2] == (info.st_mtime_ns, info.st_size):
+                    continue
+                with open(path, encoding="utf-8", errors="replace") as file:
+                    events = parse_ics(file.read())
+            except Exception as error:  # one broken file must not stop the others from loading
+                self.report_error(path, error)
+                self.files.pop(path, None)
+                continue
+            self.errors.pop(path, None)
+            self.files[path] = (info.st_mtime_ns, info.st_size, events)
+            changed = True
+        return changed
+
+    def report_error(self, path, error):
+        """Records why a file could not be loaded and prints it the first time."""
+        message = f"{type(error).__name__}: {error}"
+        if self.errors.get(path) != message:
+            print(f"calendar: skipping {path} ({message})")
+        self.errors[path] = message
+
+    def load(self):
+        """
+        Returns an index of all events, rebuilding it only when files or the day changed.
+
+        Blocking; meant to run on a worker thread.
+        """
+        with self.lock:
+            return self.build_index()
+
+    def build_index(self):
+        """Scans the folder and rebuilds the index if needed; callers hold the lock."""
+        today = clock.now().date()
+        if not self.scan() and self.index is not None and self.built_on == today:
+            return self.index
+        midnight = datetime(today.year, today.month, today.day)
+        window_start = midnight - timedelta(days=self.days_before)
+        window_end = midnight + timedelta(days=self.days_after)
+
+        events = [event for _, _, file_events in self.files.values() for event in file_events]
+        moved = {(event.uid, event.recurrence_id) for event in events if event.recurrence_id is not None}
+        occurrences = []
+        for path, (_, _, file_events) in self.files.items():
+            try:
+                for event in file_events:
+                    for start, end in expand(event, window_start, window_end):
+                        if event.recurrence_id is None and (event.uid, start) in moved:
+                            continue  # replaced by a moved instance
+                        occurrences.append((start, end, event.summary, event.all_day))
+            except Exception as error:
+                self.report_error(path, error)
+        self.index = EventIndex(occurrences)
+        self.built_on = today
+        return self.index
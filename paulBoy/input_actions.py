@@ -0,0 +1,71 @@
+import time
+
+import pygame
+
+# Semantic controls shared by the mouse, the evdev backend and anything else that drives the UI
+NEXT_TAB = "next_tab"
+SCROLL_UP = "scroll_up"
+SCROLL_DOWN = "scroll_down"
+SELECT = "select"
+ACTIONS = (NEXT_TAB, SCROLL_UP, SCROLL_DOWN, SELECT)
+
+# pygame event carrying an ``action`` and the monotonic ``timestamp`` of the physical input
+INPUT_ACTION = pygame.event.custom_type()
+
+
+def post_action(action, timestamp=None):
+    """
+    Posts a semantic action into the pygame event queue.
+
+    pygame.event.post is thread safe, so this can be called from input threads.
+
+    Args:
+        action (str): One of ACTIONS.
+        timestamp (float): time.monotonic() value of the physical input, defaults to now.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"unknown action '{action}'")
+    if timestamp is None:
+        timestamp = time.monotonic()
+    pygame.event.post(pygame.event.Event(INPUT_ACTION, action=action, timestamp=timestamp))
+
+
+class InputLatency:
+    """
+    Collects input-to-frame latency, from the physical input to the frame that shows its result.
+
+    Attributes:
+        count (int): Number of inputs measured.
+        last (float): Latency of the most recent input in seconds.
+        total (float): Sum of all measured latencies in seconds.
+        worst (float): Largest measured latency in seconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last = 0.0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def record(self, latency):
+        """
+        Adds one measurement.
+
+        Args:
+            latency (float): Seconds between the input and the presented frame.
+        """
+        self.count += 1
+        self.last = latency
+        self.total += latency
+        if latency > self.worst:
+            self.worst = latency
+
+    @property
+    def mean(self):
+        """Average latency in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+    def report(self):
+        """Returns a one-line summary in milliseconds."""
+        return (f"input-to-frame latency: {self.count} inputs, last {self.last * 1000:.1f} ms, "
+                f"mean {self.mean * 1000:.1f} ms, worst {self.worst * 1000:.1f} ms")
@@ -0,0 +1,333 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pygame
+
+import clock
+from clock import ManualClock
+from input_actions import INPUT_ACTION
+
+FORMAT_VERSION = 1
+
+# Recorded event types and the attributes kept for each of them
+EVENT_FIELDS = {
+    "mousebuttondown": (pygame.MOUSEBUTTONDOWN, ("button", "pos")),
+    "mousewheel": (pygame.MOUSEWHEEL, ("x", "y")),
+    "keydown": (pygame.KEYDOWN, ("key", "mod", "unicode")),
+    "action": (INPUT_ACTION, ("action",)),
+    "quit": (pygame.QUIT, ()),
+}
+EVENT_NAMES = {event_type: name for name, (event_type, _) in EVENT_FIELDS.items()}
+
+
+def encode_event(event, t):
+    """
+    Turns a pygame event into a JSON-friendly dict.
+
+    Args:
+        event (pygame.event.Event): The event seen by MainApp.handle_events.
+        t (float): Seconds since the start of the recording.
+
+    Returns:
+        dict: The encoded event, or None if the event type is not recorded.
+    """
+    name = EVENT_NAMES.get(event.type)
+    if name is None:
+        return None
+    record = {"t": round(t, 4), "type": name}
+    for field in EVENT_FIELDS[name][1]:
+        value = getattr(event, field)
+        record[field] = list(value) if isinstance(value, tuple) else value
+    return record
+
+
+def decode_event(record):
+    """
+    Turns an encoded event back into a pygame event.
+
+    Input actions get a fresh timestamp, so input latency is measured during the replay.
+
+    Args:
+        record (dict): An event written by encode_event.
+    """
+    event_type, fields = EVENT_FIELDS[record["type"]]
+    attributes = {field: tuple(record[field]) if isinstance(record[field], list) else record[field]
+                  for field in fields}
+    if event_type == INPUT_ACTION:
+        attributes["timestamp"] = time.monotonic()
+    return pygame.event.Event(event_type, **attributes)
+
+
+def load_recording(path):
+    """
+    Reads a recording.
+
+    Args:
+        path (str): File written by InputRecorder.
+
+    Returns:
+        tuple: (header, events); header holds the wall time the recording started at.
+    """
+    with open(path) as file:
+        header = json.loads(file.readline())
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} recording")
+        events = [json.loads(line) for line in file if line.strip()]
+    return header, events
+
+
+def frame_hash(surface):
+    """
+    Hashes the pixels of a frame for visual regression checks.
+
+    Args:
+        surface (pygame.Surface): The frame, 8-bit or RGB.
+
+    Returns:
+        str: Hex digest that only changes when a pixel changes.
+    """
+    pixels = pygame.image.tobytes(surface, "P" if surface.get_bitsize() == 8 else "RGB")
+    return hashlib.sha256(pixels).hexdigest()[:16]
+
+
+class InputRecorder:
+    """
+    Writes the input events seen by MainApp.handle_events to a JSON lines file.
+
+    The first line holds the wall time the recording started at, every other line
+    one event with its time since the start. Times come from the clock module, so
+    a replay can reproduce them exactly.
+
+    Attributes:
+        path (str): The recording file.
+        start (float): Monotonic time the recording started at.
+        count (int): Number of events recorded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+        self.start = clock.monotonic()
+        self.count = 0
+        self.write({"version": FORMAT_VERSION, "start": clock.time(), "size": [480, 320]})
+
+    def write(self, record):
+        """Appends one line and flushes it, so a crash keeps everything up to that point."""
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def record(self, event):
+        """
+        Records an event if it is an input or quit event.
+
+        Args:
+            event (pygame.event.Event): An event taken from the queue.
+        """
+        record = encode_event(event, clock.monotonic() - self.start)
+        if record is not None:
+            self.write(record)
+            self.count += 1
+
+    def close(self):
+        """Closes the recording."""
+        if not self.file.closed:
+            self.file.close()
+
+
+class FrameStats:
+    """
+    Collects frame times.
+
+    Attributes:
+        times (list): Duration of every frame in seconds.
+    """
+
+    def __init__(self):
+        self.times = []
+
+    def record(self, seconds):
+        """Adds the duration of one frame."""
+        self.times.append(seconds)
+
+    def percentile(self, fraction):
+        """
+        Returns a frame time percentile in seconds.
+
+        Args:
+            fraction (float): 0.0 - 1.0, e.g. 0.95 for the 95th percentile.
+        """
+        if not self.times:
+            return 0.0
+        ordered = sorted(self.times)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        """
+        Returns the statistics in milliseconds.
+
+        Returns:
+            dict: frames, mean, p50, p95, p99 and max.
+        """
+        count = len(self.times)
+        return {
+            "frames": count,
+            "mean": round(sum(self.times) / count * 1000, 3) if count else 0.0,
+            "p50": round(self.percentile(0.50) * 1000, 3),
+            "p95": round(self.percentile(0.95) * 1000, 3),
+            "p99": round(self.percentile(0.99) * 1000, 3),
+            "max": round(max(self.times, default=0.0) * 1000, 3),
+        }
+
+
+class InputReplayer:
+    """
+    Drives MainApp headlessly from a recording.
+
+    Application time is a ManualClock that starts at the recorded wall time and
+    moves a fixed step per frame, so every run sees the same events on the same
+    frames and draws the same pixels. Frame times are measured with the real clock.
+
+    Attributes:
+        header (dict): The recording header.
+        events (list): The encoded events.
+        frame_interval (float): Application seconds per frame.
+        hash_frames (set): Frame numbers whose pixels are hashed.
+        hash_every (int): Also hash every n-th frame, 0 for none.
+        stats (FrameStats): Frame times of the replay.
+        hashes (dict): Frame hash by frame number.
+    """
+
+    def __init__(self, path, frame_interval=0.075, hash_frames=(), hash_every=0):
+        self.header, self.events = load_recording(path)
+        self.frame_interval = frame_interval
+        self.hash_frames = set(hash_frames)
+        self.hash_every = hash_every
+        self.stats = FrameStats()
+        self.hashes = {}
+
+    def run(self, **app_options):
+        """
+        Replays the recording until its last event.
+
+        Args:
+            **app_options: Extra MainApp arguments, e.g. indexed=True.
+
+        Returns:
+            dict: The report with frame statistics, frame hashes and input latency.
+        """
+        from MainApp import MainApp
+        from YoutubeTablet import YoutubeTablet
+        from power_save import IdlePolicy
+
+        manual = ManualClock(self.header["start"])
+        previous_clock = clock.set_clock(manual)
+        output = tempfile.NamedTemporaryFile(suffix=".fb", delete=False)
+        output.close()
+        # The YouTube tab starts from an empty store and never reaches the API, so every run draws the same numbers
+        youtube_settings = YoutubeTablet.STORE_PATH, YoutubeTablet.OFFLINE
+        YoutubeTablet.STORE_PATH, YoutubeTablet.OFFLINE = ":memory:", True
+        try:
+            # The replay measures the active render path, so the display never idles
+            app_options.setdefault("framebuffer", output.name)
+            app = MainApp(idle_policy=IdlePolicy(dim_after=0, blank_after=0), **app_options)
+            app.wait_until_ready()  # every tab is built before the first replayed frame
+            app.radio_player_tab.analyzer.wait()  # the song overviews are drawn from the first frame too
+            app.frame_delay = 0
+            pygame.event.clear()
+
+            pending = [event for event in self.events if event["type"] != "quit"]
+            end = self.events[-1]["t"] if self.events else 0.0
+            frame = 0
+            while manual.monotonic() <= end + self.frame_interval:
+                while pending and pending[0]["t"] <= manual.monotonic():
+                    pygame.event.post(decode_event(pending.pop(0)))
+                started = time.perf_counter()
+                app.step()
+                self.stats.record(time.perf_counter() - started)
+                if frame in self.hash_frames or (self.hash_every and frame % self.hash_every == 0):
+                    self.hashes[frame] = frame_hash(app.screen)
+                frame += 1
+                manual.advance(self.frame_interval)
+            latency = app.input_latency
+            draw_stats = app.draw.stats
+            app.crt_shader.close()  # a Graphic_engine or, in present process mode, a PresentClient
+        finally:
+            YoutubeTablet.STORE_PATH, YoutubeTablet.OFFLINE = youtube_settings
+            clock.set_clock(previous_clock)
+            os.unlink(output.name)
+
+        return {
+            "recording": self.header,
+            "events": len(self.events),
+            "frame_interval": self.frame_interval,
+            "frame_times_ms": self.stats.summary(),
+            "input_latency_ms": {"count": latency.count, "mean": round(latency.mean * 1000, 3),
+                                 "worst": round(latency.worst * 1000, 3)},
+            "draw_per_frame": draw_stats.summary(),
+            "hashes": {str(frame): digest for frame, digest in sorted(self.hashes.items())},
+        }
+
+
+def compare(report, baseline):
+    """
+    Compares a replay report against an earlier one.
+
+    Args:
+        report (dict): The new report.
+        baseline (dict): The report to compare against.
+
+    Returns:
+        tuple: (lines, mismatched); human-readable differences and the frames whose hashes differ.
+    """
+    lines = []
+    for key, value in report["frame_times_ms"].items():
+        old = baseline["frame_times_ms"].get(key)
+        if key != "frames" and old:
+            lines.append(f"{key:>5}: {old:8.3f} ms -> {value:8.3f} ms ({(value - old) / old * 100:+.1f}%)")
+    mismatched = sorted((frame for frame, digest in report["hashes"].items()
+                         if baseline["hashes"].get(frame, digest) != digest), key=int)
+    for frame in mismatched:
+        lines.append(f"frame {frame} differs: {baseline['hashes'][frame]} -> {report['hashes'][frame]}")
+    return lines, mismatched
+
+
+def main():
+    """Replays a recording from the command line and prints or saves the report."""
+    parser = argparse.ArgumentParser(description="Replay a PAUL-BOY input recording as a benchmark")
+    parser.add_argument("recording", help="file written by MainApp.py --record")
+    parser.add_argument("--frame-interval", metavar="SECONDS", type=float, default=0.075,
+                        help="application time per frame")
+    parser.add_argument("--hash-frame", metavar="N", type=int, action="append", default=[],
+                        help="hash the pixels of frame N, may be given more than once")
+    parser.add_argument("--hash-every", metavar="N", type=int, default=0,
+                        help="hash every N-th frame")
+    parser.add_argument("--indexed", action="store_true", help="replay with the 8-bit palette surface")
+    parser.add_argument("--output", metavar="PATH", help="write the report as JSON")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare against an earlier report; exits with 1 if a frame hash differs")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    replayer = InputReplayer(args.recording, args.frame_interval, args.hash_frame, args.hash_every)
+    report = replayer.run(indexed=args.indexed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report["frame_times_ms"]))
+    print(json.dumps(report["draw_per_frame"]))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            lines, mismatched = compare(report, json.load(file))
+        print("\n".join(lines))
+        if mismatched:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
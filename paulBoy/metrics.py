@@ -0,0 +1,399 @@
+"""
+Runtime health metrics in the Prometheus text format.
+
+The metrics below are module-level objects that the app and the tablets update
+while they run, whether or not anyone is scraping them. Every metric is only
+ever written from one thread (the main loop, or the thread that owns the data
+it measures) and writes are plain attribute and list updates, so no locks are
+taken on the hot path. A scrape may see a histogram halfway through one
+update, which Prometheus tolerates. MetricsServer serves the current values
+over HTTP on its own thread, on a TCP port or a Unix socket.
+"""
+
+import bisect
+import os
+import resource
+import socket
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "paulboy_"
+
+# Upper bounds in seconds
+FRAME_BUCKETS = (0.002, 0.005, 0.01, 0.02, 0.033, 0.05, 0.075, 0.1, 0.2, 0.5)
+FETCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ALARM_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 15.0, 30.0, 60.0)
+
+
+def format_value(value):
+    """Formats a sample value the way Prometheus expects."""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values, extra=()):
+    """Returns the {name="value",...} part of a sample line, empty without labels."""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """
+    Base class for a named metric with optional labels.
+
+    A metric without labels records directly; one with labels hands out a child
+    per combination of label values through ``labels``. Children are created on
+    first use and kept, so hot paths should look theirs up once and keep it.
+
+    Attributes:
+        name (str): Metric name without the "paulboy_" prefix.
+        help (str): One-line description shown in the exposition.
+        label_names (tuple): Names of the labels, empty for none.
+        children (dict): Child metric by tuple of label values.
+    """
+
+    TYPE = "untyped"
+
+    def __init__(self, name, help, label_names=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.children = {}
+
+    def labels(self, *values):
+        """
+        Returns the child for a combination of label values, creating it on first use.
+
+        Args:
+            *values: One value per label name, in order.
+        """
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.new_child()
+        return child
+
+    def new_child(self):
+        """Creates an unlabelled metric of the same kind. Subclasses override this."""
+        raise NotImplementedError
+
+    def samples(self):
+        """Yields (suffix, labels, value) for the metric itself. Subclasses override this."""
+        return ()
+
+    def expose(self):
+        """Returns the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+        if self.label_names:
+            series = list(self.children.items())
+        else:
+            series = [((), self)]
+        for values, metric in series:
+            for suffix, extra, value in metric.samples():
+                lines.append(f"{self.name}{suffix}{format_labels(self.label_names, values, extra)} "
+                             f"{format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. the number of failed requests. Names end in "_total".
+
+    Attributes:
+        value (float): The current count.
+    """
+
+    TYPE = "counter"
+
+    def __init__(self, name="", help="", label_names=()):
+        super().__init__(name, help, label_names)
+        self.value = 0
+
+    def new_child(self):
+        return Counter()
+
+    def inc(self, amount=1):
+        """Adds to the count."""
+        self.value += amount
+
+    def samples(self):
+        yield "", (), self.value
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, either set by the code that owns it or read when scraped.
+
+    Attributes:
+        value (float): The last value set.
+        function: Called at scrape time instead of using value, if given.
+    """
+
+    TYPE = "gauge"
+
+    def __init__(self, name="", help="", label_names=(), function=None):
+        super().__init__(name, help, label_names)
+        self.value = 0
+        self.function = function
+
+    def new_child(self):
+        return Gauge()
+
+    def set(self, value):
+        """Sets the value."""
+        self.value = value
+
+    def samples(self):
+        yield "", (), self.function() if self.function is not None else self.value
+
+
+class Histogram(Metric):
+    """
+    Counts observations in cumulative buckets, e.g. frame times.
+
+    Attributes:
+        buckets (tuple): Sorted upper bounds; +Inf is implied.
+        counts (list): Observations per bucket (not cumulative), the last one for +Inf.
+        sum (float): Sum of all observations.
+        count (int): Number of observations.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(self, name="", help="", label_names=(), buckets=FRAME_BUCKETS):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def new_child(self):
+        return Histogram(buckets=self.buckets)
+
+    def observe(self, value):
+        """Records one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        counts = list(self.counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield "_bucket", (("le", format_value(bound)),), cumulative
+        yield "_sum", (), self.sum
+        yield "_count", (), cumulative
+
+
+def resident_memory():
+    """Returns the resident set size of this process in bytes (the peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # kilobytes everywhere else
+
+
+FRAME_SECONDS = Histogram("frame_seconds", "Time taken to draw one frame.")
+FPS = Gauge("fps", "Frames drawn over the last second.")
+TAB_RENDER_SECONDS = Histogram("tab_render_seconds", "Time the active tab took to queue its drawing.", ["tab"])
+DRAW_CACHE_LOOKUPS = Counter("draw_cache_lookups_total", "Draw list cache lookups by cache and result.",
+                             ["cache", "result"])
+YOUTUBE_FETCH_SECONDS = Histogram("youtube_fetch_seconds", "Latency of YouTube Data API requests.",
+                                  buckets=FETCH_BUCKETS)
+YOUTUBE_ERRORS = Counter("youtube_errors_total", "Failed YouTube Data API requests by cause.", ["cause"])
+MIXER_CHANNELS_BUSY = Gauge("mixer_channels_busy", "Mixer channels playing, by audio bus.", ["bus"])
+ALARM_LATENCY_SECONDS = Histogram("alarm_latency_seconds",
+                                  "Delay between the start of the alarm minute and the alarm firing.",
+                                  buckets=ALARM_BUCKETS)
+STREAM_BUFFER_FILL = Gauge("stream_buffer_fill_ratio", "How full the internet radio ring buffer is, 0 - 1.")
+STREAM_UNDERRUNS = Counter("stream_underruns_total", "Times internet radio playback ran out of decoded audio.")
+STREAM_RECONNECTS = Counter("stream_reconnects_total", "Internet radio connections reopened after a drop.")
+BOOT_SECONDS = Gauge("boot_seconds", "Seconds from the process start until each boot milestone.", ["milestone"])
+PRESENT_SECONDS = Histogram("present_seconds", "Time the present process took to show one frame.")
+PRESENT_DROPPED_FRAMES = Counter("present_dropped_frames_total",
+                                 "Frames not presented because the present process was still busy.")
+EVENTS = Counter("events_total", "Events dispatched on the event bus, by event.", ["event"])
+RESIDENT_MEMORY = Gauge("resident_memory_bytes", "Resident set size of the process.", function=resident_memory)
+
+REGISTRY = [FRAME_SECONDS, FPS, TAB_RENDER_SECONDS, DRAW_CACHE_LOOKUPS, YOUTUBE_FETCH_SECONDS, YOUTUBE_ERRORS,
+            MIXER_CHANNELS_BUSY, ALARM_LATENCY_SECONDS, STREAM_BUFFER_FILL, STREAM_UNDERRUNS, STREAM_RECONNECTS,
+            BOOT_SECONDS, PRESENT_SECONDS, PRESENT_DROPPED_FRAMES, EVENTS, RESIDENT_MEMORY]
+
+
+def exposition(metrics=None):
+    """
+    Returns all metrics in the Prometheus text format.
+
+    Args:
+        metrics (list): Metrics to expose, defaults to REGISTRY.
+    """
+    return "\n".join(metric.expose() for metric in (metrics or REGISTRY)) + "\n"
+
+
+class FrameRate:
+    """
+    Counts frames and updates the FPS gauge once per second.
+
+    Attributes:
+        frames (int): Frames counted since the window started.
+        window_start (float): Monotonic time the current window started, None before the first frame.
+    """
+
+    def __init__(self, gauge=FPS):
+        self.gauge = gauge
+        self.frames = 0
+        self.window_start = None
+
+    def tick(self, now):
+        """
+        Counts one frame.
+
+        Args:
+            now (float): Monotonic time of the frame.
+        """
+        if self.window_start is None:
+            self.window_start = now
+        self.frames += 1
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.gauge.set(round(self.frames / elapsed, 2))
+            self.frames = 0
+            self.window_start = now
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answers GET /metrics with the exposition and everything else with 404."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no host
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        """Scrapes are not logged."""
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server listening on a Unix socket."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) style address
+        return request, ("unix", 0)
+
+
+def parse_address(address, default_port=9100):
+    """
+    Splits a metrics address into ("unix", path) or ("tcp", (host, port)).
+
+    Args:
+        address (str): "unix:PATH", a path starting with "/" or ".", "host:port", "host" or "port".
+        default_port (int): Port used when none is given.
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if address.startswith(("/", ".")):
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    if not host and not port.isdigit():
+        host, port = port, ""
+    return "tcp", (host or "127.0.0.1", int(port) if port else default_port)
+
+
+class MetricsServer:
+    """
+    Serves the metrics over HTTP on a background thread.
+
+    Attributes:
+        address (str): Where the server listens, as given to the constructor.
+        kind (str): "tcp" or "unix".
+        server (socketserver.BaseServer): The HTTP server, None until started.
+        thread (threading.Thread): The thread running the server.
+    """
+
+    def __init__(self, address="127.0.0.1:9100"):
+        self.address = address
+        self.kind, self.location = parse_address(address)
+        self.server = None
+        self.thread = None
+
+    @property
+    def port(self):
+        """The TCP port actually listened on, useful when port 0 picked a free one."""
+        return self.server.server_address[1] if self.kind == "tcp" and self.server else None
+
+    def start(self):
+        """Binds the socket and starts serving."""
+        if self.kind == "unix":
+            if os.path.exists(self.location):
+                os.unlink(self.location)  # left behind by an earlier run
+            self.server = UnixHTTPServer(self.location, MetricsHandler)
+        else:
+            self.server = ThreadingHTTPServer(self.location, MetricsHandler)
+            self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="paulboy-metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops serving and removes the Unix socket."""
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        if self.kind == "unix" and os.path.exists(self.location):
+            os.unlink(self.location)
+        self.server = None
+
+
+def scrape(address="127.0.0.1:9100", timeout=2.0):
+    """
+    Fetches the exposition from a running server, e.g. to check a unit from its shell.
+
+    Args:
+        address (str): The same address the server was started with.
+        timeout (float): Seconds to wait for the answer.
+    """
+    kind, location = parse_address(address)
+    family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(location)
+        connection.sendall(b"GET /metrics HTTP/1.0\r\nHost: localhost\r\n\r\n")
+        response = b""
+        while chunk := connection.recv(65536):
+            response += chunk
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = head.split(b"\r\n")[0]
+    if b" 200 " not in status:
+        raise OSError(f"metrics request failed: {status.decode(errors='replace')}")
+    return body.decode()
+
+
+if __name__ == "__main__":
+    print(scrape(sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1:9100"), end="")
@@ -0,0 +1,269 @@
+import socket
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+MAGIC = b"PBMF"
+HEADER = struct.Struct("!4sI")  # magic, compressed payload length
+FRAME = struct.Struct("!HHHHH")  # width, height, tile width, tile height, tile count
+TILE = struct.Struct("!HH")  # tile column, tile row
+
+
+def parse_address(address, default_port=8765):
+    """
+    Splits "host:port", "host" or "port" into a (host, port) tuple.
+
+    Args:
+        address (str): Host name or IP and/or port.
+        default_port (int): Port used when none is given.
+    """
+    host, _, port = address.rpartition(":")
+    if not host and not port.isdigit():
+        host, port = port, ""
+    return host or "127.0.0.1", int(port) if port else default_port
+
+
+def surface_pixels(surface):
+    """
+    Returns the pixels of a surface as a (height, width, 3) RGB array.
+
+    Args:
+        surface (pygame.Surface): An RGB or 8-bit palette surface.
+    """
+    width, height = surface.get_size()
+    if surface.get_bitsize() == 8:
+        indices = np.frombuffer(pygame.image.tobytes(surface, "P"), dtype=np.uint8).reshape(height, width)
+        lut = np.array([colour[:3] for colour in surface.get_palette()], dtype=np.uint8)
+        return lut[indices]
+    return np.frombuffer(pygame.image.tobytes(surface, "RGB"), dtype=np.uint8).reshape(height, width, 3)
+
+
+def encode_update(pixels, previous, tile):
+    """
+    Packs the tiles that changed since the previous frame.
+
+    Args:
+        pixels (numpy.ndarray): The new (height, width, 3) frame.
+        previous (numpy.ndarray): The frame the receiver already has, None for a full frame.
+        tile (tuple): Tile width and height; they must divide the frame size.
+
+    Returns:
+        bytes: The uncompressed update, or None if nothing changed.
+    """
+    height, width, _ = pixels.shape
+    tile_w, tile_h = tile
+    if width % tile_w or height % tile_h:
+        raise ValueError(f"tile size {tile_w}x{tile_h} does not divide the {width}x{height} frame")
+    rows, columns = height // tile_h, width // tile_w
+    tiles = pixels.reshape(rows, tile_h, columns, tile_w, 3)
+    if previous is None:
+        changed = np.ones((rows, columns), dtype=bool)
+    else:
+        changed = (tiles != previous.reshape(rows, tile_h, columns, tile_w, 3)).any(axis=(1, 3, 4))
+    positions = np.argwhere(changed)
+    if not len(positions):
+        return None
+    parts = [FRAME.pack(width, height, tile_w, tile_h, len(positions))]
+    for row, column in positions:
+        parts.append(TILE.pack(column, row))
+        parts.append(tiles[row, :, column].tobytes())
+    return b"".join(parts)
+
+
+def apply_update(frame, update):
+    """
+    Applies an uncompressed update to a frame.
+
+    Args:
+        frame (numpy.ndarray): The receiver's (height, width, 3) frame, None before the first update.
+        update (bytes): An update made by encode_update.
+
+    Returns:
+        numpy.ndarray: The updated frame.
+    """
+    width, height, tile_w, tile_h, count = FRAME.unpack_from(update)
+    if frame is None or frame.shape != (height, width, 3):
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+    offset = FRAME.size
+    tile_size = tile_w * tile_h * 3
+    for _ in range(count):
+        column, row = TILE.unpack_from(update, offset)
+        offset += TILE.size
+        pixels = np.frombuffer(update, dtype=np.uint8, count=tile_size, offset=offset)
+        frame[row * tile_h:(row + 1) * tile_h, column * tile_w:(column + 1) * tile_w] = \
+            pixels.reshape(tile_h, tile_w, 3)
+        offset += tile_size
+    return frame
+
+
+def read_message(connection):
+    """
+    Reads one update from a mirror connection.
+
+    Args:
+        connection (socket.socket): Connected to a MirrorServer.
+
+    Returns:
+        bytes: The uncompressed update, or None when the server closed the connection.
+    """
+    header = read_exactly(connection, HEADER.size)
+    if header is None:
+        return None
+    magic, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("not a PAUL-BOY mirror stream")
+    payload = read_exactly(connection, length)
+    return None if payload is None else zlib.decompress(payload)
+
+
+def read_exactly(connection, size):
+    """Reads size bytes from a socket, or returns None if it closes first."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class MirrorServer:
+    """
+    Streams the finished screen to viewers over TCP, sending only the tiles that changed.
+
+    The render loop only hands over a copy of the screen. Conversion, tile
+    comparison, compression and sending happen on a background thread, which
+    always works on the newest frame and drops the ones it could not keep up
+    with, so a slow network or viewer never slows the device down. Frames are
+    taken at most max_fps times per second, and nothing is sent when nothing changed.
+
+    Attributes:
+        address (tuple): (host, port) the server listens on; port 0 picks a free port.
+        tile (tuple): Tile width and height.
+        max_fps (float): Most frames taken from the render loop per second.
+        level (int): zlib compression level.
+        clients (list): Connected viewer sockets.
+        frames_submitted (int): Frames handed over by the render loop.
+        frames_dropped (int): Frames replaced by a newer one before they were encoded.
+        updates_sent (int): Updates sent, each one to every client.
+        bytes_sent (int): Compressed bytes sent to all clients.
+        encode_time (float): Seconds spent encoding the last update.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, tile=(32, 32), max_fps=10, level=1, send_timeout=0.5):
+        """
+        Opens the listening socket and starts the encoder thread.
+
+        Args:
+            host (str): Interface to listen on, "0.0.0.0" to allow viewers on the network.
+            port (int): TCP port, 0 picks a free one.
+            tile (tuple): Tile width and height; they must divide the screen size.
+            max_fps (float): Most frames taken from the render loop per second.
+            level (int): zlib compression level, 1 is fastest.
+            send_timeout (float): Seconds a viewer may block a send before it is dropped.
+        """
+        self.tile = tile
+        self.max_fps = max_fps
+        self.level = level
+        self.send_timeout = send_timeout
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()[:2]
+        self.clients = []
+
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+        self.updates_sent = 0
+        self.bytes_sent = 0
+        self.encode_time = 0.0
+
+        self.condition = threading.Condition()
+        self.pending = None
+        self.last_submit = 0.0
+        self.previous = None
+        self.running = True
+        self.thread = threading.Thread(target=self.encode_loop, name="mirror", daemon=True)
+        self.thread.start()
+
+    def submit(self, surface):
+        """
+        Hands a finished frame to the encoder thread; called from the render loop.
+
+        Costs one surface copy at most max_fps times per second, and nothing while
+        no viewer is connected.
+
+        Args:
+            surface (pygame.Surface): The finished screen.
+        """
+        now = time.monotonic()
+        if not self.clients or now - self.last_submit < 1.0 / self.max_fps:
+            return
+        self.last_submit = now
+        frame = surface.copy()
+        with self.condition:
+            if self.pending is not None:
+                self.frames_dropped += 1
+            self.pending = frame
+            self.frames_submitted += 1
+            self.condition.notify()
+
+    def accept_clients(self):
+        """Accepts waiting viewers; the next update is sent in full so they start from a complete frame."""
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except (BlockingIOError, OSError):
+                return
+            connection.setblocking(True)
+            connection.settimeout(self.send_timeout)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients.append(connection)
+            self.previous = None
+
+    def encode_loop(self):
+        """Encodes and sends the newest frame whenever one arrives, until stopped."""
+        while self.running:
+            self.accept_clients()
+            with self.condition:
+                if self.pending is None:
+                    # Wake up regularly to accept viewers while nothing is submitted
+                    self.condition.wait(0.2)
+                frame, self.pending = self.pending, None
+            if frame is None or not self.clients:
+                continue
+            started = time.perf_counter()
+            pixels = surface_pixels(frame)
+            update = encode_update(pixels, self.previous, self.tile)
+            self.previous = pixels
+            if update is None:
+                continue
+            payload = zlib.compress(update, self.level)
+            message = HEADER.pack(MAGIC, len(payload)) + payload
+            self.encode_time = time.perf_counter() - started
+            self.send(message)
+
+    def send(self, message):
+        """Sends a message to every viewer, dropping the ones that are gone or too slow."""
+        for connection in list(self.clients):
+            try:
+                connection.sendall(message)
+                self.bytes_sent += len(message)
+            except OSError:
+                self.clients.remove(connection)
+                connection.close()
+        self.updates_sent += 1
+
+    def stop(self):
+        """Stops the encoder thread and closes all connections."""
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        self.thread.join(timeout=1.0)
+        for connection in self.clients:
+            connection.close()
+        self.clients.clear()
+        self.listener.close()
@@ -0,0 +1,72 @@
+import argparse
+import queue
+import socket
+import threading
+
+import pygame
+
+from mirror_server import apply_update, parse_address, read_message
+
+
+# Milliseconds the window waits for input before looking for new updates again
+EVENT_WAIT = 20
+
+
+def read_updates(connection, updates):
+    """Reads updates on a thread and queues them, then None once the server closed the connection."""
+    try:
+        while True:
+            update = read_message(connection)
+            updates.put(update)
+            if update is None:
+                return
+    except (OSError, ValueError):
+        updates.put(None)
+
+
+def main():
+    """Shows the screen of a PAUL-BOY started with --mirror in a window."""
+    parser = argparse.ArgumentParser(description="View a PAUL-BOY screen mirror")
+    parser.add_argument("address", nargs="?", default="127.0.0.1:8765", help="host[:port] of the device")
+    parser.add_argument("--scale", type=int, default=2, help="window scale factor")
+    args = parser.parse_args()
+
+    connection = socket.create_connection(parse_address(args.address))
+    pygame.init()
+    pygame.display.set_caption(f"PAUL-BOY mirror - {args.address}")
+    window = None
+    frame = None
+    # The server sends nothing while the screen does not change, so the socket is read on a thread
+    # and the window keeps handling its events
+    updates = queue.SimpleQueue()
+    threading.Thread(target=read_updates, args=(connection, updates), name="mirror-reader", daemon=True).start()
+
+    running = True
+    while running:
+        event = pygame.event.wait(EVENT_WAIT)
+        if event.type == pygame.QUIT or any(event.type == pygame.QUIT for event in pygame.event.get()):
+            break
+        changed = False
+        while not updates.empty():
+            update = updates.get()
+            if update is None:
+                running = False
+                break
+            frame = apply_update(frame, update)
+            changed = True
+        if not changed:
+            continue
+        height, width, _ = frame.shape
+        if window is None:
+            window = pygame.display.set_mode((width * args.scale, height * args.scale))
+        image = pygame.image.frombuffer(frame.tobytes(), (width, height), "RGB")
+        # Scaled on its own surface: the window's pixel format is usually not the frame's 24-bit RGB
+        window.blit(pygame.transform.scale(image, window.get_size()), (0, 0))
+        pygame.display.flip()
+
+    connection.close()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import bisect
+import os
+import unicodedata
+
+import numpy as np
+
+MUSIC_EXTENSIONS = (".mp3",)
+# Sorts after every character a word can contain, so a prefix range ends at prefix + LAST
+LAST = "\U0010ffff"
+
+
+def normalise(text):
+    """
+    Folds text for matching: lower case, accents removed, punctuation turned into spaces.
+
+    Args:
+        text (str): A title, artist, album or query.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char if char.isalnum() else " " for char in decomposed if not unicodedata.combining(char))
+
+
+class Track:
+    """
+    One song of the library.
+
+    Attributes:
+        path (str): The music file.
+        title (str): Shown in the playlist.
+        artist (str): Artist, empty if unknown.
+        album (str): Album, empty if unknown.
+    """
+
+    def __init__(self, path, title, artist="", album=""):
+        self.path = path
+        self.title = title
+        self.artist = artist
+        self.album = album
+
+    def words(self):
+        """Returns the normalised words that searches match against."""
+        return normalise(f"{self.title} {self.artist} {self.album}").split()
+
+
+def track_from_path(path, root):
+    """
+    Works out title, artist and album from where a file sits in the library.
+
+    ``root/Artist/Album/Title.mp3`` and ``root/Artist/Title.mp3`` use the folder
+    names, and a file name of the form ``Artist - Title`` names the artist itself.
+
+    Args:
+        path (str): The music file.
+        root (str): The library folder.
+    """
+    folder = os.path.dirname(os.path.relpath(path, root))
+    folders = folder.split(os.sep) if folder else []
+    title = os.path.splitext(os.path.basename(path))[0].strip()
+    artist = album = ""
+    if " - " in title:
+        artist, title = (part.strip() for part in title.split(" - ", 1))
+    if len(folders) >= 2:
+        artist, album = artist or folders[-2], folders[-1]
+    elif folders:
+        artist = artist or folders[0]
+    return Track(path, title, artist, album)
+
+
+def title_key(track):
+    """Sort key that puts tracks in alphabetical order of title."""
+    return normalise(track.title), track.path
+
+
+def scan_library(folder):
+    """
+    Lists every music file below a folder, sorted by title.
+
+    Args:
+        folder (str): The library folder.
+
+    Returns:
+        list: Track objects; empty if the folder does not exist.
+    """
+    tracks = []
+    for directory, subdirectories, files in os.walk(folder):
+        subdirectories.sort()
+        tracks.extend(track_from_path(os.path.join(directory, name), folder)
+                      for name in files if name.lower().endswith(MUSIC_EXTENSIONS))
+    tracks.sort(key=title_key)
+    return tracks
+
+
+class MusicIndex:
+    """
+    A prefix index over the words of every track's title, artist and album.
+
+    Tracks are queued with ``add`` and indexed a batch at a time by ``step``,
+    so a big library is indexed over several frames instead of stalling one.
+    Every batch becomes a segment: its words sorted, with the track id of each
+    word in a parallel array, so all the words of a segment starting with a
+    prefix are one bisect range. Segments are never merged, which keeps every
+    step as cheap as the first; a search bisects each of them and marks the
+    hits in a mask, so the result comes out in id order without sorting.
+
+    Track ids are positions in ``tracks``. Adding tracks in title order, as
+    scan_library returns them, makes id order the alphabetical order.
+
+    Attributes:
+        tracks (list): Every added Track, indexed or not, by id.
+        segments (list): (sorted words, numpy array of their track ids) of every indexed batch.
+        titles (list): (sorted normalised titles, their track ids) of every indexed batch.
+        indexed (int): Number of tracks indexed so far; the rest are queued.
+        version (int): Increases whenever more tracks become searchable.
+    """
+
+    BATCH = 250
+
+    def __init__(self):
+        self.tracks = []
+        self.segments = []
+        self.titles = []
+        self.indexed = 0
+        self.version = 0
+
+    def add(self, tracks):
+        """
+        Queues tracks for indexing.
+
+        Args:
+            tracks (list): Track objects.
+
+        Returns:
+            range: The ids given to the tracks.
+        """
+        start = len(self.tracks)
+        self.tracks.extend(tracks)
+        return range(start, len(self.tracks))
+
+    @property
+    def complete(self):
+        """True once every added track is searchable."""
+        return self.indexed == len(self.tracks)
+
+    def step(self, count=BATCH):
+        """
+        Indexes the next batch of queued tracks as a new segment.
+
+        Args:
+            count (int): Most tracks to index.
+
+        Returns:
+            bool: True if tracks were indexed.
+        """
+        end = min(len(self.tracks), self.indexed + count)
+        if end == self.indexed:
+            return False
+        pairs = []
+        titles = []
+        for track_id in range(self.indexed, end):
+            track = self.tracks[track_id]
+            pairs.extend((word, track_id) for word in set(track.words()))
+            titles.append((normalise(track.title).strip(), track_id))
+        pairs.sort()
+        titles.sort()
+        self.segments.append(([word for word, _ in pairs], np.array([track_id for _, track_id in pairs], np.int32)))
+        self.titles.append(([title for title, _ in titles], [track_id for _, track_id in titles]))
+        self.indexed = end
+        self.version += 1
+        return True
+
+    def build(self):
+        """Indexes everything that is still queued."""
+        while self.step():
+            pass
+
+    def prefix_mask(self, prefix):
+        """Returns a mask over the indexed tracks, True where a word starts with a prefix."""
+        mask = np.zeros(self.indexed, bool)
+        for words, ids in self.segments:
+            low = bisect.bisect_left(words, prefix)
+            high = bisect.bisect_left(words, prefix + LAST, low)
+            mask[ids[low:high]] = True
+        return mask
+
+    def search(self, query):
+        """
+        Finds the tracks matching a query.
+
+        Every word of the query must be the start of a word of the track's title,
+        artist or album, so "coun ro" finds "Take Me Home Country Roads".
+
+        Args:
+            query (str): What the user typed or dialed.
+
+        Returns:
+            list: Matching track ids in id order; a range over every indexed track for an empty query.
+        """
+        words = normalise(query).split()
+        if not words:
+            return range(self.indexed)
+        mask = self.prefix_mask(words[0])
+        for word in words[1:]:
+            mask &= self.prefix_mask(word)
+        return np.flatnonzero(mask).tolist()
+
+    def jump(self, prefix, ids=None):
+        """
+        Finds where the titles starting with a prefix begin, for jumping through the alphabet.
+
+        Args:
+            prefix (str): Usually one letter or digit.
+            ids (list): The list being shown, in id order; defaults to every indexed track.
+
+        Returns:
+            int: Position in ids of the first track whose title sorts at or after the prefix,
+            clamped to the last position.
+        """
+        ids = range(self.indexed) if ids is None else ids
+        if not ids:
+            return 0
+        prefix = normalise(prefix).strip()
+        first = None
+        for titles, title_ids in self.titles:
+            position = bisect.bisect_left(titles, prefix)
+            if position < len(titles) and (first is None or (titles[position], title_ids[position]) < first):
+                first = (titles[position], title_ids[position])
+        if first is None:
+            return len(ids) - 1
+        return min(bisect.bisect_left(ids, first[1]), len(ids) - 1)
@@ -0,0 +1,110 @@
+"""
+Colour palettes for the 8-bit indexed rendering mode.
+
+Tablets keep drawing with their usual RGB constants. When the screen is an 8-bit
+surface, SDL maps every colour to the nearest entry of the canonical palette
+below, so the screen ends up holding palette indices. The GPU then resolves
+those indices through a theme palette, which means switching theme is a
+256-entry upload rather than a re-render.
+
+Layout of the canonical palette:
+    0          black
+    1 - 4      the exact interface colours (PIP, MID, DARK and BRIGHT green)
+    5 - 164    phosphor ramp from black to full green
+    165 - 212  alert ramp from black to red
+    213 - 252  neutral ramp from black to white, used by icon artwork
+    253 - 255  unused (black)
+"""
+
+PALETTE_SIZE = 256
+
+PIP_COLOUR = (5, 250, 5)
+MID_PIP_COLOUR = (1, 150, 9)
+DARK_PIP_COLOUR = (1, 50, 9)
+BRIGHT_PIP_COLOUR = (0, 250, 0)
+RED = (255, 0, 0)
+
+INK_LEVELS = 160
+ALERT_LEVELS = 48
+NEUTRAL_LEVELS = 40
+
+# Theme name -> (phosphor colour, alert colour)
+THEMES = {
+    "green": (PIP_COLOUR, RED),
+    "amber": ((255, 176, 0), (255, 64, 32)),
+    "blue": ((80, 180, 255), (255, 72, 72)),
+    "white": ((235, 240, 230), (255, 80, 80)),
+}
+DEFAULT_THEME = "green"
+
+
+def _ramp(colour, levels):
+    """Returns ``levels`` colours fading from just above black up to ``colour``."""
+    return [tuple(round(channel * step / levels) for channel in colour) for step in range(1, levels + 1)]
+
+
+def _entry_kinds():
+    """Returns the (kind, level) description of every canonical palette entry."""
+    kinds = [("black", 0.0)]
+    kinds += [("ink", colour[1] / PIP_COLOUR[1])
+              for colour in (PIP_COLOUR, MID_PIP_COLOUR, DARK_PIP_COLOUR, BRIGHT_PIP_COLOUR)]
+    kinds += [("ink", step / INK_LEVELS) for step in range(1, INK_LEVELS + 1)]
+    kinds += [("alert", step / ALERT_LEVELS) for step in range(1, ALERT_LEVELS + 1)]
+    kinds += [("neutral", step / NEUTRAL_LEVELS) for step in range(1, NEUTRAL_LEVELS + 1)]
+    kinds += [("black", 0.0)] * (PALETTE_SIZE - len(kinds))
+    return kinds
+
+
+def canonical_palette():
+    """
+    Builds the palette that tablets draw into.
+
+    Returns:
+        list: 256 RGB tuples.
+    """
+    entries = [(0, 0, 0), PIP_COLOUR, MID_PIP_COLOUR, DARK_PIP_COLOUR, BRIGHT_PIP_COLOUR]
+    entries += _ramp(PIP_COLOUR, INK_LEVELS)
+    entries += _ramp(RED, ALERT_LEVELS)
+    entries += _ramp((255, 255, 255), NEUTRAL_LEVELS)
+    entries += [(0, 0, 0)] * (PALETTE_SIZE - len(entries))
+    return entries
+
+
+def theme_palette(theme=DEFAULT_THEME, brightness=1.0):
+    """
+    Builds the palette used to display the canonical indices in a given theme.
+
+    Args:
+        theme (str): One of the names in THEMES.
+        brightness (float): Multiplier applied to every entry, 0.0 - 1.0.
+
+    Returns:
+        list: 256 RGB tuples.
+    """
+    if theme not in THEMES:
+        raise ValueError(f"unknown theme '{theme}', expected one of {sorted(THEMES)}")
+
+    if theme == DEFAULT_THEME:
+        entries = canonical_palette()
+    else:
+        ink, alert = THEMES[theme]
+        neutral = (255, 255, 255)
+        tints = {"black": (0, 0, 0), "ink": ink, "alert": alert, "neutral": neutral}
+        entries = [tuple(round(channel * level) for channel in tints[kind]) for kind, level in _entry_kinds()]
+
+    if brightness != 1.0:
+        entries = [tuple(round(channel * brightness) for channel in colour) for colour in entries]
+    return entries
+
+
+def palette_bytes(entries):
+    """
+    Packs palette entries into the 256x1 RGB texture layout used by the shader.
+
+    Args:
+        entries (list): 256 RGB tuples.
+
+    Returns:
+        bytes: 768 bytes of packed RGB data.
+    """
+    return bytes(channel for colour in entries for channel in colour)
@@ -0,0 +1,116 @@
+import glob
+import os
+
+import clock as app_clock
+
+ACTIVE = "active"
+DIM = "dim"
+BLANK = "blank"
+
+
+class IdlePolicy:
+    """
+    Decides when the device dims and blanks after a period without input.
+
+    Attributes:
+        dim_after (float): Seconds without input before dimming, 0 disables dimming.
+        blank_after (float): Seconds without input before blanking, 0 disables blanking.
+        dim_level (float): Display brightness while dimmed, 0.0 - 1.0.
+        update_interval (float): Seconds between redraws while dimmed; the clock only shows minutes.
+        state (str): ACTIVE, DIM or BLANK.
+        last_input (float): Monotonic time of the last input.
+    """
+
+    def __init__(self, dim_after=60, blank_after=300, dim_level=0.3, update_interval=60, clock=None):
+        self.dim_after = dim_after
+        self.blank_after = blank_after
+        self.dim_level = dim_level
+        self.update_interval = update_interval
+        self.clock = clock or app_clock.monotonic
+        self.state = ACTIVE
+        self.last_input = self.clock()
+
+    @property
+    def enabled(self):
+        """True when either dimming or blanking is configured."""
+        return bool(self.dim_after or self.blank_after)
+
+    def touch(self):
+        """
+        Records an input.
+
+        Returns:
+            bool: True if the device was dimmed or blanked and is now active again.
+        """
+        self.last_input = self.clock()
+        woke = self.state != ACTIVE
+        self.state = ACTIVE
+        return woke
+
+    def update(self):
+        """
+        Advances the state according to the time since the last input.
+
+        Returns:
+            str: The new state.
+        """
+        idle = self.clock() - self.last_input
+        if self.blank_after and idle >= self.blank_after:
+            self.state = BLANK
+        elif self.dim_after and idle >= self.dim_after:
+            self.state = DIM
+        else:
+            self.state = ACTIVE
+        return self.state
+
+    def seconds_until_wakeup(self, wall_time=None):
+        """
+        Returns how long an idle loop may sleep.
+
+        The sleep ends at the next state change or the next redraw boundary,
+        whichever comes first. Redraws are aligned to the wall clock so the
+        dimmed clock flips exactly on the minute.
+
+        Args:
+            wall_time (float): Unix time, defaults to now.
+        """
+        if wall_time is None:
+            wall_time = app_clock.time()
+        timeout = self.update_interval - (wall_time % self.update_interval)
+        if self.state == DIM and self.blank_after:
+            timeout = min(timeout, self.blank_after - (self.clock() - self.last_input))
+        return max(timeout, 0.0)
+
+
+class Backlight:
+    """
+    Controls a Linux sysfs backlight, which saves far more power than dark pixels.
+
+    Attributes:
+        path (str): The /sys/class/backlight/<name> directory.
+        max_brightness (int): The hardware maximum.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str): Backlight directory, defaults to the first one found.
+        """
+        if path is None:
+            found = sorted(glob.glob("/sys/class/backlight/*"))
+            if not found:
+                raise FileNotFoundError("no backlight found under /sys/class/backlight")
+            path = found[0]
+        self.path = path
+        with open(os.path.join(path, "max_brightness")) as file:
+            self.max_brightness = int(file.read())
+
+    def set_level(self, level):
+        """
+        Sets the backlight.
+
+        Args:
+            level (float): Brightness from 0.0 (off) to 1.0 (full).
+        """
+        with open(os.path.join(self.path, "brightness"), "w") as file:
+            file.write(str(round(self.max_brightness * level)))
@@ -0,0 +1,320 @@
+"""
+Presents frames from a separate process, so a slow present never holds up the UI.
+
+The UI process draws into its screen surface as usual and copies each finished
+frame into one of two slots of a shared memory framebuffer. The present
+process owns the window, the OpenGL context and the CRT shader. It copies the
+newest frame out of its slot, hands the slot straight back and then presents
+at its own pace. The pipes only carry slot numbers, display settings and input
+events, never pixels.
+
+When the present process stalls (a vsync wait, a busy GPU, a shader that runs
+over budget) both slots end up in use and the UI simply drops frames until one
+comes back. Input handling and the UI frame time do not change. Mouse and key
+events on the window are forwarded to the UI process's event queue, and evdev
+input is read in the UI process anyway.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import pygame
+
+import metrics
+import palette
+import render_quality
+
+SLOTS = 2
+# How often the present process checks its window for input while no frames arrive
+EVENT_INTERVAL = 0.02
+# Window events handed to the UI process, with the attributes its handlers read
+FORWARDED_EVENTS = {
+    pygame.QUIT: (),
+    pygame.MOUSEBUTTONDOWN: ("button", "pos"),
+    pygame.MOUSEWHEEL: ("x", "y"),
+    pygame.KEYDOWN: ("key", "unicode", "mod"),
+}
+
+
+def new_screen(size, indexed):
+    """
+    Creates a screen surface in the layout MainApp draws into.
+
+    Args:
+        size (tuple): Width and height.
+        indexed (bool): An 8-bit palette surface instead of 24-bit RGB.
+    """
+    if indexed:
+        screen = pygame.Surface(size, 0, 8)
+        screen.set_palette(palette.canonical_palette())
+        return screen
+    return pygame.Surface(size, 0, 24, (255, 65280, 16711680, 0))
+
+
+def pixels(surface):
+    """
+    Returns the pixel bytes of a surface as a writable flat memoryview, without copying.
+
+    The surface stays locked, so it cannot be blitted, until the view is released; use it in a with block.
+    """
+    return memoryview(surface.get_view("1")).cast("B")
+
+
+def open_engine(screen, size, theme, framebuffer, quality, gpu_budget):
+    """
+    Opens the window and the CRT shader of the present process.
+
+    Falls back to plain SDL blits when no OpenGL context can be created, e.g. on a
+    headless machine, so the split still works without the shader.
+
+    Returns:
+        Graphic_engine: The output that presents screen.
+    """
+    from crt_shader import Graphic_engine
+
+    pygame.display.set_caption("PAUL-BOY")
+    if framebuffer is not None:
+        pygame.display.set_mode(size)
+        return Graphic_engine(screen, theme=theme, framebuffer=framebuffer, quality=quality, gpu_budget=gpu_budget)
+    try:
+        pygame.display.set_mode(size, pygame.DOUBLEBUF | pygame.OPENGL)
+        return Graphic_engine(screen, theme=theme, quality=quality, gpu_budget=gpu_budget)
+    except Exception as error:
+        print(f"present process: no OpenGL output ({type(error).__name__}: {error}), presenting without the shader")
+        pygame.display.set_mode(size)
+        return Graphic_engine(screen, cpu_only=True, theme=theme)
+
+
+def forward_events(feedback):
+    """Sends the window's input events to the UI process and drops the rest."""
+    for event in pygame.event.get():
+        names = FORWARDED_EVENTS.get(event.type)
+        if names is not None:
+            feedback.send(("event", event.type, {name: getattr(event, name) for name in names}))
+
+
+def present_main(shm_name, size, indexed, theme, framebuffer, quality, gpu_budget, video_driver, control, feedback):
+    """
+    Entry point of the present process.
+
+    Waits for frames and settings on the control pipe, presents the newest frame
+    and reports on the feedback pipe: ("free", slot) once a slot may be written
+    again, ("presented", seconds) after every present and ("event", type, attributes)
+    for window input. Exits on ("quit",) or when the UI process goes away.
+
+    Args:
+        shm_name (str): Name of the shared memory framebuffer.
+        size (tuple): Width and height of a frame.
+        indexed (bool): Frames are 8-bit palette indices.
+        theme (str): Colour theme of indexed frames.
+        framebuffer (str): Framebuffer device to write to instead of opening a window, if any.
+        quality (str): Post-processing tier, one of render_quality.TIERS.
+        gpu_budget (float): GPU milliseconds per frame before the quality steps down.
+        video_driver (str): SDL_VIDEODRIVER of the UI process before it switched to the dummy driver.
+        control (multiprocessing.connection.Connection): Messages from the UI process.
+        feedback (multiprocessing.connection.Connection): Messages to the UI process.
+    """
+    os.environ["SDL_AUDIODRIVER"] = "dummy"  # sound stays with the UI process
+    if framebuffer is not None:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    elif video_driver is None:
+        os.environ.pop("SDL_VIDEODRIVER", None)
+    else:
+        os.environ["SDL_VIDEODRIVER"] = video_driver
+    pygame.display.init()
+    shm = shared_memory.SharedMemory(shm_name)
+    screen = new_screen(size, indexed)
+    with pixels(screen) as view:
+        frame_bytes = view.nbytes
+    engine = open_engine(screen, size, theme, framebuffer, quality, gpu_budget)
+
+    try:
+        while True:
+            try:
+                if not control.poll(EVENT_INTERVAL):
+                    forward_events(feedback)
+                    continue
+                newest = None
+                redraw = False
+                while control.poll():
+                    message = control.recv()
+                    kind = message[0]
+                    if kind == "frame":
+                        if newest is not None:
+                            feedback.send(("free", newest))  # overtaken before it was shown
+                        newest = message[1]
+                    elif kind == "brightness":
+                        engine.set_brightness(message[1])
+                        redraw = True
+                    elif kind == "shader":
+                        engine.set_shader_enabled(message[1])
+                        redraw = True
+                    elif kind == "theme":
+                        engine.set_theme(message[1])
+                        redraw = True
+                    elif kind == "quit":
+                        return
+                if newest is not None:
+                    with pixels(screen) as view:
+                        view[:] = shm.buf[newest * frame_bytes:(newest + 1) * frame_bytes]
+                    feedback.send(("free", newest))
+                    redraw = True
+                if redraw:
+                    started = time.perf_counter()
+                    engine.render()
+                    feedback.send(("presented", time.perf_counter() - started))
+                forward_events(feedback)
+            except (EOFError, BrokenPipeError):
+                return  # the UI process is gone
+    finally:
+        shm.close()
+        pygame.quit()
+
+
+class PresentClient:
+    """
+    The UI process's end of the present process; MainApp uses it in place of a Graphic_engine.
+
+    Attributes:
+        screen (pygame.Surface): The surface MainApp draws into.
+        size (tuple): Width and height of a frame.
+        indexed (bool): The screen holds 8-bit palette indices.
+        theme (str): Colour theme of an indexed screen.
+        framebuffer (str): Framebuffer device the present process writes to, if any.
+        quality (str): Post-processing tier of the OpenGL output.
+        gpu_budget (float): GPU milliseconds per frame before the quality steps down.
+        video_driver (str): SDL video driver the present process opens its window with.
+        shm (multiprocessing.shared_memory.SharedMemory): The two frame slots.
+        free_slots (queue.SimpleQueue): Slots the UI may write the next frame into.
+        frames_sent (int): Frames handed to the present process.
+        frames_dropped (int): Frames not sent because both slots were still in use.
+        process (multiprocessing.Process): The present process, once started.
+    """
+
+    def __init__(self, screen, theme=palette.DEFAULT_THEME, framebuffer=None, quality=render_quality.OFF,
+                 gpu_budget=10.0, video_driver=None):
+        self.screen = screen
+        self.size = screen.get_size()
+        self.indexed = screen.get_bitsize() == 8
+        self.theme = theme
+        self.framebuffer = framebuffer
+        self.quality = quality
+        self.gpu_budget = gpu_budget
+        self.video_driver = video_driver
+        with pixels(screen) as view:
+            self.frame_bytes = view.nbytes
+        self.shm = None
+        self.free_slots = queue.SimpleQueue()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.process = None
+        self.control = None
+        self.feedback = None
+        self.thread = None
+        self.stopping = False
+
+    def start(self):
+        """Creates the shared framebuffer and starts the present process and the feedback reader thread."""
+        self.shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * SLOTS)
+        for slot in range(SLOTS):
+            self.free_slots.put(slot)
+        control_reader, self.control = multiprocessing.Pipe(duplex=False)
+        self.feedback, feedback_writer = multiprocessing.Pipe(duplex=False)
+        # A fresh interpreter: a fork would inherit the UI's pygame state and sound card
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(
+            target=present_main, name="paulboy-present", daemon=True,
+            args=(self.shm.name, self.size, self.indexed, self.theme, self.framebuffer, self.quality,
+                  self.gpu_budget, self.video_driver, control_reader, feedback_writer))
+        self.process.start()
+        control_reader.close()
+        feedback_writer.close()
+        self.thread = threading.Thread(target=self.read_loop, name="present-feedback", daemon=True)
+        self.thread.start()
+
+    def read_loop(self):
+        """Takes back freed slots, records present times and posts forwarded input until the process exits."""
+        while True:
+            try:
+                message = self.feedback.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "free":
+                self.free_slots.put(message[1])
+            elif kind == "presented":
+                metrics.PRESENT_SECONDS.observe(message[1])
+            elif kind == "event":
+                pygame.event.post(pygame.event.Event(message[1], message[2]))
+        if not self.stopping:
+            # The window was closed or the present process died; the UI cannot show anything any more
+            print("present process exited")
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    def send(self, *message):
+        """Sends a control message, ignoring a present process that already exited."""
+        try:
+            self.control.send(message)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def render(self):
+        """Copies the screen into a free slot and hands it to the present process, or drops the frame."""
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            self.frames_dropped += 1
+            metrics.PRESENT_DROPPED_FRAMES.inc()
+            return
+        with pixels(self.screen) as view:
+            self.shm.buf[slot * self.frame_bytes:(slot + 1) * self.frame_bytes] = view
+        self.frames_sent += 1
+        self.send("frame", slot)
+
+    def set_brightness(self, level):
+        """Scales the output brightness, see Graphic_engine.set_brightness."""
+        self.send("brightness", level)
+
+    def set_shader_enabled(self, enabled):
+        """Turns the CRT effect on or off, see Graphic_engine.set_shader_enabled."""
+        self.send("shader", enabled)
+
+    def set_theme(self, theme):
+        """Switches the colour theme of an indexed screen, see Graphic_engine.set_theme."""
+        self.theme = theme
+        self.send("theme", theme)
+
+    def stop(self):
+        """Stops the present process and the reader thread and frees the shared framebuffer."""
+        if self.process is None:
+            return
+        self.stopping = True
+        self.send("quit")
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.thread.join(timeout=1)
+        self.control.close()
+        self.feedback.close()
+        self.shm.close()
+        self.shm.unlink()
+        self.process = None
+
+    def close(self):
+        """Stops the present process, which closes its output; the same call closes a Graphic_engine's output."""
+        self.stop()
+
+    def report(self):
+        """Returns how many frames were presented and how many were dropped while the present process was busy."""
+        total = self.frames_sent + self.frames_dropped
+        dropped = self.frames_dropped / total * 100 if total else 0.0
+        return (f"present process: {self.frames_sent} frames sent, {self.frames_dropped} dropped ({dropped:.1f}%), "
+                f"present mean {metrics.PRESENT_SECONDS.sum / max(1, metrics.PRESENT_SECONDS.count) * 1000:.1f} ms")
+
+    def __call__(self):
+        return self.render()
@@ -0,0 +1,68 @@
+OFF = "off"
+LOW = "low"
+HIGH = "high"
+# Ordered from cheapest to richest
+TIERS = (OFF, LOW, HIGH)
+
+
+class QualityGovernor:
+    """
+    Steps the post-processing quality down when the GPU cannot keep within its budget.
+
+    GPU frame times are collected over a window of frames; when the median of a
+    full window exceeds the budget, the tier drops one step and a new window starts.
+    The median ignores one-off spikes such as texture uploads after a tab switch.
+    Tiers never step back up on their own, so the picture does not flicker between them.
+
+    Attributes:
+        tier (str): Current tier, one of TIERS.
+        budget (float): Allowed GPU time per frame in milliseconds, 0 disables stepping down.
+        window (int): Number of frames judged together.
+        samples (list): GPU frame times of the current window in milliseconds.
+        changes (list): (from_tier, to_tier, median_ms) of every step down.
+    """
+
+    def __init__(self, tier=OFF, budget=10.0, window=30):
+        if tier not in TIERS:
+            raise ValueError(f"unknown quality tier '{tier}', expected one of {', '.join(TIERS)}")
+        self.tier = tier
+        self.budget = budget
+        self.window = window
+        self.samples = []
+        self.changes = []
+
+    def set_tier(self, tier):
+        """
+        Selects a tier by hand and starts a new measurement window.
+
+        Args:
+            tier (str): One of TIERS.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"unknown quality tier '{tier}', expected one of {', '.join(TIERS)}")
+        self.tier = tier
+        self.samples.clear()
+
+    def record(self, milliseconds):
+        """
+        Adds the GPU time of one frame.
+
+        Args:
+            milliseconds (float): GPU time spent on the frame.
+
+        Returns:
+            bool: True if the tier was stepped down.
+        """
+        if not self.budget or self.tier == OFF:
+            return False
+        self.samples.append(milliseconds)
+        if len(self.samples) < self.window:
+            return False
+        median = sorted(self.samples)[len(self.samples) // 2]
+        self.samples.clear()
+        if median <= self.budget:
+            return False
+        lower = TIERS[TIERS.index(self.tier) - 1]
+        self.changes.append((self.tier, lower, median))
+        self.tier = lower
+        return True
@@ -0,0 +1,24 @@
+#version 300 es
+precision mediump float;
+uniform sampler2D Texture;
+uniform vec2 direction;
+uniform float threshold;
+
+out vec4 color;
+in vec2 v_text;
+
+// Only the part of a pixel above the threshold glows
+vec3 bright(vec2 uv) {
+  return max(texture(Texture, uv).rgb - threshold, 0.0);
+}
+
+// One direction of a separable 9-tap gaussian, using linear filtering to read two texels per tap
+void main() {
+  vec2 uv = vec2(v_text.x, 1.0 - v_text.y);
+  vec2 near = direction * 1.3846153846;
+  vec2 far = direction * 3.2307692308;
+  vec3 sum = bright(uv) * 0.2270270270;
+  sum += (bright(uv + near) + bright(uv - near)) * 0.3162162162;
+  sum += (bright(uv + far) + bright(uv - far)) * 0.0702702703;
+  color = vec4(sum, 1.0);
+}
@@ -0,0 +1,18 @@
+#version 300 es
+precision mediump float;
+uniform sampler2D Texture;
+uniform sampler2D Bloom;
+uniform float bloom_strength;
+uniform float vignette;
+
+out vec4 color;
+in vec2 v_text;
+
+// Adds the bloom and darkens the corners like the edge of a curved tube
+void main() {
+  vec2 uv = vec2(v_text.x, 1.0 - v_text.y);
+  vec3 image = texture(Texture, uv).rgb + texture(Bloom, uv).rgb * bloom_strength;
+  vec2 off_center = uv - vec2(0.5, 0.5);
+  image *= clamp(1.0 - vignette * dot(off_center, off_center) * 2.0, 0.0, 1.0);
+  color = vec4(image, 1.0);
+}
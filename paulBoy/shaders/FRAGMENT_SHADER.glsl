@@ -1,13 +1,26 @@
 #version 300 es
 precision mediump float;
 uniform sampler2D Texture;
+uniform sampler2D Palette;
 
 out vec4 color;
 in vec2 v_text;
 uniform int mode;
+uniform int indexed;
+uniform float brightness;
+
+// In indexed mode Texture holds 8-bit palette indices, resolved through the 256x1 Palette
+vec3 screen_colour(vec2 uv) {
+  if (indexed == 1) {
+    float index = texture(Texture, uv).r;
+    return texture(Palette, vec2((index * 255.0 + 0.5) / 256.0, 0.5)).rgb;
+  }
+  return texture(Texture, uv).rgb;
+}
+
 void main() {
   if (mode == 0){
-    color = vec4(texture(Texture, v_text).rgb, 1.0);
+    color = vec4(screen_colour(v_text), 1.0);
   }
   else{
     float flatness = 1.0;
@@ -26,10 +39,11 @@ void main() {
         v_text2.y > 1.0 || v_text2.y < 0.0){
       color=vec4(0.0, 0.0, 0.0, 1.0);
     } else {
-      color = vec4(texture(Texture, v_text2).rgb, 1.0);
+      color = vec4(screen_colour(v_text2), 1.0);
       float fv = fract(v_text2.y * float(textureSize(Texture,0).y));
       fv=min(1.0, 0.8+0.5*min(fv, 1.0-fv));
       color.rgb*=fv;
     }
   }
-}
\ No newline at end of file
+  color.rgb *= brightness;
+}
@@ -0,0 +1,17 @@
+#version 300 es
+precision mediump float;
+uniform sampler2D Texture;
+uniform sampler2D Previous;
+uniform float persistence;
+
+out vec4 color;
+in vec2 v_text;
+
+// Blends the new frame with the fading glow of the previous ones
+void main() {
+  // Offscreen targets are stored bottom-up, unlike the uploaded pygame screen
+  vec2 uv = vec2(v_text.x, 1.0 - v_text.y);
+  vec3 now = texture(Texture, uv).rgb;
+  vec3 before = texture(Previous, uv).rgb * persistence;
+  color = vec4(max(now, before), 1.0);
+}
@@ -0,0 +1,15 @@
+#version 300 es
+precision mediump float;
+uniform sampler2D Glyphs;
+uniform sampler2D Sprites;
+
+out vec4 color;
+in vec2 uv;
+in vec4 v_tint;
+in float v_page;
+
+// Glyphs only store coverage and take their colour from the tint; sprites keep their own colours
+void main() {
+  vec4 texel = v_page < 0.5 ? vec4(1.0, 1.0, 1.0, texture(Glyphs, uv).r) : texture(Sprites, uv);
+  color = texel * v_tint;
+}
@@ -0,0 +1,22 @@
+#version 300 es
+// One corner of the unit quad, shared by every instance
+in vec2 corner;
+// Per instance: destination rect in pixels, atlas rect in texture coordinates, colour and atlas page
+in vec4 rect;
+in vec4 source;
+in vec4 tint;
+in float page;
+uniform vec2 target_size;
+
+out vec2 uv;
+out vec4 v_tint;
+out float v_page;
+
+void main() {
+  vec2 position = rect.xy + corner * rect.zw;
+  // Pixel row 0 goes to texture row 0, the same layout as a screen uploaded from pygame
+  gl_Position = vec4(position / target_size * 2.0 - 1.0, 0.0, 1.0);
+  uv = source.xy + corner * source.zw;
+  v_tint = tint;
+  v_page = page;
+}
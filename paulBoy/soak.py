@@ -0,0 +1,360 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pygame
+
+import clock
+import metrics
+from clock import ManualClock
+from event_bus import ALARM_ENDED, MINUTE_STARTED
+from input_actions import INPUT_ACTION, NEXT_TAB, SCROLL_DOWN, SCROLL_UP, SELECT
+
+HOUR = 3600
+DAY = 24 * HOUR
+MB = 1024 * 1024
+# Real seconds an alarm that rang out may take to fade before it counts as stuck
+ALARM_FADE_WAIT = 1.0
+# Files and folders the app reads relative to its working directory
+RESOURCES = ("media", "shaders")
+
+
+def open_files():
+    """Returns the number of open file descriptors, or 0 where /proc is not available."""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return 0
+
+
+class Sample:
+    """
+    Memory and resource use at one point of the soak.
+
+    Attributes:
+        hours (float): Simulated hours since the start.
+        frames (int): Frames drawn so far.
+        rss (int): Resident set size in bytes.
+        traced (int): Bytes allocated by Python and still alive, as seen by tracemalloc.
+        threads (int): Live threads.
+        files (int): Open file descriptors.
+    """
+
+    def __init__(self, hours, frames):
+        self.hours = hours
+        self.frames = frames
+        self.rss = metrics.resident_memory()
+        self.traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        self.threads = threading.active_count()
+        self.files = open_files()
+
+    def as_dict(self):
+        return {"hours": round(self.hours, 2), "frames": self.frames, "rss_mb": round(self.rss / MB, 2),
+                "traced_mb": round(self.traced / MB, 3), "threads": self.threads, "files": self.files}
+
+
+class SoakTest:
+    """
+    Runs MainApp headlessly for days of simulated time and watches its memory.
+
+    Application time is a ManualClock moved a fixed step per frame, so a week
+    of clock ticks, day rollovers and alarm minutes passes in minutes. Every
+    simulated hour the scenario cycles through all tabs with the same input
+    actions the encoder posts, plays and pauses a song, and once a day it
+    checks off every habit and sets an alarm that rings. On even days the alarm
+    is snoozed; on odd days it rings out its minute, and once the next minute
+    starts its channel must be quiet again.
+
+    The first hours are a warm-up in which caches fill up. After it, tracemalloc
+    takes a baseline snapshot, and RSS, traced memory, threads and open files
+    are sampled regularly. At the end the growth since the warm-up is compared
+    with the limits, and the allocation sites that grew the most are listed
+    with their tracebacks.
+
+    The app runs in a scratch working directory that links to the media, so
+    habit saves and the YouTube database never touch the real ones.
+
+    Attributes:
+        days (float): Simulated days to run.
+        frame_interval (float): Simulated seconds per frame.
+        warmup_hours (float): Simulated hours before the baseline is taken.
+        sample_hours (float): Simulated hours between samples.
+        max_rss_growth (float): Allowed RSS growth after the warm-up, in MB.
+        max_traced_growth (float): Allowed traced memory growth after the warm-up, in MB.
+        top (int): Number of allocation sites in the report.
+        samples (list): Sample objects, the first one taken at the end of the warm-up.
+        alarms (int): Alarms that rang.
+        ended_alarms (int): Alarms that rang out their minute without a snooze.
+        stuck_alarms (int): Ended alarms whose sound still played after the next minute started.
+    """
+
+    def __init__(self, days=7, frame_interval=30.0, warmup_hours=12, sample_hours=6, max_rss_growth=16.0,
+                 max_traced_growth=4.0, top=10, traceback_frames=25):
+        self.days = days
+        self.frame_interval = frame_interval
+        self.warmup_hours = warmup_hours
+        self.sample_hours = sample_hours
+        self.max_rss_growth = max_rss_growth
+        self.max_traced_growth = max_traced_growth
+        self.top = top
+        self.traceback_frames = traceback_frames
+        self.samples = []
+        self.manual = None
+        self.app = None
+        self.frames = 0
+        self.alarms = 0
+        self.ringing = False
+        self.snooze_alarms = True
+        self.alarm_ended = False
+        self.ended_alarms = 0
+        self.stuck_alarms = 0
+
+    def step(self, actions=()):
+        """
+        Posts input actions, draws one frame and moves the clock on.
+
+        Args:
+            actions (tuple): Input actions handled in this frame.
+        """
+        for action in actions:
+            pygame.event.post(pygame.event.Event(INPUT_ACTION, action=action, timestamp=time.monotonic()))
+        self.app.step()
+        if self.app.alarm_clock_tab.alarm_triggered_flag:
+            self.alarms += not self.ringing
+            if self.snooze_alarms:
+                    pygame.event.post(pygame.event.Event(INPUT_ACTION, action=SELECT, timestamp=time.monotonic()))
+        self.ringing = self.app.alarm_clock_tab.alarm_triggered_flag
+        self.frames += 1
+        self.manual.advance(self.frame_interval)
+
+    def on_alarm_ended(self, event):
+        """Remembers that an alarm rang out, so the next minute checks that it went quiet."""
+        self.ended_alarms += 1
+        self.alarm_ended = True
+
+    def on_minute_started(self, event):
+        """Counts an alarm that rang out as stuck if its channel is still busy once the next minute starts."""
+        if not self.alarm_ended:
+            return
+        self.alarm_ended = False
+        # The sound fades out in real time while the clock is simulated, so give it a moment
+        deadline = time.monotonic() + ALARM_FADE_WAIT
+        while self.app.audio.alarm_playing() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if self.app.audio.alarm_playing():
+            self.stuck_alarms += 1
+
+    def switch_to(self, name):
+        """Moves to a tab with NEXT_TAB actions, the way a user would."""
+        while self.app.tabs.current != name:
+            self.step((NEXT_TAB,))
+
+    def hourly(self, hour):
+        """
+        The input of one simulated hour.
+
+        Args:
+            hour (int): Hours since the start.
+        """
+        # Visit every tab and move around in it
+        for _ in self.app.tabs.order:
+            self.step((NEXT_TAB, SCROLL_DOWN, SCROLL_DOWN, SCROLL_UP))
+        # Play a different song every hour and pause it again a few frames later
+        radio = self.app.radio_player_tab
+        if radio.rows:
+            self.switch_to("radio")
+            radio.current_index = hour % len(radio.rows)
+            self.step((SELECT,))
+            for _ in range(3):
+                self.step()
+            radio.current_index = radio.pause_index - 1
+            self.step((SCROLL_DOWN,))
+        if hour % 24 == 18:
+            self.daily(hour // 24)
+
+    def daily(self, day):
+        """
+        Checks off every habit and sets an alarm a few minutes ahead.
+
+        Args:
+            day (int): Days since the start; the alarm is snoozed on even days and rings out on odd ones.
+        """
+        self.switch_to("habit")
+        for _ in range(5):
+            self.step((SELECT, SCROLL_DOWN))
+        for _ in range(5):
+            self.step((SCROLL_UP,))
+        alarm = self.app.alarm_clock_tab
+        due = time.localtime(self.manual.time() + 5 * 60)
+        alarm.increment_h, alarm.increment_m = due.tm_hour, due.tm_min
+        alarm.set_alarm()
+        self.snooze_alarms = day % 2 == 0
+
+    def sample(self):
+        """Collects garbage and records a sample."""
+        gc.collect()
+        sample = Sample((self.manual.monotonic() - self.start) / HOUR, self.frames)
+        self.samples.append(sample)
+        return sample
+
+    def run(self, progress=None, **app_options):
+        """
+        Runs the soak.
+
+        Args:
+            progress: Called with every Sample as it is taken, e.g. to print it.
+            **app_options: Extra MainApp arguments, e.g. indexed=True.
+
+        Returns:
+            dict: The report; "passed" is False if memory grew beyond a limit or an alarm kept playing.
+        """
+        source = os.path.dirname(os.path.abspath(__file__))
+        workdir = tempfile.mkdtemp(prefix="paulboy-soak-")
+        previous_dir = os.getcwd()
+        for name in RESOURCES:
+            os.symlink(os.path.join(source, name), os.path.join(workdir, name))
+        self.manual = ManualClock(time.time())
+        previous_clock = clock.set_clock(self.manual)
+        tracemalloc.start(self.traceback_frames)
+        try:
+            os.chdir(workdir)
+            from MainApp import MainApp
+            from power_save import IdlePolicy
+
+            app_options.setdefault("framebuffer", os.path.join(workdir, "frames.fb"))
+            self.app = MainApp(idle_policy=IdlePolicy(dim_after=0, blank_after=0), **app_options)
+            self.app.wait_until_ready()  # every tab is built before the simulated days start
+            self.app.bus.subscribe(ALARM_ENDED, self.on_alarm_ended)
+            self.app.bus.subscribe(MINUTE_STARTED, self.on_minute_started)
+            self.app.frame_delay = 0
+            pygame.event.clear()
+            self.start = self.manual.monotonic()
+            end = self.start + self.days * DAY
+            next_sample = self.start + self.warmup_hours * HOUR
+            hour = 0
+            baseline = None
+            while self.manual.monotonic() < end:
+                if self.manual.monotonic() >= self.start + hour * HOUR:
+                    self.hourly(hour)
+                    hour += 1
+                else:
+                    self.step()
+                if self.manual.monotonic() >= next_sample:
+                    if baseline is None:
+                        # Taken before the first sample, whose RSS then includes the snapshot itself
+                        baseline = tracemalloc.take_snapshot()
+                    sample = self.sample()
+                    if progress is not None:
+                        progress(sample)
+                    next_sample += self.sample_hours * HOUR
+            self.app.radio_player_tab.stop_music()
+            self.sample()
+            final = tracemalloc.take_snapshot()
+            self.app.crt_shader.close()  # a Graphic_engine or, in present process mode, a PresentClient
+        finally:
+            tracemalloc.stop()
+            clock.set_clock(previous_clock)
+            os.chdir(previous_dir)
+            shutil.rmtree(workdir, ignore_errors=True)
+        return self.report(baseline or final, final)
+
+    def growth_sites(self, baseline, final):
+        """
+        Lists the allocation sites whose memory grew the most after the warm-up.
+
+        Returns:
+            list: One dict per site with the growth in KB and blocks and the traceback, innermost call last.
+        """
+        # The soak's own samples and snapshots are not the app's
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+                  tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        stats = final.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), "traceback")
+        sites = []
+        for stat in stats[:self.top]:
+            if stat.size_diff <= 0:
+                break
+            sites.append({"growth_kb": round(stat.size_diff / 1024, 1), "blocks": stat.count_diff,
+                          "size_kb": round(stat.size / 1024, 1),
+                          "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]})
+        return sites
+
+    def report(self, baseline, final):
+        """Builds the report from the samples and the two snapshots."""
+        first, last = self.samples[0], self.samples[-1]
+        rss_growth = (last.rss - first.rss) / MB
+        traced_growth = (last.traced - first.traced) / MB
+        days = max((last.hours - first.hours) / 24, 1e-9)
+        return {
+            "days": self.days,
+            "frames": self.frames,
+            "alarms": self.alarms,
+            "ended_alarms": self.ended_alarms,
+            "stuck_alarms": self.stuck_alarms,
+            "rss_growth_mb": round(rss_growth, 2),
+            "rss_growth_mb_per_day": round(rss_growth / days, 2),
+            "traced_growth_mb": round(traced_growth, 3),
+            "traced_growth_mb_per_day": round(traced_growth / days, 3),
+            "thread_growth": last.threads - first.threads,
+            "file_growth": last.files - first.files,
+            "passed": (rss_growth <= self.max_rss_growth and traced_growth <= self.max_traced_growth
+                       and not self.stuck_alarms),
+            "limits_mb": {"rss": self.max_rss_growth, "traced": self.max_traced_growth},
+            "samples": [sample.as_dict() for sample in self.samples],
+            "growth_sites": self.growth_sites(baseline, final),
+        }
+
+
+def print_report(report):
+    """Prints the verdict and the allocation sites that grew the most."""
+    verdict = "PASSED" if report["passed"] else "FAILED"
+    print(f"{verdict}: {report['days']} days, {report['frames']} frames, {report['alarms']} alarms "
+          f"({report['ended_alarms']} rang out, {report['stuck_alarms']} still playing a minute later)")
+    print(f"RSS {report['rss_growth_mb']:+.2f} MB ({report['rss_growth_mb_per_day']:+.2f} MB/day), "
+          f"traced {report['traced_growth_mb']:+.3f} MB ({report['traced_growth_mb_per_day']:+.3f} MB/day), "
+          f"threads {report['thread_growth']:+d}, open files {report['file_growth']:+d}")
+    for site in report["growth_sites"]:
+        print(f"\n{site['growth_kb']:+.1f} KB in {site['blocks']:+d} blocks ({site['size_kb']:.1f} KB now)")
+        for line in site["traceback"][-6:]:
+            print(f"    {line}")
+
+
+def main():
+    """Runs a soak from the command line; exits with 1 if memory grew beyond a limit or an alarm kept playing."""
+    parser = argparse.ArgumentParser(description="Run PAUL-BOY headlessly for days of simulated time and "
+                                                 "check it for memory growth")
+    parser.add_argument("--days", type=float, default=7, help="simulated days to run")
+    parser.add_argument("--frame-interval", metavar="SECONDS", type=float, default=30.0,
+                        help="simulated time per frame")
+    parser.add_argument("--warmup-hours", type=float, default=12, help="simulated hours before the baseline")
+    parser.add_argument("--sample-hours", type=float, default=6, help="simulated hours between samples")
+    parser.add_argument("--max-rss-growth", metavar="MB", type=float, default=16.0,
+                        help="allowed RSS growth after the warm-up")
+    parser.add_argument("--max-traced-growth", metavar="MB", type=float, default=4.0,
+                        help="allowed growth of Python allocations after the warm-up")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites in the report")
+    parser.add_argument("--indexed", action="store_true", help="soak with the 8-bit palette surface")
+    parser.add_argument("--output", metavar="PATH", help="write the report as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    soak = SoakTest(args.days, args.frame_interval, args.warmup_hours, args.sample_hours, args.max_rss_growth,
+                    args.max_traced_growth, args.top)
+    report = soak.run(progress=lambda sample: print(json.dumps(sample.as_dict()), flush=True),
+                      indexed=args.indexed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print_report(report)
+    if not report["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+Offline loudness, peak and waveform analysis of the music library.
+
+Every track is decoded once on a low-priority process pool. Its loudness is
+measured the way ReplayGain 2.0 does it (ITU-R BS.1770: K-weighted, gated
+mean square in 400 ms blocks), together with the sample peak and a small
+waveform thumbnail. The results are kept in a JSON file keyed by a hash of the
+file's contents, so renaming or moving a song does not analyse it again, and
+the mtime and size of every path are remembered so that unchanged files are
+not even hashed again.
+
+Run ``python track_analysis.py media/music`` to analyse a library ahead of time
+and print the results.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent import futures
+
+import numpy as np
+
+CACHE_FILE = "track_analysis.json"
+REFERENCE_LOUDNESS = -18.0  # LUFS, the ReplayGain 2.0 reference level
+BLOCK_SECONDS = 0.4
+STEP_SECONDS = 0.1  # blocks overlap by 75%, so every block is four steps
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+STEPS_PER_CHUNK = 600  # a minute of audio is filtered at a time, which bounds a worker's memory
+WAVEFORM_WIDTH = 130
+HASH_CHUNK = 1 << 20
+
+
+def file_hash(path):
+    """Returns the SHA-1 of a file's contents as hex."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def biquad_power(frequencies, rate, b, a):
+    """Returns |H|^2 of a biquad filter at the given frequencies."""
+    z = np.exp(-2j * np.pi * frequencies / rate)
+    response = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response) ** 2
+
+
+def k_weighting(frequencies, rate):
+    """
+    Returns the power response of the BS.1770 K-weighting filter: a +4 dB high shelf
+    modelling the head, followed by a high-pass that ignores the lowest bass.
+
+    Args:
+        frequencies (numpy.ndarray): Frequencies in Hz.
+        rate (int): Sample rate the filter runs at.
+    """
+    gain = 10 ** (4.0 / 40)
+    w0 = 2 * np.pi * 1500.0 / rate
+    alpha = np.sin(w0) / (2 / np.sqrt(2))
+    cos, root = np.cos(w0), 2 * np.sqrt(gain) * alpha
+    shelf = biquad_power(frequencies, rate,
+                         (gain * ((gain + 1) + (gain - 1) * cos + root), -2 * gain * ((gain - 1) + (gain + 1) * cos),
+                          gain * ((gain + 1) + (gain - 1) * cos - root)),
+                         ((gain + 1) - (gain - 1) * cos + root, 2 * ((gain - 1) - (gain + 1) * cos),
+                          (gain + 1) - (gain - 1) * cos - root))
+    w0 = 2 * np.pi * 38.0 / rate
+    alpha = np.sin(w0) / (2 * 0.5)
+    cos = np.cos(w0)
+    highpass = biquad_power(frequencies, rate, ((1 + cos) / 2, -(1 + cos), (1 + cos) / 2),
+                            (1 + alpha, -2 * cos, 1 - alpha))
+    return shelf * highpass
+
+
+def step_energies(samples, rate):
+    """
+    Returns the K-weighted mean square of every 100 ms step, per channel.
+
+    The filter is applied in the frequency domain: by Parseval's theorem the mean
+    square of the filtered step is its power spectrum weighted by the filter's
+    power response, so whole chunks of steps are filtered in one FFT call.
+
+    Args:
+        samples (numpy.ndarray): (frames, channels) samples scaled to -1.0 - 1.0.
+        rate (int): Sample rate.
+
+    Returns:
+        numpy.ndarray: (steps, channels) mean squares.
+    """
+    length = int(rate * STEP_SECONDS)
+    steps = len(samples) // length
+    # A real FFT keeps one side of the spectrum, so every bin but DC and Nyquist counts twice
+    weights = k_weighting(np.fft.rfftfreq(length, 1 / rate), rate)
+    weights[1:(length + 1) // 2] *= 2
+    energies = np.empty((steps, samples.shape[1]))
+    for start in range(0, steps, STEPS_PER_CHUNK):
+        stop = min(steps, start + STEPS_PER_CHUNK)
+        chunk = samples[start * length:stop * length].reshape(stop - start, length, -1)
+        spectrum = np.fft.rfft(chunk, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        energies[start:stop] = np.einsum("sfc,f->sc", power, weights) / (length * length)
+    return energies
+
+
+def loudness(samples, rate):
+    """
+    Measures integrated loudness as in ITU-R BS.1770.
+
+    Blocks of 400 ms overlapping by 75% are gated twice: blocks below -70 LUFS
+    are silence, then blocks more than 10 LU below the mean of the rest are
+    quiet passages; the loudness is the mean of what is left.
+
+    Args:
+        samples (numpy.ndarray): (frames, channels) samples scaled to -1.0 - 1.0.
+        rate (int): Sample rate.
+
+    Returns:
+        float: Loudness in LUFS, ABSOLUTE_GATE for silence or tracks shorter than a block.
+    """
+    energies = step_energies(samples, rate)
+    per_block = int(round(BLOCK_SECONDS / STEP_SECONDS))
+    if len(energies) < per_block:
+        return ABSOLUTE_GATE
+    totals = np.cumsum(np.vstack([np.zeros((1, energies.shape[1])), energies]), axis=0)
+    blocks = (totals[per_block:] - totals[:-per_block]) / per_block
+    # Both front channels have a weight of 1.0
+    power = blocks.sum(axis=1)
+    with np.errstate(divide="ignore"):
+        levels = -0.691 + 10 * np.log10(power)
+    gated = power[levels > ABSOLUTE_GATE]
+    if not len(gated):
+        return ABSOLUTE_GATE
+    threshold = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = power[(levels > ABSOLUTE_GATE) & (levels > threshold)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def waveform(samples, width=WAVEFORM_WIDTH):
+    """
+    Downsamples a track to the RMS level of each of a few columns.
+
+    Mastered music peaks near full scale almost everywhere, so the RMS level
+    shows quiet and loud passages much better than peaks would. The loudest
+    column is scaled to full height.
+
+    Args:
+        samples (numpy.ndarray): (frames, channels) samples scaled to -1.0 - 1.0.
+        width (int): Number of columns.
+
+    Returns:
+        str: One byte per column, 0 - 255, as hex.
+    """
+    usable = len(samples) // width * width
+    if not usable:
+        return bytes(width).hex()
+    squares = np.square(samples[:usable], dtype=np.float64).mean(axis=1)
+    columns = np.sqrt(squares.reshape(width, -1).mean(axis=1))
+    loudest = columns.max()
+    if loudest > 0:
+        columns /= loudest
+    return np.round(columns * 255).astype(np.uint8).tobytes().hex()
+
+
+def analyse_samples(samples, rate):
+    """
+    Analyses decoded audio.
+
+    Args:
+        samples (numpy.ndarray): (frames, channels) samples scaled to -1.0 - 1.0.
+        rate (int): Sample rate.
+
+    Returns:
+        dict: loudness (LUFS), peak (0.0 - 1.0), gain (dB to the reference loudness,
+        lowered where it would clip the peak), duration (seconds) and waveform (hex columns).
+    """
+    level = loudness(samples, rate)
+    peak = float(np.abs(samples).max()) if len(samples) else 0.0
+    gain = REFERENCE_LOUDNESS - level if level > ABSOLUTE_GATE else 0.0
+    if peak > 0:
+        gain = min(gain, -20 * np.log10(peak))
+    return {"loudness": round(level, 2), "peak": round(peak, 4), "gain": round(float(gain), 2),
+            "duration": round(len(samples) / rate, 3), "waveform": waveform(samples)}
+
+
+def start_worker():
+    """
+    Sets up an analysis process: lowest CPU priority and a mixer that decodes without opening a sound card.
+    """
+    os.nice(19)
+    if hasattr(os, "sched_setscheduler") and hasattr(os, "SCHED_IDLE"):
+        try:
+            # Only runs when a core would otherwise be idle, so playback and drawing always come first
+            os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        except OSError:
+            pass
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import pygame
+    pygame.mixer.init(frequency=44100, size=-16, channels=2)
+
+
+def analyse_file(path):
+    """
+    Decodes and analyses one music file; runs in a worker process set up by start_worker.
+
+    Args:
+        path (str): The music file.
+
+    Returns:
+        dict: See analyse_samples.
+    """
+    import pygame
+    rate, size, _ = pygame.mixer.get_init()
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    scale = float(1 << (abs(size) - 1))
+    return analyse_samples(samples.astype(np.float32) / scale, rate)
+
+
+class TrackAnalyzer:
+    """
+    Analyses music files in the background and keeps the results in a content-hash-keyed cache.
+
+    ``step`` is called once per frame from the main thread. It collects finished
+    work and hands out new work, keeping only a couple of files in flight, so the
+    main thread never waits and only ever does a few stat calls per frame. Every
+    file goes through two stages on the pool: hashing its contents and, only if
+    that hash has no results yet, decoding and analysing it. The pool is started
+    when there is work and shut down when the queue runs dry.
+
+    Attributes:
+        cache_file (str): JSON file the results are kept in.
+        results (dict): Analysis results by content hash.
+        files (dict): [size, mtime, hash] by path, to skip hashing unchanged files.
+        queue (collections.deque): Paths still to check.
+        pending (dict): (stage, path, stat) of every future in flight.
+        workers (int): Size of the process pool.
+        in_flight (int): Most files handed to the pool at once.
+        unsaved (int): Results found since the cache was last written.
+    """
+
+    HASH = "hash"
+    ANALYSE = "analyse"
+    CHECKS_PER_STEP = 20
+    SAVE_EVERY = 50
+
+    def __init__(self, cache_file=CACHE_FILE, workers=1, in_flight=2):
+        self.cache_file = cache_file
+        self.workers = workers
+        self.in_flight = in_flight
+        self.results = {}
+        self.files = {}
+        self.queue = deque()
+        self.pending = {}
+        self.executor = None
+        self.unsaved = 0
+        self.load()
+
+    def load(self):
+        """Reads the cache file, starting empty if it is missing or damaged."""
+        try:
+            with open(self.cache_file) as file:
+                data = json.load(file)
+            self.results = data["results"]
+            self.files = data["files"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.results, self.files = {}, {}
+
+    def save(self):
+        """Writes the cache file through a temporary file, so a crash never leaves half of it."""
+        temporary = self.cache_file + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"results": self.results, "files": self.files}, file)
+        os.replace(temporary, self.cache_file)
+        self.unsaved = 0
+
+    def add(self, paths):
+        """
+        Queues music files for analysis; files already in the cache are skipped cheaply.
+
+        Args:
+            paths (iterable): Music files.
+        """
+        self.queue.extend(paths)
+
+    def get(self, path):
+        """
+        Returns the analysis of a file, or None if it is not analysed yet.
+
+        Args:
+            path (str): A music file.
+        """
+        entry = self.files.get(path)
+        return self.results.get(entry[2]) if entry is not None else None
+
+    @property
+    def busy(self):
+        """True while files are queued or in flight."""
+        return bool(self.queue or self.pending)
+
+    def submit(self, stage, path, stat):
+        """Hands one stage of a file to the pool, starting the pool first if needed."""
+        if self.executor is None:
+            # A fresh interpreter, not a fork of one with an open window and sound card
+            self.executor = futures.ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"),
+                                                        initializer=start_worker)
+        function = file_hash if stage == self.HASH else analyse_file
+        self.pending[self.executor.submit(function, path)] = (stage, path, stat)
+
+    def step(self):
+        """Collects finished work and starts more; never blocks."""
+        for future in [future for future in self.pending if future.done()]:
+            stage, path, stat = self.pending.pop(future)
+            try:
+                value = future.result()
+            except futures.process.BrokenProcessPool as error:
+                # A worker died (killed, or out of memory); songs simply play without analysis
+                print(f"track analysis stopped: {error}")
+                self.close()
+                return
+            except Exception as error:
+                # A file that cannot be decoded simply plays without analysis
+                print(f"analysis of {path} failed: {type(error).__name__}: {error}")
+                continue
+            if stage == self.HASH:
+                self.files[path] = [stat.st_size, stat.st_mtime, value]
+                if value not in self.results:
+                    self.submit(self.ANALYSE, path, stat)
+            else:
+                self.results[self.files[path][2]] = value
+                self.unsaved += 1
+                if self.unsaved >= self.SAVE_EVERY:
+                    self.save()
+
+        checks = 0
+        while self.queue and len(self.pending) < self.in_flight and checks < self.CHECKS_PER_STEP:
+            path = self.queue.popleft()
+            checks += 1
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = self.files.get(path)
+            if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime] and entry[2] in self.results:
+                continue
+            self.submit(self.HASH, path, stat)
+
+        if not self.busy and self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            if self.unsaved:
+                self.save()
+
+    def wait(self):
+        """Blocks until every queued file is analysed, e.g. for a replay whose frames must not depend on timing."""
+        while self.busy:
+            futures.wait(list(self.pending), timeout=0.1, return_when=futures.FIRST_COMPLETED)
+            self.step()
+
+    def close(self):
+        """Stops the pool, dropping queued work, and saves what was found."""
+        self.queue.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending.clear()
+        if self.unsaved:
+            self.save()
+
+
+def gain_factor(result):
+    """
+    Returns the music volume that brings a track to the reference loudness.
+
+    The mixer can only turn music down, so quieter tracks play at full volume.
+
+    Args:
+        result (dict): An analysis result, or None to leave the volume alone.
+    """
+    if result is None:
+        return 1.0
+    return min(1.0, 10 ** (result["gain"] / 20))
+
+
+def main():
+    """Analyses every music file below a folder into the cache and prints the results."""
+    from music_index import scan_library
+
+    parser = argparse.ArgumentParser(description="Analyse the loudness, peaks and waveforms of a music library.")
+    parser.add_argument("folder", nargs="?", default="media/music", help="library folder")
+    parser.add_argument("--cache", default=CACHE_FILE, help="analysis cache file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="analysis processes")
+    args = parser.parse_args()
+
+    tracks = scan_library(args.folder)
+    analyzer = TrackAnalyzer(args.cache, workers=args.workers, in_flight=2 * args.workers)
+    analyzer.add(track.path for track in tracks)
+    analyzer.wait()
+    for track in tracks:
+        result = analyzer.get(track.path)
+        if result is not None:
+            print(f"{result['loudness']:7.2f} LUFS  peak {result['peak']:.3f}  gain {result['gain']:+6.2f} dB  "
+                  f"{result['duration']:6.1f} s  {track.title}")
+
+
+if __name__ == "__main__":
+    main()
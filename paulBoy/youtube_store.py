@@ -0,0 +1,274 @@
+import json
+import sqlite3
+import threading
+import time
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class YoutubeStore:
+    """
+    Local SQLite store for YouTube channel statistics over time.
+
+    Every poll is appended as one row per channel. Old data is downsampled so the
+    file stays small: points older than RAW_RETENTION are reduced to one per hour
+    and points older than HOURLY_RETENTION to one per day.
+
+    Uploaded videos are kept in an indexed table, so the top videos of a channel
+    can be listed without any API calls.
+
+    The last good API response of every request is kept as well, together with its
+    ETag, so the tab can start offline and later polls can be conditional.
+
+    Attributes:
+        path (str): Location of the database file, ":memory:" for a throwaway store.
+        connection (sqlite3.Connection): Open database connection.
+        lock (threading.Lock): Serialises access so the store can be used from worker threads.
+    """
+
+    RAW_RETENTION = 2 * DAY
+    HOURLY_RETENTION = 30 * DAY
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS channels (
+            channel_id TEXT PRIMARY KEY,
+            title TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS channel_stats (
+            channel_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            subs INTEGER NOT NULL,
+            views INTEGER NOT NULL,
+            videos INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS channel_stats_by_time ON channel_stats (channel_id, ts);
+        CREATE TABLE IF NOT EXISTS uploads (
+            channel_id TEXT PRIMARY KEY,
+            playlist_id TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS videos (
+            video_id TEXT PRIMARY KEY,
+            channel_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            published_at TEXT,
+            views INTEGER NOT NULL DEFAULT 0,
+            likes INTEGER NOT NULL DEFAULT 0,
+            stats_updated REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS videos_by_views ON videos (channel_id, views DESC);
+        CREATE INDEX IF NOT EXISTS videos_by_age ON videos (stats_updated);
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            fetched_at REAL NOT NULL,
+            body TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path="youtube_data.sqlite3"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(self.SCHEMA)
+
+    def record(self, channel_id, title, subs, views, videos, ts=None):
+        """
+        Appends one poll result for a channel.
+
+        Args:
+            channel_id (str): YouTube channel ID.
+            title (str): Channel title.
+            subs (int): Subscriber count.
+            views (int): Total view count.
+            videos (int): Number of public videos.
+            ts (int): Unix time of the poll, defaults to now.
+        """
+        ts = int(time.time() if ts is None else ts)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO channels (channel_id, title) VALUES (?, ?) "
+                "ON CONFLICT (channel_id) DO UPDATE SET title = excluded.title",
+                (channel_id, title))
+            self.connection.execute(
+                "INSERT INTO channel_stats (channel_id, ts, subs, views, videos) VALUES (?, ?, ?, ?, ?)",
+                (channel_id, ts, subs, views, videos))
+
+    def downsample(self, now=None):
+        """
+        Thins out old points, keeping the last point of every hour or day bucket.
+
+        Args:
+            now (int): Unix time used as the reference, defaults to now.
+        """
+        now = int(time.time() if now is None else now)
+        with self.lock, self.connection:
+            for bucket, newer_than, older_than in ((HOUR, now - self.HOURLY_RETENTION, now - self.RAW_RETENTION),
+                                                   (DAY, 0, now - self.HOURLY_RETENTION)):
+                self.connection.execute(
+                    "DELETE FROM channel_stats WHERE ts >= ? AND ts < ? AND rowid NOT IN ("
+                    "  SELECT MAX(rowid) FROM channel_stats WHERE ts >= ? AND ts < ?"
+                    "  GROUP BY channel_id, ts / ?)",
+                    (newer_than, older_than, newer_than, older_than, bucket))
+
+    def title(self, channel_id):
+        """Returns the stored title of a channel, or None if it was never polled."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT title FROM channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row[0] if row else None
+
+    def latest(self, channel_id):
+        """
+        Returns the most recent point of a channel.
+
+        Returns:
+            tuple: (ts, subs, views, videos), or None if the channel was never polled.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT ts, subs, views, videos FROM channel_stats WHERE channel_id = ? "
+                "ORDER BY ts DESC LIMIT 1", (channel_id,)).fetchone()
+
+    def series(self, channel_id, since=None):
+        """
+        Returns the stored history of a channel, oldest first.
+
+        Args:
+            channel_id (str): YouTube channel ID.
+            since (int): Only return points at or after this Unix time.
+
+        Returns:
+            list: (ts, subs, views) tuples.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT ts, subs, views FROM channel_stats WHERE channel_id = ? AND ts >= ? ORDER BY ts",
+                (channel_id, since or 0)).fetchall()
+
+    def set_uploads_playlist(self, channel_id, playlist_id):
+        """Remembers the ID of a channel's uploads playlist."""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO uploads (channel_id, playlist_id) VALUES (?, ?)",
+                                    (channel_id, playlist_id))
+
+    def uploads_playlist(self, channel_id):
+        """Returns the ID of a channel's uploads playlist, or None if it is not known yet."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT playlist_id FROM uploads WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row[0] if row else None
+
+    def known_video_ids(self, channel_id):
+        """Returns the set of stored video IDs of a channel."""
+        with self.lock:
+            rows = self.connection.execute("SELECT video_id FROM videos WHERE channel_id = ?", (channel_id,))
+            return {row[0] for row in rows}
+
+    def save_videos(self, channel_id, videos, updated_at=None):
+        """
+        Inserts or refreshes videos.
+
+        Args:
+            channel_id (str): Channel the videos belong to.
+            videos (list): (video_id, title, published_at, views, likes) tuples.
+            updated_at (float): Unix time the statistics were fetched, defaults to now.
+        """
+        updated_at = time.time() if updated_at is None else updated_at
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO videos (video_id, channel_id, title, published_at, views, likes, stats_updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (video_id) DO UPDATE SET "
+                "title = excluded.title, views = excluded.views, likes = excluded.likes, "
+                "stats_updated = excluded.stats_updated",
+                [(video_id, channel_id, title, published_at, views, likes, updated_at)
+                 for video_id, title, published_at, views, likes in videos])
+
+    def delete_videos(self, video_ids):
+        """Removes videos, e.g. ones that were deleted or made private."""
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM videos WHERE video_id = ?",
+                                        [(video_id,) for video_id in video_ids])
+
+    def stale_videos(self, older_than, limit):
+        """
+        Returns videos whose statistics were last fetched before a given time, oldest first.
+
+        Args:
+            older_than (float): Unix time.
+            limit (int): Maximum number of videos.
+
+        Returns:
+            list: (video_id, channel_id) tuples.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT video_id, channel_id FROM videos WHERE stats_updated < ? ORDER BY stats_updated LIMIT ?",
+                (older_than, limit)).fetchall()
+
+    def top_videos(self, channel_id, limit):
+        """
+        Returns a channel's most viewed videos.
+
+        Args:
+            channel_id (str): YouTube channel ID.
+            limit (int): Maximum number of videos.
+
+        Returns:
+            list: (title, views, likes) tuples, most viewed first.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT title, views, likes FROM videos WHERE channel_id = ? ORDER BY views DESC LIMIT ?",
+                (channel_id, limit)).fetchall()
+
+    def save_response(self, key, body, fetched_at=None):
+        """
+        Keeps the last good response of an API request.
+
+        Args:
+            key (str): Identifies the request, e.g. the endpoint and IDs.
+            body (dict): Parsed response; its ``etag`` is used for conditional requests.
+            fetched_at (float): Unix time of the response, defaults to now.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, fetched_at, body) VALUES (?, ?, ?, ?)",
+                (key, body.get("etag"), fetched_at, json.dumps(body)))
+
+    def touch_response(self, key, fetched_at=None):
+        """
+        Marks a cached response as confirmed fresh, after a 304 Not Modified.
+
+        Args:
+            key (str): Identifies the request.
+            fetched_at (float): Unix time of the confirmation, defaults to now.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (fetched_at, key))
+
+    def cached_response(self, key):
+        """
+        Returns the last good response of a request.
+
+        Returns:
+            tuple: (etag, fetched_at, body), or None if the request never succeeded.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT etag, fetched_at, body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        etag, fetched_at, body = row
+        return etag, fetched_at, json.loads(body)
+
+    def newest_response_time(self):
+        """Returns the Unix time of the most recent good response, or None if there is none."""
+        with self.lock:
+            return self.connection.execute("SELECT MAX(fetched_at) FROM responses").fetchone()[0]
+
+    def close(self):
+        """Closes the database."""
+        self.connection.close()
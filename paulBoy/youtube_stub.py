@@ -0,0 +1,167 @@
+"""
+Local stand-in for the YouTube Data API's channels.list, for trying the YOUTUBE tab without Google.
+
+The stub answers ``GET .../channels?id=ID,...`` with made-up statistics and an ETag, answers
+``304 Not Modified`` when the request's If-None-Match still matches, and can be switched to fail
+with ``503`` to act like an outage. Point the tab at it by setting YoutubeTablet.API_ENDPOINT to
+its address; requests are then sent without credentials.
+
+``python youtube_stub.py serve`` runs the stub, and ``python youtube_stub.py check`` runs YoutubeSync
+against it and checks the fresh (200), unchanged (304, ETag reused) and outage (5xx, stale cache)
+answers, exiting with 1 if one is wrong.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from youtube_store import YoutubeStore
+from youtube_sync import FRESH, NOT_MODIFIED, STALE, YoutubeSync, build_client
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers channels.list requests from the server's current statistics."""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.server.requests.append((url.path, self.headers.get("If-None-Match")))
+        if not url.path.endswith("/channels"):
+            self.send_error(404)
+            return
+        if self.server.failing:
+            self.send_error(503, "Backend Error")
+            return
+        ids = [channel_id for value in parse_qs(url.query).get("id", []) for channel_id in value.split(",")]
+        body = self.server.channels_response(ids)
+        if self.headers.get("If-None-Match") == body["etag"]:
+            self.send_response(304)
+            self.send_header("ETag", body["etag"])
+            self.end_headers()
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", body["etag"])
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # the stub is polled constantly; request lines would drown the output
+
+
+class YoutubeStubServer(ThreadingHTTPServer):
+    """
+    HTTP server standing in for the YouTube Data API.
+
+    Attributes:
+        subscribers (int): Subscriber count every channel reports; changing it changes the ETag.
+        failing (bool): Answer every request with 503.
+        requests (list): (path, If-None-Match header) of every request, in order.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8001), subscribers=1000):
+        super().__init__(address, StubHandler)
+        self.subscribers = subscribers
+        self.failing = False
+        self.requests = []
+
+    def channels_response(self, ids):
+        """
+        Builds a channels.list response for the given IDs.
+
+        Args:
+            ids (list): The requested channel IDs.
+
+        Returns:
+            dict: The response body; its "etag" only changes with the IDs and the statistics.
+        """
+        items = [{
+            "kind": "youtube#channel",
+            "id": channel_id,
+            "snippet": {"title": f"Stub {channel_id}"},
+            "contentDetails": {"relatedPlaylists": {"uploads": "UU" + channel_id[2:]}},
+            "statistics": {"subscriberCount": str(self.subscribers), "viewCount": str(self.subscribers * 40),
+                           "videoCount": "12"},
+        } for channel_id in ids]
+        etag = hashlib.sha1(json.dumps(items, sort_keys=True).encode()).hexdigest()
+        return {"kind": "youtube#channelListResponse", "etag": etag, "items": items}
+
+    def start(self):
+        """Serves requests on a daemon thread; returns the server's base URL."""
+        threading.Thread(target=self.serve_forever, name="youtube-stub", daemon=True).start()
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+def check():
+    """
+    Runs YoutubeSync against a stub on a free port through a fresh, in-memory store.
+
+    Returns:
+        bool: True if every answer came back with the expected status and body.
+    """
+    server = YoutubeStubServer(("127.0.0.1", 0))
+    sync = YoutubeSync(build_client(api_endpoint=server.start()), YoutubeStore(":memory:"))
+    channel_id = "UCstub0000000000000000001"
+
+    def fetch():
+        request = sync.youtube.channels().list(part="snippet,contentDetails,statistics", id=channel_id,
+                                               maxResults=50)
+        response, status = sync.execute("channels:" + channel_id, request)
+        subscribers = response["items"][0]["statistics"]["subscriberCount"] if response else None
+        return status, subscribers, server.requests[-1][1] if server.requests else None
+
+    steps = [
+        ("200 fresh", None, (FRESH, "1000")),
+        ("304 unchanged, ETag sent", None, (NOT_MODIFIED, "1000")),
+        ("503 outage, cached body", "fail", (STALE, "1000")),
+        ("200 changed stats", "change", (FRESH, "1001")),
+    ]
+    passed = True
+    try:
+        for name, action, expected in steps:
+            server.failing = action == "fail"
+            if action == "change":
+                server.subscribers += 1
+            status, subscribers, etag_sent = fetch()
+            ok = (status, subscribers) == expected
+            if expected[0] == NOT_MODIFIED:
+                ok = ok and etag_sent is not None
+            passed = passed and ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name}: {status}, subscribers {subscribers}, "
+                  f"If-None-Match {etag_sent or '-'}")
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("cache", sync.cache_stats())
+    return passed
+
+
+def main():
+    """Serves the stub, or checks YoutubeSync's 200, 304 and 5xx handling against it."""
+    parser = argparse.ArgumentParser(description="PAUL-BOY YouTube Data API stub")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="answer channels.list requests with made-up statistics")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    serve.add_argument("--port", type=int, default=8001, help="TCP port")
+    serve.add_argument("--subscribers", type=int, default=1000, help="subscriber count every channel reports")
+    commands.add_parser("check", help="check fresh, not modified and stale answers against a stub")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        sys.exit(0 if check() else 1)
+    server = YoutubeStubServer((args.host, args.port), args.subscribers)
+    print(f"serving the YouTube Data API stub on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+import metrics
+
+MAX_IDS_PER_REQUEST = 50
+
+# Outcome of a request made through YoutubeSync.execute
+FRESH = "fresh"  # new data from the API
+NOT_MODIFIED = "not_modified"  # 304, the cached data is still current
+STALE = "stale"  # the request failed, cached data (if any) is returned
+
+
+def build_client(credentials=None, api_endpoint=None, http=None):
+    """
+    Builds a YouTube Data API v3 client from the bundled discovery document, so building it works offline.
+
+    Args:
+        credentials (google.auth.credentials.Credentials): Credentials the requests are signed with; None
+            for anonymous ones, which never contact Google, e.g. against a local stub server.
+        api_endpoint (str): Base URL of the API, e.g. "http://127.0.0.1:8001"; None for Google's.
+        http (httplib2.Http): Transport used as is instead of an authorized one; credentials are then ignored.
+
+    Returns:
+        Resource: The client.
+    """
+    options = {"api_endpoint": api_endpoint} if api_endpoint else None
+    if http is not None:
+        return build("youtube", "v3", http=http, static_discovery=True, client_options=options)
+    return build("youtube", "v3", credentials=credentials or AnonymousCredentials(), static_discovery=True,
+                 client_options=options)
+
+
+def batched(ids, size=MAX_IDS_PER_REQUEST):
+    """
+    Splits a list of IDs into chunks the YouTube Data API accepts in one request.
+
+    Args:
+        ids (list): Channel or video IDs.
+        size (int): Maximum number of IDs per chunk.
+    """
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def parse_channel(item):
+    """
+    Extracts the numbers shown on the YouTube tab from a channels.list item.
+
+    Args:
+        item (dict): One entry of the response's ``items``.
+
+    Returns:
+        dict: title, subs, views and videos; hidden subscriber counts read as 0.
+    """
+    stats = item.get("statistics", {})
+    return {
+        "title": item.get("snippet", {}).get("title", item["id"]),
+        "subs": int(stats.get("subscriberCount", 0)),
+        "views": int(stats.get("viewCount", 0)),
+        "videos": int(stats.get("videoCount", 0)),
+    }
+
+
+def parse_video(item):
+    """
+    Extracts the stored fields from a videos.list item.
+
+    Args:
+        item (dict): One entry of the response's ``items``.
+
+    Returns:
+        tuple: (video_id, title, published_at, views, likes); hidden like counts read as 0.
+    """
+    snippet = item.get("snippet", {})
+    stats = item.get("statistics", {})
+    return (item["id"], snippet.get("title", item["id"]), snippet.get("publishedAt"),
+            int(stats.get("viewCount", 0)), int(stats.get("likeCount", 0)))
+
+
+class YoutubeSync:
+    """
+    Fetches data from the YouTube Data API in as few requests as possible.
+
+    Every response is cached in the store together with its ETag. Later requests
+    send If-None-Match, so unchanged data comes back as 304 Not Modified and costs
+    no bandwidth. When a request fails, or there is no API client at all, the last
+    good response is used instead, so the tab keeps working offline.
+
+    Attributes:
+        youtube (Resource): YouTube API client built with googleapiclient, None when offline.
+        store (YoutubeStore): Keeps the last good response of every request.
+        requests_made (int): Number of API requests executed.
+        hits (int): Requests answered with 304 Not Modified.
+        misses (int): Requests answered with fresh data.
+        errors (int): Requests that failed.
+        last_error (str): Description of the most recent failure.
+        last_success (float): Unix time of the most recent successful request.
+    """
+
+    def __init__(self, youtube, store):
+        self.youtube = youtube
+        self.store = store
+        self.requests_made = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.last_error = None
+        # Data from before a restart is as old as the newest cached response
+        self.last_success = store.newest_response_time()
+
+    def execute(self, key, request, cache=True, save=True):
+        """
+        Executes a request conditionally, falling back to the cached response.
+
+        Args:
+            key (str): Identifies the request in the response cache.
+            request (HttpRequest): Request built from the API client.
+            cache (bool): Keep the response; requests whose IDs vary between calls should not.
+            save (bool): Save a fresh response right away. When False the caller saves it with
+                store.save_response once everything that depends on it has been stored.
+
+        Returns:
+            tuple: (response, status); response is the fresh or cached body, or None if neither
+            is available, and status is FRESH, NOT_MODIFIED or STALE.
+        """
+        cached = self.store.cached_response(key) if cache else None
+        if cached is not None and cached[0]:
+            request.headers["If-None-Match"] = cached[0]
+        self.requests_made += 1
+        started = time.perf_counter()
+        try:
+            response = request.execute()
+        except HttpError as error:
+            metrics.YOUTUBE_FETCH_SECONDS.observe(time.perf_counter() - started)
+            if error.resp.status == 304 and cached is not None:
+                self.hits += 1
+                self.last_success = time.time()
+                self.store.touch_response(key, self.last_success)
+                return cached[2], NOT_MODIFIED
+            self.record_error(f"HTTP {error.resp.status}", str(error.resp.status))
+        except Exception as error:  # network, DNS and auth failures all leave us offline
+            metrics.YOUTUBE_FETCH_SECONDS.observe(time.perf_counter() - started)
+            self.record_error(f"{type(error).__name__}: {error}", type(error).__name__)
+        else:
+            metrics.YOUTUBE_FETCH_SECONDS.observe(time.perf_counter() - started)
+            self.misses += 1
+            self.last_success = time.time()
+            if cache and save:
+                self.store.save_response(key, response, self.last_success)
+            return response, FRESH
+        return (cached[2] if cached is not None else None), STALE
+
+    def record_error(self, description, cause="other"):
+        """
+        Counts a failed request.
+
+        Args:
+            description (str): Shown as last_error.
+            cause (str): Short label for the errors metric, e.g. the HTTP status or exception name.
+        """
+        self.errors += 1
+        self.last_error = description
+        metrics.YOUTUBE_ERRORS.labels(cause).inc()
+
+    def cache_stats(self):
+        """
+        Returns the response cache counters.
+
+        Returns:
+            dict: hits, misses, errors, last_error and age (seconds since the last successful request, or None).
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "age": None if self.last_success is None else time.time() - self.last_success,
+        }
+
+    def fetch_channels(self, channel_ids):
+        """
+        Fetches statistics for many channels, up to 50 per channels.list call.
+
+        Args:
+            channel_ids (list): YouTube channel IDs.
+
+        Returns:
+            tuple: (items, fresh); items maps channel ID -> channels.list item, fresh or cached,
+            leaving unknown IDs out, and fresh is False if any request failed.
+        """
+        items = {}
+        all_fresh = True
+        for chunk in batched(list(channel_ids)):
+            key = "channels:" + ",".join(chunk)
+            if self.youtube is None:
+                cached = self.store.cached_response(key)
+                response, status = (cached[2] if cached is not None else None), STALE
+            else:
+                response, status = self.execute(key, self.youtube.channels().list(
+                    part="snippet,contentDetails,statistics",
+                    id=",".join(chunk),
+                    maxResults=MAX_IDS_PER_REQUEST
+                ))
+            all_fresh = all_fresh and status != STALE
+            for item in (response or {}).get("items", []):
+                items[item["id"]] = item
+        return items, all_fresh
+
+    def new_upload_ids(self, playlist_id, known_ids):
+        """
+        Pages through an uploads playlist until it reaches videos that are already stored.
+
+        The uploads playlist lists the newest videos first, so an incremental sync
+        usually needs a single page, and none at all when the first page is unchanged.
+
+        The first page's ETag tells whether anything was uploaded, so that page is
+        not cached here: the caller hands it to save_uploads_page once the new
+        videos are stored. If a later page fails, nothing is returned, and the next
+        sync looks through the playlist again.
+
+        Args:
+            playlist_id (str): The channel's uploads playlist from contentDetails.
+            known_ids (set): Video IDs that are already stored.
+
+        Returns:
+            tuple: (new_ids, first_page); new_ids are the IDs of videos that are not stored yet,
+            newest first, and first_page is the fresh first page to save, or None if there is none.
+        """
+        new_ids = []
+        first_page = None
+        page_token = None
+        while self.youtube is not None:
+            response, status = self.execute(f"playlistItems:{playlist_id}", self.youtube.playlistItems().list(
+                part="contentDetails",
+                playlistId=playlist_id,
+                maxResults=MAX_IDS_PER_REQUEST,
+                pageToken=page_token
+            ), cache=page_token is None, save=False)
+            if status != FRESH or response is None:
+                if page_token is not None:
+                    return [], None  # a later page failed: the list is incomplete
+                break  # offline, or the first page has not changed since the last sync
+            if page_token is None:
+                first_page = response
+            for item in response.get("items", []):
+                video_id = item["contentDetails"]["videoId"]
+                if video_id in known_ids:
+                    return new_ids, first_page
+                new_ids.append(video_id)
+            page_token = response.get("nextPageToken")
+            if page_token is None:
+                break
+        return new_ids, first_page
+
+    def save_uploads_page(self, playlist_id, first_page):
+        """
+        Caches the first page of an uploads playlist once its new videos are stored.
+
+        Args:
+            playlist_id (str): The channel's uploads playlist.
+            first_page (dict): The first page returned by new_upload_ids.
+        """
+        self.store.save_response(f"playlistItems:{playlist_id}", first_page, self.last_success)
+
+    def fetch_videos(self, video_ids):
+        """
+        Fetches title and statistics of many videos, up to 50 per videos.list call.
+
+        Args:
+            video_ids (list): YouTube video IDs.
+
+        Returns:
+            tuple: (videos, fresh); videos are (video_id, title, published_at, views, likes) tuples
+            of the videos that were fetched, and fresh is False if any request failed.
+        """
+        videos = []
+        all_fresh = True
+        for chunk in batched(list(video_ids)):
+            if self.youtube is None:
+                return videos, False
+            response, status = self.execute("videos", self.youtube.videos().list(
+                part="snippet,statistics",
+                id=",".join(chunk),
+                maxResults=MAX_IDS_PER_REQUEST
+            ), cache=False)
+            if status == FRESH:
+                videos.extend(parse_video(item) for item in response.get("items", []))
+            else:
+                all_fresh = False
+        return videos, all_fresh